@@ -0,0 +1,192 @@
+"""
+Cold storage for old logs.
+
+Logs (with their foods and activities) from whole months older than
+ARCHIVE_AFTER_DAYS are moved out of the hot tables into monthly archive
+segments: ARCHIVE_DIR/<YYYY-MM>.db, one row per (user, month) holding the
+month's logs, foods and activities as zstd-compressed columnar JSON
+(zlib when the zstandard package is not installed; the codec is recorded
+per segment). daily_totals stays hot, so summaries never touch the archive;
+crud.get_daily_logs and crud.get_logs_page merge archived rows back in for
+archived months, and a full /sync (since=0) includes them. Archived rows
+are read-only, so incremental syncs never report them.
+
+Run from backend/ (e.g. nightly from cron):
+    ARCHIVE_AFTER_DAYS=365 python -m archive run --vacuum
+    python -m archive stats
+"""
+import argparse
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import orjson
+from dotenv import load_dotenv
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv(override=True)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "./archive"))
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "12"))
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv("ARCHIVE_CACHE_SEGMENTS", "256"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    logs INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (user_id, month)
+) WITHOUT ROWID
+"""
+
+
+def month_key(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def month_bounds(month: str) -> tuple[datetime, datetime]:
+    """[start, end) of a YYYY-MM month."""
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def cutoff_month(today: date | None = None, after_days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    """Start of the oldest month that stays hot: every month before it is fully older than after_days."""
+    oldest = (today or date.today()) - timedelta(days=after_days)
+    return datetime(oldest.year, oldest.month, 1)
+
+
+def segment_path(month: str) -> Path:
+    return ARCHIVE_DIR / f"{month}.db"
+
+
+def _compress(data: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Archive segment is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def _to_columns(rows: list[dict]) -> dict:
+    columns = list(rows[0]) if rows else []
+    return {c: [r[c] for r in rows] for c in columns}
+
+
+def _from_columns(columns: dict) -> list[dict]:
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _connect(month: str) -> sqlite3.Connection:
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(segment_path(month))
+    conn.execute(_SCHEMA)
+    return conn
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE_SEGMENTS)
+def _load(user_id: str, month: str, mtime_ns: int) -> dict | None:
+    with closing(sqlite3.connect(segment_path(month))) as conn:
+        row = conn.execute(
+            "SELECT codec, data FROM segments WHERE user_id = ? AND month = ?", (user_id, month)
+        ).fetchone()
+    if row is None:
+        return None
+    tables = orjson.loads(_decompress(*row))
+    return {name: _from_columns(columns) for name, columns in tables.items()}
+
+
+def read_segment(user_id: str, month: str, cache: bool = True) -> dict | None:
+    """
+    {"logs": [...], "foods": [...], "activities": [...]} row dicts for the
+    user's month, or None. Pass cache=False for one-off sweeps (exports) so
+    they do not evict the segments interactive reads keep hitting.
+    """
+    try:
+        mtime_ns = segment_path(month).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return (_load if cache else _load.__wrapped__)(user_id, month, mtime_ns)
+
+
+def write_segment(user_id: str, month: str, logs: list[dict], foods: list[dict], activities: list[dict]) -> int:
+    """
+    Add rows to the user's segment for month, merging with what is already
+    archived (rows are keyed by id, so re-running after a crash between the
+    archive write and the hot delete does not duplicate anything). Returns
+    the segment's log count.
+    """
+    tables = {"logs": logs, "foods": foods, "activities": activities}
+    existing = read_segment(user_id, month)
+    if existing:
+        for name, rows in tables.items():
+            ids = {r["id"] for r in rows}
+            tables[name] = [r for r in existing[name] if r["id"] not in ids] + rows
+    codec, blob = _compress(orjson.dumps({name: _to_columns(rows) for name, rows in tables.items()}))
+    with closing(_connect(month)) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO segments (user_id, month, codec, logs, data) VALUES (?, ?, ?, ?, ?)",
+            (user_id, month, codec, len(tables["logs"]), blob),
+        )
+    return len(tables["logs"])
+
+
+def archive_size_mb() -> float:
+    if not ARCHIVE_DIR.exists():
+        return 0.0
+    return round(sum(p.stat().st_size for p in ARCHIVE_DIR.glob("*.db")) / 1024**2, 2)
+
+
+def run(vacuum: bool = False, after_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """Archive every shard's logs from months before cutoff_month(). Returns counts per shard."""
+    from crud import archive_logs_before
+    from storage import shard_engine, shard_indexes, shard_session
+
+    cutoff = cutoff_month(after_days=after_days)
+    report = {"cutoff": cutoff.date().isoformat(), "shards": []}
+    for index in shard_indexes():
+        with shard_session(index) as session:
+            moved = archive_logs_before(session, cutoff)
+        if vacuum:
+            with shard_engine(index).connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+        report["shards"].append({"shard": index, **moved})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="move logs older than ARCHIVE_AFTER_DAYS into archive segments")
+    run_parser.add_argument("--vacuum", action="store_true", help="VACUUM the hot databases afterwards to return freed pages")
+    sub.add_parser("stats", help="segments, archived logs and size per month")
+    args = parser.parse_args()
+    if args.command == "run":
+        print(orjson.dumps(run(args.vacuum), option=orjson.OPT_INDENT_2).decode())
+        return
+    for path in sorted(ARCHIVE_DIR.glob("*.db")):
+        with closing(sqlite3.connect(path)) as conn:
+            segments, logs = conn.execute("SELECT COUNT(*), COALESCE(SUM(logs), 0) FROM segments").fetchone()
+        print(f"{path.stem} segments={segments} logs={logs} {round(path.stat().st_size / 1024**2, 2)} MB")
+
+
+if __name__ == "__main__":
+    main()
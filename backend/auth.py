@@ -10,7 +10,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
-from crud import get_db, get_user_by_username
+from crud import get_db, get_user_by_username, use_shard
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -72,4 +72,5 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
+    use_shard(db, user.username)  # the request's own session reads and writes this user's shard
     return user
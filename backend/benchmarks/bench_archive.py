@@ -0,0 +1,112 @@
+"""
+Hot database size and read latency before and after archiving old logs.
+
+Seeds --users users with --days days of history (--entries logs a day, raw
+text drawn from calorie_test_cases.txt) in a temp directory, then measures
+the hot database size (after VACUUM) and the latency of the reads behind
+/today_summary and /logs: a recent day, an archived day, the first /logs
+page, a /logs page deep in the history and an archived day's totals. Then
+runs archive.run(vacuum=True) keeping --keep-days hot and measures again,
+adding the size of the archive segments.
+
+Usage (from backend/):
+    python -m benchmarks.bench_archive --users 10 --days 730 --keep-days 90 --out archive.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.stats import metadata, summarize, write_report
+
+CASES_FILE = Path(__file__).resolve().parent.parent / "calorie_test_cases.txt"
+
+
+def _engines() -> set:
+    from storage import catalogue_engine, shard_engine, shard_indexes
+
+    return {catalogue_engine, *(shard_engine(i) for i in shard_indexes())}
+
+
+def _db_size_mb() -> float:
+    return round(sum(os.path.getsize(e.url.database) for e in _engines()) / 1024**2, 2)
+
+
+def _vacuum() -> None:
+    for engine in _engines():
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def _measure(users: int, days: int, queries: int) -> dict:
+    from crud import SessionLocal, get_daily_logs, get_daily_totals, get_logs_page, use_shard
+
+    rng = random.Random(0)
+    today = datetime.now().date()
+    reads = {
+        "recent_day": lambda s, u: get_daily_logs(s, u, today - timedelta(days=rng.randrange(1, 30))),
+        "archived_day": lambda s, u: get_daily_logs(s, u, today - timedelta(days=rng.randrange(days // 2, days - 1))),
+        "logs_first_page": lambda s, u: get_logs_page(s, u, limit=20),
+        "logs_deep_page": lambda s, u: get_logs_page(
+            s, u, before=(datetime.now() - timedelta(days=rng.randrange(days // 2, days - 1)), "f" * 8 + "-ffff-ffff-ffff-" + "f" * 12),
+            limit=20,
+        ),
+        "archived_day_totals": lambda s, u: get_daily_totals(s, u, today - timedelta(days=rng.randrange(days // 2, days - 1))),
+    }
+    results = {}
+    for name, read in reads.items():
+        latencies = []
+        for i in range(queries):
+            username = f"bench{i % users}"
+            with SessionLocal() as session:
+                use_shard(session, username)
+                t0 = time.perf_counter()
+                read(session, username)
+                latencies.append(time.perf_counter() - t0)
+        results[name] = summarize(latencies)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--entries", type=int, default=4, help="logs per user per day")
+    parser.add_argument("--keep-days", type=int, default=90, help="ARCHIVE_AFTER_DAYS for the archiving run")
+    parser.add_argument("--queries", type=int, default=200, help="samples per read")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="nutrilog-archive-") as workdir:
+        os.chdir(workdir)  # crud, storage and archive resolve ./local.db and ./archive against the cwd
+        from archive import archive_size_mb, run
+        from benchmarks.seed import seed
+
+        texts = tuple(line.strip() for line in CASES_FILE.read_text().splitlines() if line.strip())
+        t0 = time.perf_counter()
+        seed(args.users, args.days, args.entries, texts)
+        seed_s = round(time.perf_counter() - t0, 1)
+        _vacuum()
+        before = {"db_mb": _db_size_mb(), "reads": _measure(args.users, args.days, args.queries)}
+        t0 = time.perf_counter()
+        moved = run(vacuum=True, after_days=args.keep_days)
+        archive_s = round(time.perf_counter() - t0, 1)
+        _vacuum()
+        after = {
+            "db_mb": _db_size_mb(),
+            "archive_mb": archive_size_mb(),
+            "archived_logs": sum(s["logs"] for s in moved["shards"]),
+            "archive_s": archive_s,
+            "reads": _measure(args.users, args.days, args.queries),
+        }
+    meta = metadata("archive", users=args.users, days=args.days, entries=args.entries,
+                    keep_days=args.keep_days, seed_s=seed_s)
+    write_report({"meta": meta, "before": before, "after": after}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Memory and throughput of N encoder users: each with its own in-process ONNX
+session vs all sharing the encoder service over a Unix socket.
+
+For each worker count, N processes embed the segment corpus concurrently
+(one segment per call, like parse_input). Reports total RSS (workers plus
+the service process) and embeddings per second.
+
+Usage (from backend/, needs the ONNX model):
+    python -m benchmarks.bench_encoder_service --workers 1 4 8 --out encoder_service.json
+"""
+import argparse
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stats import metadata, rss_mb, summarize, write_report
+
+CORPUS_PATH = "ml_models/segment_corpus.csv"
+
+
+def _worker(mode: str, socket_path: str, texts: list[str], iterations: int, ready, go, results):
+    from encoder import LocalEncoder, RemoteEncoder
+
+    encoder = LocalEncoder() if mode == "inproc" else RemoteEncoder(socket_path)
+    encoder.embed(texts[0])
+    ready.put(os.getpid())
+    go.wait()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            t0 = time.perf_counter()
+            encoder.embed(text)
+            latencies.append(time.perf_counter() - t0)
+    results.put((time.perf_counter() - start, latencies))
+
+
+def _wait_for_socket(path: str, proc, timeout_s: float = 120):
+    deadline = time.monotonic() + timeout_s
+    while not Path(path).exists():
+        if proc.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("encoder service did not start")
+        time.sleep(0.1)
+
+
+def run(mode: str, workers: int, texts: list[str], iterations: int) -> dict:
+    ctx = mp.get_context("spawn")
+    socket_path = os.path.join(tempfile.mkdtemp(), "encoder.sock")
+    service = None
+    if mode == "service":
+        env = {**os.environ, "ENCODER_SOCKET": socket_path}
+        service = subprocess.Popen([sys.executable, "-m", "encoder_service"], env=env, stderr=subprocess.DEVNULL)
+        _wait_for_socket(socket_path, service)
+    ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(mode, socket_path, texts, iterations, ready, go, results))
+             for _ in range(workers)]
+    try:
+        for p in procs:
+            p.start()
+        pids = [ready.get(timeout=300) for _ in procs]
+        rss = sum(rss_mb(pid) for pid in pids) + (rss_mb(service.pid) if service else 0.0)
+        go.set()
+        outcomes = [results.get(timeout=600) for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        if service:
+            service.terminate()
+            service.wait()
+    elapsed = max(e for e, _ in outcomes)
+    latencies = [lat for _, lats in outcomes for lat in lats]
+    return {"mode": mode, "workers": workers, "rss_mb": round(rss, 1), **summarize(latencies, elapsed)}
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    texts = pd.read_csv(CORPUS_PATH)["segment"].tolist()
+    runs = [run(mode, n, texts, args.iterations) for n in args.workers for mode in ("inproc", "service")]
+    write_report({**metadata("encoder_service", segments=len(texts)), "runs": runs}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Encoder latency matrix on CPU: model variant x graph optimization level x
+batch size (1-64), with and without length bucketing.
+
+Variants are the .onnx files in the model directory (e.g. model.onnx and
+model_quantized.onnx); pass --models to pick others. Batches are drawn from
+the segment corpus, so lengths are realistic for parse_input.
+
+Usage (from backend/):
+    python -m benchmarks.bench_encoder_variants --out variants.json
+    python -m benchmarks.bench_encoder_variants --batch-sizes 1 8 64 --levels basic all
+"""
+import argparse
+import time
+from pathlib import Path
+
+import onnxruntime  # noqa: F401  imported up front so session_rss_mb excludes import cost
+import pandas as pd
+import transformers  # noqa: F401
+
+from benchmarks.stats import metadata, rss_mb, summarize, write_report
+from encoder import MODEL_DIR, get_onnx_embedding, load_encoder, session_options
+
+CORPUS_PATH = "ml_models/segment_corpus.csv"
+
+
+def bench_variant(model_file: str, level: str, batch_sizes: list[int], texts: list[str], repeat: int) -> list[dict]:
+    rss_before = rss_mb()
+    session, tokenizer = load_encoder(file_name=model_file, options=session_options(opt_level=level), opt_level=level)
+    rss_session = round(rss_mb() - rss_before, 1)
+    rows = []
+    for batch_size in batch_sizes:
+        batches = [(texts * (batch_size // len(texts) + 1))[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        for bucket in (False, True):
+            if batch_size == 1 and bucket:
+                continue
+            get_onnx_embedding(batches[0], session, tokenizer, bucket=bucket)
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for batch in batches:
+                    t0 = time.perf_counter()
+                    get_onnx_embedding(batch, session, tokenizer, bucket=bucket)
+                    latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - start
+            stats = summarize(latencies, elapsed)
+            rows.append({
+                "model": model_file, "opt_level": level, "batch_size": batch_size, "bucketing": bucket,
+                "session_rss_mb": rss_session,
+                "texts_per_s": round(stats["count"] * batch_size / elapsed, 1),
+                **stats,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=[p.name for p in sorted(Path(MODEL_DIR).glob("*.onnx"))])
+    parser.add_argument("--levels", nargs="+", default=["disable", "all"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    texts = pd.read_csv(CORPUS_PATH)["segment"].tolist()
+    rows = [
+        row
+        for model_file in args.models
+        for level in args.levels
+        for row in bench_variant(model_file, level, args.batch_sizes, texts, args.repeat)
+    ]
+    write_report({**metadata("encoder_variants", segments=len(texts)), "runs": rows}, args.out)
+
+
+if __name__ == "__main__":
+    main()
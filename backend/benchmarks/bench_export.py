@@ -0,0 +1,96 @@
+"""
+Full-history export for one heavy logger: streaming export vs loading ORM
+objects day by day.
+
+Seeds one user with --days days of history (--entries logs a day) in a temp
+directory, optionally archives everything older than --keep-days, then for
+each format measures wall time, rows, raw and gzip-compressed bytes and peak
+Python heap (tracemalloc) of export.stream_export. The baseline builds the
+same food rows through get_daily_logs, one day at a time, and holds them
+for a single response, as an export endpoint without streaming would.
+
+Usage (from backend/):
+    python -m benchmarks.bench_export --days 1825 --entries 12 --out export.json
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.stats import metadata, write_report
+
+CASES_FILE = Path(__file__).resolve().parent.parent / "calorie_test_cases.txt"
+USER = "bench0"
+
+
+def _measure(fn) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {**result, "seconds": round(elapsed, 3), "peak_heap_mb": round(peak / 1024**2, 2)}
+
+
+def _stream(tables: list[str], format: str) -> dict:
+    from export import stream_export
+
+    raw = compressed = 0
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for data in stream_export(USER, tables, format):
+        raw += len(data)
+        compressed += len(gzip.compress(data))
+    compressed += len(gzip.flush())
+    return {"mb": round(raw / 1024**2, 2), "gzip_mb": round(compressed / 1024**2, 2)}
+
+
+def _day_by_day(days: int) -> dict:
+    from crud import SessionLocal, get_daily_logs, use_shard
+
+    today = datetime.now().date()
+    rows = []
+    with SessionLocal() as session:
+        use_shard(session, USER)
+        for d in range(days + 1):
+            for log in get_daily_logs(session, USER, today - timedelta(days=d)):
+                rows += [(log.timestamp, f.log_id, f.id, f.name, f.quantity, f.unit, f.calories) for f in log.foods]
+    return {"rows": len(rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=1825, help="history length (default 5 years)")
+    parser.add_argument("--entries", type=int, default=12, help="logs per day")
+    parser.add_argument("--keep-days", type=int, default=0, help="archive logs older than this first (0 = keep all hot)")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="nutrilog-export-") as workdir:
+        os.chdir(workdir)  # crud, storage and archive resolve ./local.db and ./archive against the cwd
+        from archive import run
+        from benchmarks.seed import seed
+
+        texts = tuple(line.strip() for line in CASES_FILE.read_text().splitlines() if line.strip())
+        seed(1, args.days, args.entries, texts)
+        if args.keep_days:
+            run(after_days=args.keep_days)
+        results = {
+            f"stream_{format}": _measure(lambda: _stream(tables, format))
+            for format, tables in (
+                ("ndjson", ["logs", "foods", "activities", "weight_entries"]),
+                ("columnar", ["logs", "foods", "activities", "weight_entries"]),
+                ("csv", ["foods"]),
+            )
+        }
+        results["day_by_day_foods"] = _measure(lambda: _day_by_day(args.days))
+    meta = metadata("export", days=args.days, entries=args.entries, keep_days=args.keep_days)
+    write_report({"meta": meta, "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
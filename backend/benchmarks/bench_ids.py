@@ -0,0 +1,126 @@
+"""
+Primary-key layouts for the log tables on SQLite: random uuid4 text (the old
+schema), UUIDv7 as 16-byte blobs (ids.BinaryUUID) and integer surrogate keys.
+
+For each layout, inserts --rows health_logs with two foods each (so 3x rows
+in total) in --batch-row transactions, then reports insert rate, per-index
+and per-table size (dbstat, when SQLite is built with it) and the latency of
+a per-user foods-to-logs join and of primary-key lookups. Ids are generated
+outside the timed section so the numbers are storage cost only.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ids --rows 200000 --out ids.json
+    python -m benchmarks.bench_ids --rows 10000000 --dir /data/tmp   # full run (~3 GB per layout)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.stats import metadata, summarize, write_report
+from ids import uuid7
+
+LAYOUTS = {
+    "uuid4_text": ("TEXT", lambda n: [str(uuid.uuid4()) for _ in range(n)]),
+    "uuid7_blob": ("BLOB", lambda n: [uuid7().bytes for _ in range(n)]),
+    "integer": ("INTEGER", None),
+}
+
+
+def schema(key_type: str) -> str:
+    return f"""
+    CREATE TABLE health_logs (id {key_type} PRIMARY KEY, user_id TEXT NOT NULL, timestamp TEXT, raw_text TEXT NOT NULL);
+    CREATE INDEX ix_health_logs_user_id_timestamp ON health_logs (user_id, timestamp, id);
+    CREATE TABLE foods (id {key_type} PRIMARY KEY, log_id {key_type} REFERENCES health_logs (id),
+                        user_id TEXT NOT NULL, name TEXT NOT NULL, calories INTEGER NOT NULL);
+    CREATE INDEX ix_foods_log_id ON foods (log_id);
+    """
+
+
+def index_sizes(conn) -> dict:
+    try:
+        rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        return {}
+    return {name: round(size / 1024**2, 2) for name, size in sorted(rows)}
+
+
+def run(layout: str, rows: int, batch: int, users: int, queries: int, directory: str) -> dict:
+    key_type, make_ids = LAYOUTS[layout]
+    path = os.path.join(directory, f"bench_ids_{layout}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema(key_type))
+    rng = random.Random(0)
+    start_ts = datetime(2025, 1, 1)
+    user_ids = [f"user{i}" for i in range(users)]
+    sample_ids = []
+    insert_s = 0.0
+    for offset in range(0, rows, batch):
+        n = min(batch, rows - offset)
+        log_ids = make_ids(n) if make_ids else list(range(offset + 1, offset + n + 1))
+        food_ids = make_ids(2 * n) if make_ids else list(range(2 * offset + 1, 2 * (offset + n) + 1))
+        logs = [
+            (log_ids[i], rng.choice(user_ids), (start_ts + timedelta(seconds=offset + i)).isoformat(), "had poha and chai")
+            for i in range(n)
+        ]
+        foods = [(food_ids[2 * i + j], log_ids[i], logs[i][1], "poha", 250) for i in range(n) for j in range(2)]
+        sample_ids.extend(rng.sample(log_ids, min(len(log_ids), max(1, queries // max(1, rows // batch)))))
+        t0 = time.perf_counter()
+        with conn:
+            conn.executemany("INSERT INTO health_logs VALUES (?, ?, ?, ?)", logs)
+            conn.executemany("INSERT INTO foods VALUES (?, ?, ?, ?, ?)", foods)
+        insert_s += time.perf_counter() - t0
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    join_latencies = []
+    for user in rng.sample(user_ids, min(queries, users)):
+        t0 = time.perf_counter()
+        conn.execute(
+            "SELECT SUM(f.calories) FROM foods f JOIN health_logs l ON f.log_id = l.id WHERE l.user_id = ?", (user,)
+        ).fetchone()
+        join_latencies.append(time.perf_counter() - t0)
+    lookup_latencies = []
+    for log_id in sample_ids[:queries]:
+        t0 = time.perf_counter()
+        conn.execute("SELECT * FROM foods WHERE log_id = ?", (log_id,)).fetchall()
+        lookup_latencies.append(time.perf_counter() - t0)
+
+    result = {
+        "layout": layout,
+        "rows": rows * 3,
+        "insert_rows_per_s": round(rows * 3 / insert_s, 1),
+        "file_mb": round(os.path.getsize(path) / 1024**2, 2),
+        "sizes_mb": index_sizes(conn),
+        "user_join": summarize(join_latencies),
+        "log_id_lookup": summarize(lookup_latencies),
+    }
+    conn.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="health_logs rows (foods get 2x)")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per insert transaction")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="where the benchmark databases are written")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    runs = [run(layout, args.rows, args.batch, args.users, args.queries, args.dir) for layout in args.layouts]
+    write_report({**metadata("ids", sqlite=sqlite3.sqlite_version, batch=args.batch), "runs": runs}, args.out)
+
+
+if __name__ == "__main__":
+    main()
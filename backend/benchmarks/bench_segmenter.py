@@ -0,0 +1,129 @@
+"""
+Segmenter quality and cost on the labelled corpus (ml_models/segment_corpus.csv).
+
+Compares the legacy regex split (and / after / also / n ...) with
+segmenter.split_clauses + keyword routing:
+- segments produced and exact agreement with the labelled segmentation,
+- keyword routing: correct / wrong / deferred to the model,
+- with --model: ONNX passes and LLM fallbacks of the full parse_input path,
+  legacy loop vs the routed one (needs the ONNX model in
+  onnx_model_all_minilm_quantized/).
+
+Usage (from backend/):
+    python -m benchmarks.bench_segmenter --out segmenter.json
+    python -m benchmarks.bench_segmenter --model
+"""
+import argparse
+import re
+
+import pandas as pd
+
+from benchmarks.stats import metadata, write_report
+from segmenter import route_segment, split_clauses, tokenize
+
+CORPUS_PATH = "ml_models/segment_corpus.csv"
+
+
+def legacy_split(text: str) -> list[str]:
+    parts = re.split(r'\b(?:and|then|after that|after|later|also|plus|n)\b|[,&.]', text.lower())
+    return [p.strip() for p in parts if p.strip()]
+
+
+def load_corpus(path: str) -> list[tuple[str, list[str], list[str]]]:
+    corpus = pd.read_csv(path)
+    return [
+        (sentence, [" ".join(tokenize(s)) for s in group["segment"]], list(group["label"]))
+        for sentence, group in corpus.groupby("sentence", sort=False)
+    ]
+
+
+def split_report(corpus) -> dict:
+    report = {}
+    for name, split in (("legacy", legacy_split), ("clauses", split_clauses)):
+        segments = exact = 0
+        for sentence, expected, _ in corpus:
+            got = split(sentence)
+            segments += len(got)
+            exact += [" ".join(tokenize(s)) for s in got] == expected
+        report[name] = {"segments": segments, "exact_sentences": exact}
+    report["expected_segments"] = sum(len(e) for _, e, _ in corpus)
+    report["sentences"] = len(corpus)
+    return report
+
+
+def routing_report(corpus) -> dict:
+    correct = wrong = deferred = 0
+    for _, expected, labels in corpus:
+        for segment, label in zip(expected, labels):
+            route = route_segment(segment)
+            if route == "unknown":
+                deferred += 1
+            elif route == label:
+                correct += 1
+            else:
+                wrong += 1
+    return {"correct": correct, "wrong": wrong, "deferred_to_model": deferred}
+
+
+def model_report(corpus, weight_kg: float = 70) -> dict:
+    import hybrid_parser
+
+    calls = {"onnx": 0}
+    encoder = hybrid_parser.encoder
+
+    class CountingEncoder:
+        def embed(self, texts):
+            calls["onnx"] += 1
+            return encoder.embed(texts)
+
+    hybrid_parser.encoder = CountingEncoder()
+
+    def legacy_parse(text):
+        llm = 0
+        for seg in legacy_split(text):
+            activity, score, _, _ = hybrid_parser.detect_activity(seg, k=1)[0]
+            duration = hybrid_parser.extract_duration(seg)
+            distance = hybrid_parser.extract_distance(seg)
+            if not (activity and (duration or distance) and score > 0.50):
+                llm += 1
+        return llm
+
+    report = {}
+    try:
+        for name, run in (
+            ("legacy", legacy_parse),
+            ("clauses", lambda text: len(hybrid_parser.parse_input(text, weight_kg)["llm"])),
+        ):
+            calls["onnx"] = 0
+            llm_segments = llm_requests = 0
+            for sentence, _, _ in corpus:
+                n = run(sentence)
+                llm_segments += n
+                llm_requests += n > 0
+            report[name] = {"onnx_calls": calls["onnx"], "llm_segments": llm_segments, "llm_requests": llm_requests}
+    finally:
+        hybrid_parser.encoder = encoder
+    report["router_head"] = hybrid_parser.router_head is not None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--model", action="store_true", help="also run parse_input with the ONNX model")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    report = {
+        **metadata("segmenter", corpus=args.corpus),
+        "split": split_report(corpus),
+        "routing": routing_report(corpus),
+    }
+    if args.model:
+        report["pipeline"] = model_report(corpus)
+    write_report(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Serialization cost of /today_summary for a heavy day.
+
+Builds a synthetic day of food and activity entries and times the old
+dict-of-isoformat + jsonable_encoder + json.dumps path against the orjson
+row and columnar payloads, with and without gzip.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --entries 200 --repeat 2000
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from responses import ORJSONResponse, to_columns
+
+FOOD_FIELDS = ("name", "quantity", "unit", "calories", "protein", "carbs", "fat", "fibre", "sugar", "timestamp")
+ACTIVITY_FIELDS = ("type", "quantity", "unit", "calories_burned", "timestamp")
+
+
+def synthetic_day(entries: int):
+    start = datetime(2026, 3, 1, 7, 0)
+    foods, activities = [], []
+    for i in range(entries):
+        ts = start + timedelta(minutes=4 * i)
+        if i % 4 == 3:
+            activities.append(("walking", 30.0, "minutes", 140 + i, ts))
+        else:
+            foods.append((f"chapati {i}", 2.0, "piece", 240, 6, 40, 5, 4, 1, ts))
+    return foods, activities
+
+
+def legacy_payload(foods, activities):
+    return {
+        "summary": {},
+        "foods": [
+            {**dict(zip(FOOD_FIELDS[:-1], f[:-1])), "timestamp": f[-1].isoformat()} for f in foods
+        ],
+        "activities": [
+            {**dict(zip(ACTIVITY_FIELDS[:-1], a[:-1])), "timestamp": a[-1].isoformat()} for a in activities
+        ],
+    }
+
+
+def timeit(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    return (time.perf_counter() - start) / repeat * 1e6, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    foods, activities = synthetic_day(args.entries)
+    cases = {
+        "legacy_jsonable_encoder": lambda: json.dumps(jsonable_encoder(legacy_payload(foods, activities))).encode(),
+        "orjson_rows": lambda: ORJSONResponse({
+            "summary": {},
+            "foods": [dict(zip(FOOD_FIELDS, f)) for f in foods],
+            "activities": [dict(zip(ACTIVITY_FIELDS, a)) for a in activities],
+        }).body,
+        "orjson_columnar": lambda: ORJSONResponse({
+            "summary": {},
+            "foods": to_columns(foods, FOOD_FIELDS),
+            "activities": to_columns(activities, ACTIVITY_FIELDS),
+        }).body,
+    }
+    results = {}
+    for name, fn in cases.items():
+        us, body = timeit(fn, args.repeat)
+        results[name] = {
+            "us_per_response": round(us, 1),
+            "bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body, compresslevel=9)),
+        }
+    print(json.dumps({"entries": args.entries, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Concurrent /log_input writes against one SQLite file versus per-user shards.
+
+Runs the loadtest (seeded temp database, stub LLM, uvicorn) once per
+--shards value with SHARD_COUNT set accordingly, driving only /log_input by
+default with a zero-latency stub so the database commit dominates. With
+several uvicorn workers the single-file run serializes every commit behind
+one writer lock; the sharded runs spread them over SHARD_COUNT files.
+
+Usage (from backend/):
+    python -m benchmarks.bench_shards --shards 1 4 8 --workers 4 --concurrency 64 --requests 2000 --out shards.json
+"""
+from benchmarks.loadtest import build_parser, run_local
+from benchmarks.stats import metadata, write_report
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument("--shards", nargs="+", type=int, default=[1, 4])
+    parser.set_defaults(endpoints=["/log_input"], llm_latency="fixed:0", workers=4, concurrency=64, users=64, days=7)
+    args = parser.parse_args()
+    if args.url:
+        parser.error("bench_shards starts its own servers; --url is not supported")
+
+    runs = [{"shards": n, "results": run_local(args, {"SHARD_COUNT": str(n)})} for n in args.shards]
+    meta = metadata("shards", concurrency=args.concurrency, requests=args.requests, workers=args.workers,
+                    users=args.users, llm_latency=args.llm_latency)
+    write_report({"meta": meta, "runs": runs}, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+/signin under concurrent load, end to end.
+
+Runs the loadtest (seeded temp database, uvicorn) once per --concurrency
+value against /signin only, so each request pays for the rate limiter
+checks, the hashing pool queue and the KDF itself, plus routing and JSON.
+--wrong-password-rate sends that share of requests with a bad password; all
+requests come from one client IP, so the per-IP limiter starts answering 429
+once SIGNIN_MAX_FAILURES_PER_IP failures are in the window. Reports latency
+percentiles, throughput and the status-code mix (200 / 401 / 429 / 503) per
+run.
+
+Usage (from backend/):
+    python -m benchmarks.bench_signin --concurrency 1 8 32 64 --requests 400 --out signin.json
+"""
+from benchmarks.loadtest import build_parser, run_local
+from benchmarks.stats import metadata, write_report
+
+
+def main():
+    parser = build_parser(conflict_handler="resolve")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.set_defaults(endpoints=["/signin"], requests=400, users=64, days=1, entries=1)
+    args = parser.parse_args()
+    if args.url:
+        parser.error("bench_signin starts its own servers; --url is not supported")
+
+    runs = []
+    for concurrency in args.concurrency:
+        args.concurrency = concurrency
+        runs.append({"concurrency": concurrency, "results": run_local(args)})
+    meta = metadata("signin", requests=args.requests, workers=args.workers, users=args.users,
+                    wrong_password_rate=args.wrong_password_rate)
+    write_report({"meta": meta, "runs": runs}, args.out)
+
+
+if __name__ == "__main__":
+    main()
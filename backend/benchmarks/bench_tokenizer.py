@@ -0,0 +1,60 @@
+"""
+Tokenization cost per segment: the old AutoTokenizer call (padding=True,
+truncation=True, torch tensors) vs the FastTokenizer path (Rust tokenizers
+on tokenizer.json, preallocated NumPy buffers) with a cold and a warm
+token-id cache.
+
+Usage (from backend/):
+    python -m benchmarks.bench_tokenizer --repeat 200 --out tokenizer.json
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.stats import metadata, write_report
+from encoder import ENCODER_MAX_TOKENS, MODEL_DIR, FastTokenizer
+
+CORPUS_PATH = "ml_models/segment_corpus.csv"
+
+
+def per_segment_us(fn, batches: list[list[str]], repeat: int) -> float:
+    count = sum(len(b) for b in batches) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            fn(batch)
+    return round((time.perf_counter() - start) / count * 1e6, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    texts = pd.read_csv(CORPUS_PATH)["segment"].tolist()
+    auto = AutoTokenizer.from_pretrained(MODEL_DIR)
+    results = {}
+    for batch_size in args.batch_sizes:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        cold = FastTokenizer(MODEL_DIR / "tokenizer.json", cache_size=0)
+        warm = FastTokenizer(MODEL_DIR / "tokenizer.json")
+        warm.batch(texts)
+        results[f"batch_{batch_size}"] = {
+            "auto_tokenizer_pt_us": per_segment_us(
+                lambda b: auto(b, padding=True, truncation=True, return_tensors="pt"), batches, args.repeat),
+            "auto_tokenizer_np_us": per_segment_us(
+                lambda b: auto(b, padding=True, truncation=True, return_tensors="np"), batches, args.repeat),
+            "fast_uncached_us": per_segment_us(cold.batch, batches, args.repeat),
+            "fast_cached_us": per_segment_us(warm.batch, batches, args.repeat),
+        }
+    report = {**metadata("tokenizer", segments=len(texts), max_tokens=ENCODER_MAX_TOKENS), "results": results}
+    write_report(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
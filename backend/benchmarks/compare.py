@@ -0,0 +1,64 @@
+"""
+Compare two benchmark reports (micro or loadtest JSON) and flag regressions.
+
+A metric regresses when latency (p50/p95/p99/mean) grows, or throughput
+drops, by more than --threshold (relative). Exits 1 if anything regressed,
+so it can gate CI.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "server_rss_mb")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[dict]:
+    rows = []
+    for name, base in baseline.get("results", {}).items():
+        cand = candidate.get("results", {}).get(name)
+        if not isinstance(base, dict) or not isinstance(cand, dict):
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in base or metric not in cand or not base[metric]:
+                continue
+            change = (cand[metric] - base[metric]) / base[metric]
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            rows.append({
+                "benchmark": name,
+                "metric": metric,
+                "baseline": base[metric],
+                "candidate": cand[metric],
+                "change_pct": round(change * 100, 1),
+                "regression": worse,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else "ok"
+        print(f"{flag:10} {row['benchmark']:28} {row['metric']:15} "
+              f"{row['baseline']:>12} -> {row['candidate']:<12} ({row['change_pct']:+.1f}%)")
+    regressions = [r for r in rows if r["regression"]]
+    print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%} threshold")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+HTTP load test for /log_input, /today_summary and /weight_entries (and /signin).
+
+By default it builds a throwaway environment: a seeded SQLite database in a
+temp directory, the stub OpenAI server (benchmarks.stub_openai, with optional fault injection) and a uvicorn
+instance of main:app pointed at both. An asyncio driver then runs a fixed
+number of requests per endpoint at the given concurrency and reports
+p50/p95/p99 latency, throughput, error count and server RSS as JSON.
+
+Pass --url to drive an already-running server instead (it must already have
+the bench users seeded).
+
+Usage (from backend/):
+    python -m benchmarks.loadtest --concurrency 16 --requests 400 --out load.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import stub_openai
+from llm_provider import StubExtractor
+from benchmarks.stats import metadata, rss_mb, summarize, write_report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+CASES_FILE = BACKEND_DIR / "calorie_test_cases.txt"
+FOOD_SENTENCES = [
+    "had 2 chapati and dal for lunch",
+    "ate poha for breakfast",
+    "1 cup tea with 2 biscuits",
+    "i walked 3 km and had a banana",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _sentences() -> list[str]:
+    cases = [line.strip() for line in CASES_FILE.read_text().splitlines() if line.strip()]
+    return cases + FOOD_SENTENCES
+
+
+async def _wait_ready(url: str, timeout_s: float = 120) -> None:
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/metrics")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+
+async def _tokens(url: str, users: int) -> list[str]:
+    async with httpx.AsyncClient(timeout=30) as client:
+        tokens = []
+        for u in range(users):
+            r = await client.post(f"{url}/signin", json={"username": f"bench{u}", "password": "bench"})
+            r.raise_for_status()
+            tokens.append(r.json()["access_token"])
+        return tokens
+
+
+async def _drive(url: str, tokens: list[str], endpoint: str, requests: int, concurrency: int,
+                 wrong_password_rate: float = 0.0) -> dict:
+    sentences = _sentences()
+    latencies = []
+    errors = 0
+    statuses: dict[str, int] = {}
+    remaining = requests
+
+    def build(client: httpx.AsyncClient, i: int):
+        headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+        if endpoint == "/signin":
+            password = "wrong" if random.random() < wrong_password_rate else "bench"
+            return client.post(f"{url}{endpoint}", json={"username": f"bench{i % len(tokens)}", "password": password})
+        if endpoint == "/log_input":
+            return client.post(f"{url}{endpoint}", json={"sentence": random.choice(sentences)}, headers=headers)
+        return client.get(f"{url}{endpoint}", headers=headers)
+
+    async def worker(client: httpx.AsyncClient, wid: int):
+        nonlocal remaining, errors
+        i = wid
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            try:
+                r = await build(client, i)
+                ok = r.status_code < 400
+                statuses[str(r.status_code)] = statuses.get(str(r.status_code), 0) + 1
+            except httpx.TransportError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+            i += concurrency
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, w) for w in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {**summarize(latencies, elapsed), "errors": errors, "status": statuses}
+
+
+async def _run(args, url: str, server_pid: int | None) -> dict:
+    await _wait_ready(url)
+    tokens = await _tokens(url, args.users)
+    results = {}
+    for endpoint in args.endpoints:
+        result = await _drive(url, tokens, endpoint, args.requests, args.concurrency, args.wrong_password_rate)
+        if server_pid:
+            result["server_rss_mb"] = rss_mb(server_pid)
+        results[endpoint] = result
+    return results
+
+
+def build_parser(**kwargs) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter, **kwargs)
+    parser.add_argument("--url", help="drive an existing server instead of starting one")
+    parser.add_argument("--endpoints", nargs="+", default=["/log_input", "/today_summary", "/weight_entries"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--llm-latency", default="fixed:400", help="stub latency spec, e.g. lognormal:400,0.4")
+    parser.add_argument("--llm-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--wrong-password-rate", type=float, default=0.0, help="share of /signin requests with a bad password")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--entries", type=int, default=6)
+    parser.add_argument("--out", help="write the JSON report here as well as stdout")
+    return parser
+
+
+def run_local(args, extra_env: dict | None = None) -> dict:
+    """Seed a temp database, start the stub LLM and uvicorn, drive them and return per-endpoint results."""
+    stub = stub_openai.start(StubExtractor(
+        latency=args.llm_latency, timeout_rate=args.llm_timeout_rate,
+        malformed_rate=args.llm_malformed_rate, rate_limit_rate=args.llm_rate_limit_rate,
+    ))
+    with tempfile.TemporaryDirectory(prefix="nutrilog-bench-") as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(BACKEND_DIR),
+            "DATABASE_URL": "sqlite:///./local.db",
+            "OPENAI_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub.server_port}/v1",
+            **(extra_env or {}),
+        }
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.seed", "--users", str(args.users),
+             "--days", str(args.days), "--entries", str(args.entries)],
+            cwd=workdir, env=env, check=True,
+        )
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=workdir, env=env,
+        )
+        try:
+            return asyncio.run(_run(args, f"http://127.0.0.1:{port}", server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            stub.shutdown()
+
+
+def main():
+    args = build_parser().parse_args()
+    meta = metadata("loadtest", concurrency=args.concurrency, requests=args.requests,
+                    workers=args.workers, llm_latency=args.llm_latency,
+                    llm_timeout_rate=args.llm_timeout_rate, llm_malformed_rate=args.llm_malformed_rate,
+                    llm_rate_limit_rate=args.llm_rate_limit_rate)
+    if args.url:
+        results = asyncio.run(_run(args, args.url.rstrip("/"), None))
+    else:
+        results = run_local(args)
+    write_report({"meta": meta, "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
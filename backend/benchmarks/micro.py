@@ -0,0 +1,79 @@
+"""
+Microbenchmarks for the local parsing and aggregation hot path.
+
+Times split_segments, the regex extractors, detect_activity (ONNX + similarity),
+calculate_realtime_burn and aggregate_summary on inputs from
+calorie_test_cases.txt, and reports per-call latency percentiles plus RSS.
+
+Usage (from backend/):
+    python -m benchmarks.micro --iterations 200 --out micro.json
+"""
+import argparse
+import time
+from pathlib import Path
+
+from benchmarks.stats import metadata, rss_mb, summarize, write_report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+CASES_FILE = BACKEND_DIR / "calorie_test_cases.txt"
+
+
+def load_cases() -> list[str]:
+    return [line.strip() for line in CASES_FILE.read_text().splitlines() if line.strip()]
+
+
+def bench(fn, inputs, iterations: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        arg = inputs[i % len(inputs)]
+        t0 = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--out", help="write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    rss_before = rss_mb()
+    import hybrid_parser
+    from met_engine import calculate_realtime_burn
+    from models import Activity, Food
+    from utils import aggregate_summary
+    rss_after_import = rss_mb()
+
+    cases = load_cases()
+    segments = [seg for case in cases for seg in hybrid_parser.split_segments(case)]
+    foods = [Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40, fat=8,
+                  fibre=2, sugar=2, saturated_fat=1, sodium=300)] * 30
+    activities = [Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)] * 10
+
+    # Warm-up so the first ONNX call's allocation cost is not in the numbers.
+    hybrid_parser.detect_activity(segments[0])
+
+    results = {
+        "split_segments": bench(hybrid_parser.split_segments, cases, args.iterations),
+        "extract_duration": bench(hybrid_parser.extract_duration, segments, args.iterations),
+        "extract_distance": bench(hybrid_parser.extract_distance, segments, args.iterations),
+        "extract_reps": bench(hybrid_parser.extract_reps, segments, args.iterations),
+        "detect_activity": bench(hybrid_parser.detect_activity, segments, args.iterations),
+        "parse_input": bench(lambda s: hybrid_parser.parse_input(s, 70.0), cases, args.iterations),
+        "calculate_realtime_burn": bench(
+            lambda _: calculate_realtime_burn(70.0, 170.0, "male", "moderate", 25), [None], args.iterations
+        ),
+        "aggregate_summary": bench(lambda _: aggregate_summary(activities, foods), [None], args.iterations),
+    }
+    report = {
+        "meta": metadata("micro", iterations=args.iterations),
+        "rss_mb": {"before_import": rss_before, "after_import": rss_after_import, "end": rss_mb()},
+        "results": results,
+    }
+    write_report(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Seed the database in the current directory with benchmark users and history.
+
+Creates users bench0..bench<N-1> (password "bench") and `days` days of logs
+with `entries` logs per day each, plus a weight entry per day. Run it from an
+empty working directory: crud opens ./local.db (and its shard files when
+SHARD_COUNT > 1) relative to the cwd.
+
+Usage:
+    python -m benchmarks.seed --users 20 --days 30 --entries 6
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from crud import (
+    ActivityDB, FoodDB, HealthLogDB, SessionLocal, WeightEntryDB, add_to_daily_totals, create_user, totals_delta, use_shard,
+)
+from models import SignUpInput
+
+
+def seed(users: int, days: int, entries: int, texts: tuple[str, ...] = ("seeded entry",)) -> None:
+    session = SessionLocal()
+    now = datetime.now()
+    try:
+        for u in range(users):
+            username = f"bench{u}"
+            create_user(session, SignUpInput(
+                username=username, password="bench", weight_kg=70, target_weight_kg=65,
+                height_cm=170, gender="male", activity_level="moderate", goal="weight_loss",
+            ))
+            use_shard(session, username)
+            for d in range(days):
+                day = now - timedelta(days=d)
+                session.add(WeightEntryDB(user_id=username, value_kg=70 - d * 0.05, recorded_at=day))
+                for e in range(entries):
+                    ts = day - timedelta(minutes=15 * e)
+                    log = HealthLogDB(user_id=username, raw_text=texts[(d * entries + e) % len(texts)], timestamp=ts)
+                    session.add(log)
+                    session.flush()
+                    foods = [FoodDB(log_id=log.id, user_id=username, name="poha", quantity=1, unit="plate",
+                                    calories=250, protein=5, carbs=40, fat=8, fibre=2, sugar=2,
+                                    saturated_fat=1, sodium=300)]
+                    activities = []
+                    if e % 2 == 0:
+                        activities.append(ActivityDB(log_id=log.id, user_id=username, type="walking", quantity=30,
+                                                     unit="minutes", calories_burned=120))
+                    session.add_all(foods + activities)
+                    add_to_daily_totals(session, username, ts.date(), totals_delta(activities, foods))
+            session.commit()
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--entries", type=int, default=6)
+    args = parser.parse_args()
+    seed(args.users, args.days, args.entries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Shared helpers for the benchmark scripts: latency summaries, RSS, JSON output."""
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import psutil
+
+
+def summarize(latencies_s, elapsed_s: float | None = None) -> dict:
+    """p50/p95/p99/mean in ms for a list of per-call latencies (seconds)."""
+    lat_ms = np.asarray(latencies_s, dtype=float) * 1000
+    if lat_ms.size == 0:
+        return {"count": 0}
+    result = {
+        "count": int(lat_ms.size),
+        "mean_ms": round(float(lat_ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(lat_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 4),
+    }
+    if elapsed_s:
+        result["throughput_rps"] = round(lat_ms.size / elapsed_s, 2)
+    return result
+
+
+def rss_mb(pid: int | None = None) -> float:
+    """Resident set size of a process (and its children, e.g. uvicorn workers)."""
+    proc = psutil.Process(pid or os.getpid())
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return round(total / 1024**2, 2)
+
+
+def metadata(kind: str, **extra) -> dict:
+    return {
+        "kind": kind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+def write_report(report: dict, path: str | None) -> None:
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    print(text)
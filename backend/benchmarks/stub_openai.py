@@ -0,0 +1,96 @@
+"""
+Local HTTP stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions from the llm_provider fixture table
+(StubExtractor) with configurable latency and injected faults: slow
+responses that trip client timeouts, 429 rate-limit errors and truncated
+JSON content. Point the backend at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1, or use LLM_PROVIDER=stub for
+the same behaviour in-process.
+
+Usage (from backend/):
+    python -m benchmarks.stub_openai --port 8765 --latency lognormal:400,0.4 --rate-limit-rate 0.02
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_provider import StubExtractor
+from prompts import count_tokens
+
+
+def make_handler(extractor: StubExtractor):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            user_prompt = next(
+                (m["content"] for m in reversed(request.get("messages", [])) if m.get("role") == "user"), ""
+            )
+            delay, fault = extractor.plan()
+            time.sleep(delay)
+            if fault == "rate_limit":
+                self._send(429, {"error": {"message": "Rate limit reached (stub)", "type": "requests",
+                                           "code": "rate_limit_exceeded"}})
+                return
+            content = extractor.render(user_prompt, fault)
+            prompt_tokens = sum(count_tokens(m.get("content", "")) for m in request.get("messages", []))
+            completion_tokens = count_tokens(content)
+            self._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start(extractor: StubExtractor, port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in in a daemon thread; returns the server (server_port has the bound port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(extractor))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:400", help="fixed:<ms> | uniform:<lo>-<hi> | lognormal:<median>,<sigma>")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-ms", type=float, default=30000)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    extractor = StubExtractor(
+        latency=args.latency, timeout_rate=args.timeout_rate, timeout_ms=args.timeout_ms,
+        malformed_rate=args.malformed_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(extractor))
+    print(f"stub OpenAI listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
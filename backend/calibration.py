@@ -0,0 +1,236 @@
+"""
+Confidence thresholds for resolving an activity locally instead of asking the LLM.
+
+parse_input accepts the best activity candidate when its cosine score clears
+that activity's threshold and its margin over the runner-up clears the margin
+threshold. Thresholds live in ml_models/activity_thresholds.json:
+    {"default": {"score": 0.5, "margin": 0.0},
+     "activities": {"running": {"score": 0.46, "margin": 0.0}, ...}}
+Without the file every activity uses the default, i.e. the old fixed 0.50
+cutoff.
+
+Fit thresholds from the labelled set and print the resolution-rate vs accuracy
+trade-off (needs the ONNX model). Examples are the segmenter's clauses, as
+scored at runtime. "held_out" is the k-fold estimate for thresholds fitted
+this way; "in_sample" is the saved thresholds on the data they came from:
+    python -m calibration fit ml_models/activity_labels.csv --target-accuracy 0.95
+    python -m calibration report ml_models/activity_labels.csv
+
+The labelled set (columns: text,activities) holds the calorie_test_cases.txt
+sentences with the catalogue activities that count as correct ("|"-separated),
+plus food / filler segments with no activity, which must go to the LLM.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+BASE_DIR = Path(__file__).resolve().parent
+THRESHOLDS_PATH = BASE_DIR / "ml_models" / "activity_thresholds.json"
+DEFAULT_SCORE_THRESHOLD = float(os.getenv("ACTIVITY_SCORE_THRESHOLD", "0.50"))
+MARGIN_GRID = (0.0, 0.01, 0.02, 0.05, 0.1)
+
+
+class ActivityThresholds:
+    def __init__(self, default: dict | None = None, activities: dict | None = None):
+        self.default = default or {"score": DEFAULT_SCORE_THRESHOLD, "margin": 0.0}
+        self.activities = activities or {}
+
+    @classmethod
+    def load(cls, path: Path = THRESHOLDS_PATH) -> "ActivityThresholds":
+        if not path.exists():
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("default"), data.get("activities"))
+
+    def save(self, path: Path = THRESHOLDS_PATH) -> None:
+        with open(path, "w") as f:
+            json.dump({"default": self.default, "activities": self.activities}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def for_activity(self, activity: str) -> dict:
+        return self.activities.get(activity.strip(), self.default)
+
+    def accept(self, activity: str, score: float, margin: float) -> bool:
+        threshold = self.for_activity(activity)
+        return score > threshold["score"] and margin >= threshold["margin"]
+
+
+# -----------------------------
+# FITTING
+# -----------------------------
+
+
+def _operating_point(scores, margins, correct, score_t: float, margin_t: float) -> tuple[float, float]:
+    """(resolution rate, accuracy of the resolved ones) for one threshold pair."""
+    accepted = (scores > score_t) & (margins >= margin_t)
+    if not accepted.any():
+        return 0.0, 1.0
+    return float(accepted.mean()), float(correct[accepted].mean())
+
+
+def _best_threshold(scores, margins, correct, target: float) -> dict | None:
+    """
+    Threshold pair with the highest non-zero resolution rate whose accuracy
+    meets target. Score cutoffs sit halfway between neighbouring observed
+    scores rather than just under one of them, so a fitted cutoff does not
+    hinge on a single labelled clause.
+    """
+    observed = np.unique(scores)
+    cutoffs = np.concatenate([[0.0], (observed[:-1] + observed[1:]) / 2])
+    best, best_rate = None, -1.0
+    for score_t in cutoffs:
+        for margin_t in MARGIN_GRID:
+            rate, accuracy = _operating_point(scores, margins, correct, score_t, margin_t)
+            if rate > 0 and accuracy >= target and rate > best_rate:
+                best, best_rate = {"score": round(float(score_t), 4), "margin": margin_t}, rate
+    return best
+
+
+def fit(examples: list[dict], target: float, min_samples: int = 10) -> ActivityThresholds:
+    """
+    examples: {"activity", "score", "margin", "correct"} for each labelled
+    clause's top candidate. The default pair comes from all examples;
+    activities that are the top candidate at least min_samples times get their
+    own pair (or are never resolved locally if no threshold reaches the
+    target). Rarer activities keep the default.
+    """
+    scores = np.array([e["score"] for e in examples])
+    margins = np.array([e["margin"] for e in examples])
+    correct = np.array([e["correct"] for e in examples])
+    default = _best_threshold(scores, margins, correct, target) or {"score": 1.0, "margin": 0.0}
+
+    per_activity = {}
+    for activity in sorted({e["activity"] for e in examples}):
+        idx = np.array([e["activity"] == activity for e in examples])
+        if idx.sum() < min_samples:
+            continue
+        per_activity[activity] = (
+            _best_threshold(scores[idx], margins[idx], correct[idx], target) or {"score": 1.0, "margin": 0.0}
+        )
+    return ActivityThresholds(default, per_activity)
+
+
+def _resolved(examples: list[dict], accepted) -> dict:
+    correct = np.array([e["correct"] for e in examples], dtype=bool)
+    accepted = np.asarray(accepted, dtype=bool)
+    return {
+        "resolution_rate": round(float(accepted.mean()), 4) if len(accepted) else 0.0,
+        "accuracy": round(float(correct[accepted].mean()), 4) if accepted.any() else 1.0,
+    }
+
+
+def _folds(examples: list[dict], k: int, seed: int = 0) -> list[list[int]]:
+    """Example indices in k folds. All clauses of one labelled text share a fold."""
+    texts = sorted({e["text"] for e in examples})
+    np.random.default_rng(seed).shuffle(texts)
+    fold_of = {text: i % k for i, text in enumerate(texts)}
+    return [[n for n, e in enumerate(examples) if fold_of[e["text"]] == fold] for fold in range(k)]
+
+
+def cross_validate(examples: list[dict], target: float, min_samples: int = 10, k: int = 5) -> dict:
+    """
+    Held-out resolution rate and accuracy of fit(): every fold is resolved
+    with thresholds fitted on the other k-1 folds, so no example is judged by
+    thresholds it helped choose.
+    """
+    k = max(2, min(k, len({e["text"] for e in examples})))
+    accepted = np.zeros(len(examples), dtype=bool)
+    for held_out in _folds(examples, k):
+        held = set(held_out)
+        thresholds = fit([e for n, e in enumerate(examples) if n not in held], target, min_samples)
+        for n in held_out:
+            e = examples[n]
+            accepted[n] = thresholds.accept(e["activity"], e["score"], e["margin"])
+    return {"folds": k, **_resolved(examples, accepted)}
+
+
+def tradeoff(examples: list[dict], thresholds: ActivityThresholds | None = None) -> dict:
+    """
+    Resolution rate and accuracy across global cutoffs. With thresholds, also
+    their point on these same examples ("in_sample": optimistic when the
+    thresholds were fitted on them; use cross_validate for the estimate).
+    """
+    scores = np.array([e["score"] for e in examples])
+    margins = np.array([e["margin"] for e in examples])
+    correct = np.array([e["correct"] for e in examples])
+    sweep = []
+    for score_t in np.arange(0.30, 0.91, 0.05):
+        rate, accuracy = _operating_point(scores, margins, correct, score_t, 0.0)
+        sweep.append({"score": round(float(score_t), 2), "resolution_rate": round(rate, 4), "accuracy": round(accuracy, 4)})
+    report = {"examples": len(examples), "texts": len({e["text"] for e in examples}), "sweep": sweep}
+    if thresholds is not None:
+        report["in_sample"] = _resolved(examples, [thresholds.accept(e["activity"], e["score"], e["margin"]) for e in examples])
+    return report
+
+
+def score_examples(labels_path: str) -> list[dict]:
+    """
+    Top activity candidate for every clause of every labelled text that would
+    reach the activity thresholds at runtime: texts are split with the
+    runtime segmenter, and clauses routed to food or ignore are skipped, as
+    parse_batch does.
+    """
+    import pandas as pd
+
+    import hybrid_parser
+    from segmenter import route_segment, split_clauses
+
+    labelled = pd.read_csv(labels_path, keep_default_na=False)
+    examples = []
+    for text, expected in zip(labelled["text"], labelled["activities"]):
+        accepted = {a.strip() for a in expected.split("|") if a.strip()}
+        for clause in split_clauses(text):
+            route = route_segment(clause)
+            if route in ("food", "ignore"):
+                continue
+            embedding = hybrid_parser.encoder.embed([clause])
+            if route == "unknown" and hybrid_parser.router_head is not None:
+                if hybrid_parser.router_head.predict(embedding) in ("food", "ignore"):
+                    continue
+            best = hybrid_parser.match_activity(embedding)[0]
+            examples.append({
+                "text": text,
+                "clause": clause,
+                "activity": best.activity.strip(),
+                "score": float(best.score),
+                "margin": float(best.margin),
+                "correct": best.activity.strip() in accepted,
+            })
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("fit", "report"))
+    parser.add_argument("labels")
+    parser.add_argument("--target-accuracy", type=float, default=0.95)
+    parser.add_argument("--min-samples", type=int, default=10)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--out", help="write the trade-off report to this file too")
+    args = parser.parse_args()
+
+    examples = score_examples(args.labels)
+    if args.command == "fit":
+        thresholds = fit(examples, args.target_accuracy, args.min_samples)
+        thresholds.save()
+    else:
+        thresholds = ActivityThresholds.load()
+    report = tradeoff(examples, thresholds)
+    report["held_out"] = cross_validate(examples, args.target_accuracy, args.min_samples, args.folds)
+    report["fixed_0.50"] = tradeoff(examples, ActivityThresholds({"score": 0.5, "margin": 0.0}))["in_sample"]
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, Nullable, String, Float, DateTime, ForeignKey, create_engine, engine, text
-from sqlalchemy.orm import relationship, declarative_base, sessionmaker
+from datetime import date as date_type, datetime, timedelta
+from sqlalchemy import Column, Date, Integer, Nullable, String, Float, DateTime, ForeignKey, Index, and_, create_engine, engine, func, inspect, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import relationship, declarative_base, selectinload
 import uuid
-import hashlib
 import os
+from collections import defaultdict
+from typing import NamedTuple
 from dotenv import load_dotenv
+import archive
+from ids import BinaryUUID, is_valid, new_id
 from models import SignUpInput
+from passwords import DUMMY_HASH, hash_password, needs_rehash, verify_password
+from storage import SHARD_COUNT, SessionLocal, catalogue_engine, shard_indexes, shard_session, tables_by_engine, use_shard
 
 load_dotenv(override=True)
 
@@ -13,14 +20,6 @@ load_dotenv(override=True)
 Base = declarative_base()
 
 
-def _hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def verify_password(password: str, stored_hash: str) -> bool:
-    return _hash_password(password) == stored_hash
-
-
 DATABASE_URL = os.getenv("DATABASE_URL")
 # DATABASE_URL = os.getenv("DATABASE_URL_LOCAL")
 
@@ -36,7 +35,7 @@ if not DATABASE_URL:
 class UserDB(Base):
     __tablename__ = "users"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
     username = Column(String, unique=True, nullable=False, index=True)
     password_hash = Column(String, nullable=False)
     weight_kg = Column(Float, nullable=False)
@@ -51,44 +50,61 @@ class UserDB(Base):
 class WeightEntryDB(Base):
     __tablename__ = "weight_entries"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, nullable=False, index=True)
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
+    user_id = Column(String, nullable=False)
     value_kg = Column(Float, nullable=False)
-    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_weight_entries_user_id_recorded_at", "user_id", "recorded_at"),
+        Index("ix_weight_entries_user_id_version", "user_id", "version"),
+    )
 
 
 class HealthLogDB(Base):
     __tablename__ = "health_logs"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, nullable=False, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
+    user_id = Column(String, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
     raw_text = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
 
     activities = relationship("ActivityDB", back_populates="log", cascade="all, delete")
     foods = relationship("FoodDB", back_populates="log", cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_health_logs_user_id_timestamp", "user_id", "timestamp", "id"),
+        Index("ix_health_logs_user_id_version", "user_id", "version"),
+    )
+
 
 class ActivityDB(Base):
     __tablename__ = "activities"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    log_id = Column(String, ForeignKey("health_logs.id", ondelete="CASCADE"))
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
+    log_id = Column(BinaryUUID, ForeignKey("health_logs.id", ondelete="CASCADE"), index=True)
     user_id = Column(String, nullable=False, index=True)
 
     type = Column(String, nullable=False)
     quantity = Column(Float, nullable=False)
     unit = Column(String, nullable=False)
     calories_burned = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
 
     log = relationship("HealthLogDB", back_populates="activities")
 
+    __table_args__ = (
+        Index("ix_activities_user_id_version", "user_id", "version"),
+    )
+
 
 class FoodDB(Base):
     __tablename__ = "foods"
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    log_id = Column(String, ForeignKey("health_logs.id", ondelete="CASCADE"))
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
+    log_id = Column(BinaryUUID, ForeignKey("health_logs.id", ondelete="CASCADE"), index=True)
     user_id = Column(String, nullable=False, index=True)
 
     name = Column(String, nullable=False)
@@ -103,9 +119,91 @@ class FoodDB(Base):
     sugar = Column(Integer, nullable=False)
     saturated_fat = Column(Integer, nullable=False)
     sodium = Column(Integer, nullable=False)
+    # "llm" or "catalogue" (food_catalogue.py); NULL on rows logged before the column existed, all LLM.
+    source = Column(String, nullable=True, default="llm")
+    version = Column(Integer, nullable=False, default=0)
 
     log = relationship("HealthLogDB", back_populates="foods")
 
+    __table_args__ = (
+        Index("ix_foods_user_id_version", "user_id", "version"),
+    )
+
+
+class PendingEnrichmentDB(Base):
+    """LLM-bound segments of a log saved with local-only results while the LLM was unavailable."""
+    __tablename__ = "pending_enrichments"
+
+    id = Column(BinaryUUID, primary_key=True, default=new_id)
+    log_id = Column(BinaryUUID, ForeignKey("health_logs.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, nullable=False)
+    system_prompt = Column(String, nullable=False)
+    user_prompt = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Lease taken by an enrichment worker (see claim_pending_enrichments); free when NULL or expired
+    claimed_by = Column(String, nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+
+
+class DeletedRowDB(Base):
+    """Tombstone for /sync: a log, food, activity or weight entry deleted at `version`."""
+    __tablename__ = "deleted_rows"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # log | food | activity | weight_entry
+    row_id = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_deleted_rows_user_id_version", "user_id", "version"),
+    )
+
+
+class UserVersionDB(Base):
+    """
+    The user's change version, bumped once per write transaction touching their
+    logs or weights; rows carry the value they were written at. Kept next to the
+    rows (not on users) so a write never touches the shared users catalogue.
+    """
+    __tablename__ = "user_versions"
+
+    user_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class DailyTotalsDB(Base):
+    """Running per-user, per-day sums of foods and activities, updated on every write."""
+    __tablename__ = "daily_totals"
+
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    calories_intake = Column(Integer, nullable=False, default=0)
+    calories_burned = Column(Integer, nullable=False, default=0)
+    protein = Column(Integer, nullable=False, default=0)
+    carbs = Column(Integer, nullable=False, default=0)
+    fat = Column(Integer, nullable=False, default=0)
+    fibre = Column(Integer, nullable=False, default=0)
+    sugar = Column(Integer, nullable=False, default=0)
+    saturated_fat = Column(Integer, nullable=False, default=0)
+    sodium = Column(Integer, nullable=False, default=0)
+
+
+class ArchivedMonthDB(Base):
+    """A month of the user's logs moved to an archive segment (see archive.py); its daily_totals stay here."""
+    __tablename__ = "archived_months"
+
+    user_id = Column(String, primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM
+    logs = Column(Integer, nullable=False, default=0)
+
+
+TOTAL_FIELDS = (
+    "calories_intake", "calories_burned", "protein", "carbs", "fat",
+    "fibre", "sugar", "saturated_fat", "sodium",
+)
+
 
 # -----------------------------
 # CRUD OPERATIONS
@@ -118,7 +216,7 @@ def create_user(session,dataObj:SignUpInput):
         raise ValueError("Username already exists")
     user = UserDB(
         username=dataObj.username,
-        password_hash=_hash_password(dataObj.password),
+        password_hash=hash_password(dataObj.password),
         weight_kg=dataObj.weight_kg,
         target_weight_kg=dataObj.target_weight_kg,
         height_cm=dataObj.height_cm,
@@ -137,26 +235,112 @@ def get_user_by_username(session, username: str) -> UserDB | None:
 
 
 def get_user_by_username_and_password(session, username: str, password: str) -> UserDB | None:
-    """Return user if username and password match, else None."""
+    """
+    Return user if username and password match, else None.
+    Legacy or outdated hashes are upgraded to the active scheme on success.
+    """
     user = get_user_by_username(session, username)
     if user is None:
+        verify_password(password, DUMMY_HASH)
         return None
     if not verify_password(password, user.password_hash):
         return None
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        session.commit()
     return user
 
 
-def create_health_log(session, user_id: str, raw_text: str, activities, foods):
+def bump_version(session, user_id: str) -> int:
+    """
+    Next change version for the user, inside the caller's transaction. The
+    upsert holds the row's write lock until commit, so versions become visible
+    in order and a /sync cursor never skips a write.
+    """
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(UserVersionDB).values(user_id=user_id, version=1)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"], set_={"version": UserVersionDB.version + 1},
+    ))
+    return get_change_version(session, user_id)
+
+
+def get_change_version(session, user_id: str) -> int:
+    """The user's current change version (0 before their first write)."""
+    return session.query(UserVersionDB.version).filter(UserVersionDB.user_id == user_id).scalar() or 0
+
+
+def _tombstone(session, user_id: str, kind: str, row_id: str, version: int):
+    session.add(DeletedRowDB(user_id=user_id, kind=kind, row_id=row_id, version=version))
+
+
+def totals_delta(activities, foods, sign: int = 1) -> dict:
+    """Per-field sums of foods and activities, negated when sign is -1."""
+    delta = dict.fromkeys(TOTAL_FIELDS, 0)
+    for a in activities:
+        delta["calories_burned"] += a.calories_burned
+    for f in foods:
+        delta["calories_intake"] += f.calories
+        for field in TOTAL_FIELDS[2:]:
+            delta[field] += getattr(f, field)
+    return {k: sign * v for k, v in delta.items()}
+
+
+def add_to_daily_totals(session, user_id: str, day: date_type | None, delta: dict):
+    """
+    Add delta to the user's totals for day in one atomic upsert, so concurrent
+    writers never lose an update. Not committed here; it joins the caller's
+    transaction.
+    """
+    if day is None or not any(delta.values()):
+        return
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(DailyTotalsDB).values(user_id=user_id, day=day, **delta)
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "day"],
+        set_={k: getattr(DailyTotalsDB, k) + stmt.excluded[k] for k in delta},
+    ))
+
+
+def get_daily_totals(session, user_id: str, day: date_type | None = None) -> dict:
+    """The user's totals for day (default today) as a dict; zeros if nothing was logged."""
+    row = session.get(DailyTotalsDB, (user_id, day or datetime.now().date()))
+    return {k: getattr(row, k) if row else 0 for k in TOTAL_FIELDS}
+
+
+def create_health_log(session, user_id: str, raw_text: str, activities, foods, pending_llm: list[tuple[str, str]] | None = None):
     """
     Persist one full transaction:
     - Creates HealthLog row
     - Inserts related Activity and Food rows
+    - Queues (system_prompt, user_prompt) pairs for later LLM enrichment
     """
+    log = _add_health_log(session, user_id, raw_text, activities, foods, pending_llm)
+    session.commit()
+    return log
+
+
+def create_health_logs(session, user_id: str, entries: list[dict]):
+    """
+    Persist many logs in one transaction. Each entry has the keyword
+    arguments of create_health_log (raw_text, activities, foods, pending_llm)
+    plus an optional client timestamp. Returns the logs in entry order.
+    """
+    logs = [_add_health_log(session, user_id, **entry) for entry in entries]
+    session.commit()
+    return logs
 
+
+def _add_health_log(session, user_id: str, raw_text: str, activities, foods,
+                    pending_llm: list[tuple[str, str]] | None = None, timestamp: datetime | None = None):
+    version = bump_version(session, user_id)
     log = HealthLogDB(
         user_id=user_id,
-        raw_text=raw_text
+        raw_text=raw_text,
+        version=version
     )
+    if timestamp is not None:
+        log.timestamp = timestamp
 
     session.add(log)
     session.flush()  # get log.id before inserting children
@@ -169,7 +353,8 @@ def create_health_log(session, user_id: str, raw_text: str, activities, foods):
                 type=activity.type,
                 quantity=activity.quantity,
                 unit=activity.unit,
-                calories_burned=activity.calories_burned
+                calories_burned=activity.calories_burned,
+                version=version
             )
         )
 
@@ -188,17 +373,256 @@ def create_health_log(session, user_id: str, raw_text: str, activities, foods):
                 fibre=food.fibre,
                 sugar=food.sugar,
                 saturated_fat=food.saturated_fat,
-                sodium=food.sodium
+                sodium=food.sodium,
+                source=getattr(food, "source", "llm"),
+                version=version
             )
         )
 
-    session.commit()
+    add_to_daily_totals(session, user_id, log.timestamp.date(), totals_delta(activities, foods))
+
+    for system_prompt, user_prompt in pending_llm or []:
+        session.add(
+            PendingEnrichmentDB(
+                log_id=log.id,
+                user_id=user_id,
+                system_prompt=system_prompt,
+                user_prompt=user_prompt
+            )
+        )
     return log
 
 
+FOOD_NUTRIENTS = ("calories", "protein", "carbs", "fat", "fibre", "sugar", "saturated_fat", "sodium")
+
+
+def get_owned(session, model, user_id: str, row_id: str):
+    """Row of model (FoodDB, ActivityDB, HealthLogDB) by id if it belongs to the user, else None."""
+    if not is_valid(row_id):
+        return None
+    return session.query(model).filter(model.id == row_id, model.user_id == user_id).first()
+
+
+def _log_day(session, log_id: str) -> date_type | None:
+    ts = session.query(HealthLogDB.timestamp).filter(HealthLogDB.id == log_id).scalar()
+    return ts.date() if ts is not None else None
+
+
+def _rescale(row, changes: dict, fields: tuple[str, ...]) -> dict:
+    """Scale fields by the quantity change, except those set explicitly in changes."""
+    if "quantity" not in changes or changes["quantity"] == row.quantity:
+        return changes
+    if not row.quantity:
+        raise ValueError("Cannot rescale an entry with zero quantity; send the values explicitly.")
+    ratio = changes["quantity"] / row.quantity
+    return {**{f: round(getattr(row, f) * ratio) for f in fields}, **changes}
+
+
+class TotalsChange(NamedTuple):
+    """What an edit or delete did to daily_totals: the user's new version and the delta applied per day."""
+    version: int
+    days: dict
+
+
+def _combine(*deltas: dict) -> dict:
+    return {k: sum(d[k] for d in deltas) for k in TOTAL_FIELDS}
+
+
+def update_food(session, food: FoodDB, changes: dict) -> TotalsChange:
+    """
+    Edit a food in place. Changing quantity rescales every nutrient not given
+    in changes, locally. The day's totals move by the difference in the same
+    transaction.
+    """
+    before = totals_delta([], [food], -1)
+    food.version = version = bump_version(session, food.user_id)
+    for field, value in _rescale(food, changes, FOOD_NUTRIENTS).items():
+        setattr(food, field, value)
+    delta = _combine(before, totals_delta([], [food]))
+    day = _log_day(session, food.log_id)
+    add_to_daily_totals(session, food.user_id, day, delta)
+    session.commit()
+    return TotalsChange(version, {day: delta})
+
+
+def update_activity(session, activity: ActivityDB, changes: dict) -> TotalsChange:
+    """Edit an activity in place; changing quantity rescales calories_burned unless it is given."""
+    before = totals_delta([activity], [], -1)
+    activity.version = version = bump_version(session, activity.user_id)
+    for field, value in _rescale(activity, changes, ("calories_burned",)).items():
+        setattr(activity, field, value)
+    delta = _combine(before, totals_delta([activity], []))
+    day = _log_day(session, activity.log_id)
+    add_to_daily_totals(session, activity.user_id, day, delta)
+    session.commit()
+    return TotalsChange(version, {day: delta})
+
+
+def update_health_log(session, log: HealthLogDB, changes: dict) -> TotalsChange:
+    """Edit a log's raw_text or timestamp in place; moving it to another day moves its totals too."""
+    old_day = log.timestamp.date()
+    log.version = version = bump_version(session, log.user_id)
+    for field, value in changes.items():
+        setattr(log, field, value)
+    new_day = log.timestamp.date()
+    days = {old_day: dict.fromkeys(TOTAL_FIELDS, 0)}
+    if new_day != old_day:
+        days = {
+            old_day: totals_delta(log.activities, log.foods, -1),
+            new_day: totals_delta(log.activities, log.foods),
+        }
+        for day, delta in days.items():
+            add_to_daily_totals(session, log.user_id, day, delta)
+    session.commit()
+    return TotalsChange(version, days)
+
+
+def delete_food(session, food: FoodDB) -> TotalsChange:
+    version = bump_version(session, food.user_id)
+    _tombstone(session, food.user_id, "food", food.id, version)
+    day, delta = _log_day(session, food.log_id), totals_delta([], [food], -1)
+    add_to_daily_totals(session, food.user_id, day, delta)
+    session.delete(food)
+    session.commit()
+    return TotalsChange(version, {day: delta})
+
+
+def delete_activity(session, activity: ActivityDB) -> TotalsChange:
+    version = bump_version(session, activity.user_id)
+    _tombstone(session, activity.user_id, "activity", activity.id, version)
+    day, delta = _log_day(session, activity.log_id), totals_delta([activity], [], -1)
+    add_to_daily_totals(session, activity.user_id, day, delta)
+    session.delete(activity)
+    session.commit()
+    return TotalsChange(version, {day: delta})
+
+
+def delete_health_log(session, log: HealthLogDB) -> TotalsChange:
+    """Delete a log with its foods, activities and queued enrichments, and subtract it from its day."""
+    version = bump_version(session, log.user_id)
+    _tombstone(session, log.user_id, "log", log.id, version)
+    for food in log.foods:
+        _tombstone(session, log.user_id, "food", food.id, version)
+    for activity in log.activities:
+        _tombstone(session, log.user_id, "activity", activity.id, version)
+    day, delta = log.timestamp.date(), totals_delta(log.activities, log.foods, -1)
+    add_to_daily_totals(session, log.user_id, day, delta)
+    session.query(PendingEnrichmentDB).filter(PendingEnrichmentDB.log_id == log.id).delete()
+    session.delete(log)
+    session.commit()
+    return TotalsChange(version, {day: delta})
+
+
+def claim_pending_enrichments(session, owner: str, limit: int = 20, max_attempts: int = 5, lease_s: float = 120):
+    """
+    Lease the oldest free queued enrichments to owner for lease_s seconds and
+    commit, so the caller can hold them across a slow LLM call without an
+    open transaction. The claim is one conditional UPDATE: of several workers
+    sweeping the same shard, each row goes to exactly one until its lease
+    expires. Returns the claimed rows; copy what you need before closing the
+    session.
+    """
+    now = datetime.utcnow()
+    until = now + timedelta(seconds=lease_s)
+    free = or_(PendingEnrichmentDB.claimed_until.is_(None), PendingEnrichmentDB.claimed_until < now)
+    oldest = (
+        select(PendingEnrichmentDB.id)
+        .where(PendingEnrichmentDB.attempts < max_attempts, free)
+        .order_by(PendingEnrichmentDB.created_at)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    session.query(PendingEnrichmentDB).filter(
+        PendingEnrichmentDB.id.in_(oldest), PendingEnrichmentDB.attempts < max_attempts, free
+    ).update(
+        {PendingEnrichmentDB.claimed_by: owner, PendingEnrichmentDB.claimed_until: until},
+        synchronize_session=False,
+    )
+    session.commit()
+    claimed = (
+        session.query(PendingEnrichmentDB)
+        .filter(PendingEnrichmentDB.claimed_by == owner, PendingEnrichmentDB.claimed_until == until)
+        .order_by(PendingEnrichmentDB.created_at)
+        .all()
+    )
+    return claimed
+
+
+def _claimed(session, pending_id: str, owner: str):
+    """The queue row if no other worker has claimed or completed it since owner did, else None."""
+    return (
+        session.query(PendingEnrichmentDB)
+        .filter(PendingEnrichmentDB.id == pending_id, PendingEnrichmentDB.claimed_by == owner)
+        .first()
+    )
+
+
+def release_enrichments(session, pending_ids: list[str], owner: str, failed: bool = False) -> None:
+    """Give owner's leases back so any worker may retry them now; failed counts an attempt."""
+    changes = {PendingEnrichmentDB.claimed_by: None, PendingEnrichmentDB.claimed_until: None}
+    if failed:
+        changes[PendingEnrichmentDB.attempts] = PendingEnrichmentDB.attempts + 1
+    session.query(PendingEnrichmentDB).filter(
+        PendingEnrichmentDB.id.in_(pending_ids), PendingEnrichmentDB.claimed_by == owner
+    ).update(changes, synchronize_session=False)
+    session.commit()
+
+
+def complete_enrichment(session, pending_id: str, owner: str, activities, foods):
+    """
+    Attach LLM results to the original log and drop the queue row, in one
+    commit, unless another worker took the row over after owner's lease
+    expired. Returns the log's day, or None if the row was taken over
+    (nothing is written then).
+    """
+    pending = _claimed(session, pending_id, owner)
+    # Dropping the row first takes the write lock, so a worker taking it over now has to wait and find it gone.
+    if pending is None or not session.query(PendingEnrichmentDB).filter(
+        PendingEnrichmentDB.id == pending_id, PendingEnrichmentDB.claimed_by == owner
+    ).delete(synchronize_session=False):
+        session.rollback()
+        return None
+    version = bump_version(session, pending.user_id)
+    for activity in activities:
+        session.add(
+            ActivityDB(
+                log_id=pending.log_id,
+                user_id=pending.user_id,
+                type=activity.type,
+                quantity=activity.quantity,
+                unit=activity.unit,
+                calories_burned=activity.calories_burned,
+                version=version
+            )
+        )
+    for food in foods:
+        session.add(
+            FoodDB(
+                log_id=pending.log_id,
+                user_id=pending.user_id,
+                name=food.name,
+                quantity=food.quantity,
+                unit=food.unit,
+                calories=food.calories,
+                protein=food.protein,
+                carbs=food.carbs,
+                fat=food.fat,
+                fibre=food.fibre,
+                sugar=food.sugar,
+                saturated_fat=food.saturated_fat,
+                sodium=food.sodium,
+                version=version
+            )
+        )
+    day = _log_day(session, pending.log_id)
+    add_to_daily_totals(session, pending.user_id, day, totals_delta(activities, foods))
+    session.commit()
+    return day
+
+
 def get_daily_logs(session, user_id: str, date: datetime | None = None):
     """
-    Fetch all logs for a user on a given date.
+    Fetch all logs for a user on a given date, including archived ones.
     """
     if date is None:
         date = datetime.now().date()
@@ -206,16 +630,161 @@ def get_daily_logs(session, user_id: str, date: datetime | None = None):
     start = datetime(date.year, date.month, date.day)
     end = datetime(date.year, date.month, date.day, 23, 59, 59)
 
-    return session.query(HealthLogDB).filter(
+    logs = session.query(HealthLogDB).filter(
         HealthLogDB.user_id == user_id,
         HealthLogDB.timestamp >= start,
         HealthLogDB.timestamp <= end
     ).order_by(HealthLogDB.timestamp.desc()).all()
+    month = archive.month_key(date)
+    if session.get(ArchivedMonthDB, (user_id, month)) is not None:
+        logs += _archived_logs(user_id, month, lambda ts, _: start <= ts <= end)
+        logs.sort(key=lambda log: log.timestamp, reverse=True)
+    return logs
+
+
+def get_logs_page(session, user_id: str, before: tuple[datetime, str] | None = None, limit: int = 20):
+    """
+    Fetch one page of a user's logs, newest first, using keyset pagination.
+    `before` is the (timestamp, id) of the last log on the previous page.
+    Foods and activities are loaded with one IN query each, so a page always
+    costs three queries regardless of its size. Once the hot rows run out,
+    the page continues into archived months.
+    """
+    query = session.query(HealthLogDB).filter(HealthLogDB.user_id == user_id)
+    if before is not None:
+        before_ts, before_id = before
+        query = query.filter(
+            or_(
+                HealthLogDB.timestamp < before_ts,
+                and_(HealthLogDB.timestamp == before_ts, HealthLogDB.id < before_id),
+            )
+        )
+    logs = (
+        query.options(selectinload(HealthLogDB.foods), selectinload(HealthLogDB.activities))
+        .order_by(HealthLogDB.timestamp.desc(), HealthLogDB.id.desc())
+        .limit(limit)
+        .all()
+    )
+    months = get_archived_months(session, user_id)
+    # Archived rows can only reach this page if it is short or reaches back into an archived month.
+    if not months or (len(logs) == limit and logs[-1].timestamp >= archive.month_bounds(months[0])[1]):
+        return logs
+    archived = []
+    for month in months:
+        if before is not None and month > archive.month_key(before[0]):
+            continue
+        archived += _archived_logs(
+            user_id, month, lambda ts, log_id: before is None or (ts, log_id) < before, limit
+        )
+        if len(archived) >= limit:
+            break
+    return sorted(logs + archived, key=lambda log: (log.timestamp, log.id), reverse=True)[:limit]
+
+
+def get_archived_months(session, user_id: str) -> list[str]:
+    """The user's archived months (YYYY-MM), newest first."""
+    return [
+        month for (month,) in session.query(ArchivedMonthDB.month)
+        .filter(ArchivedMonthDB.user_id == user_id)
+        .order_by(ArchivedMonthDB.month.desc())
+    ]
+
+
+def _archived_logs(user_id: str, month: str, keep, limit: int | None = None, cache: bool = True) -> list[HealthLogDB]:
+    """
+    Archived logs of one month for which keep(timestamp, id) is true, newest
+    first and at most limit, as detached HealthLogDB objects with their foods
+    and activities (read-only).
+    """
+    segment = archive.read_segment(user_id, month, cache=cache)
+    if segment is None:
+        return []
+    rows = [(datetime.fromisoformat(row["timestamp"]), row) for row in segment["logs"]]
+    rows = [(ts, row) for ts, row in rows if keep(ts, row["id"])]
+    rows.sort(key=lambda item: (item[0], item[1]["id"]), reverse=True)
+    rows = rows[:limit]
+    if not rows:
+        return []
+    foods, activities = defaultdict(list), defaultdict(list)
+    for row in segment["foods"]:
+        foods[row["log_id"]].append(row)
+    for row in segment["activities"]:
+        activities[row["log_id"]].append(row)
+    logs = []
+    for ts, row in rows:
+        log = HealthLogDB(**{**row, "timestamp": ts})
+        log.foods = [FoodDB(**f) for f in foods[row["id"]]]
+        log.activities = [ActivityDB(**a) for a in activities[row["id"]]]
+        logs.append(log)
+    return logs
+
+
+def _row_dict(row) -> dict:
+    return {c.name: getattr(row, c.name) for c in row.__table__.columns}
+
+
+def archive_logs_before(session, cutoff: datetime, chunk: int = 500) -> dict:
+    """
+    Move this session's shard's logs older than cutoff (a month start) into
+    archive segments, one user-month at a time: the segment is written first,
+    then the hot logs, foods and activities are deleted and the month is
+    recorded in archived_months in one transaction. Logs still waiting for
+    LLM enrichment stay hot. daily_totals are left untouched.
+    """
+    pending = select(PendingEnrichmentDB.log_id)
+    moved = {"users": 0, "months": 0, "logs": 0}
+    users = [
+        user_id for (user_id,) in
+        session.query(HealthLogDB.user_id).filter(HealthLogDB.timestamp < cutoff).distinct()
+    ]
+    for user_id in users:
+        first = session.query(func.min(HealthLogDB.timestamp)).filter(
+            HealthLogDB.user_id == user_id, HealthLogDB.timestamp < cutoff
+        ).scalar()
+        month = archive.month_key(first)
+        moved["users"] += 1
+        while True:
+            start, end = archive.month_bounds(month)
+            if start >= cutoff:
+                break
+            month_logs = (
+                session.query(HealthLogDB)
+                .options(selectinload(HealthLogDB.foods), selectinload(HealthLogDB.activities))
+                .filter(
+                    HealthLogDB.user_id == user_id,
+                    HealthLogDB.timestamp >= start,
+                    HealthLogDB.timestamp < end,
+                    HealthLogDB.id.not_in(pending),
+                )
+                .all()
+            )
+            if month_logs:
+                count = archive.write_segment(
+                    user_id, month,
+                    [_row_dict(log) for log in month_logs],
+                    [_row_dict(f) for log in month_logs for f in log.foods],
+                    [_row_dict(a) for log in month_logs for a in log.activities],
+                )
+                ids = [log.id for log in month_logs]
+                for i in range(0, len(ids), chunk):
+                    batch = ids[i:i + chunk]
+                    session.query(FoodDB).filter(FoodDB.log_id.in_(batch)).delete(synchronize_session=False)
+                    session.query(ActivityDB).filter(ActivityDB.log_id.in_(batch)).delete(synchronize_session=False)
+                    session.query(HealthLogDB).filter(HealthLogDB.id.in_(batch)).delete(synchronize_session=False)
+                session.merge(ArchivedMonthDB(user_id=user_id, month=month, logs=count))
+                session.commit()
+                moved["months"] += 1
+                moved["logs"] += len(month_logs)
+            month = archive.month_key(end)
+    return moved
 
 
 def create_weight_entry(session, user_id: str, value_kg: float, recorded_at: datetime | None = None):
     """Add a weight entry for the user. recorded_at defaults to now."""
-    entry = WeightEntryDB(user_id=user_id, value_kg=value_kg, recorded_at=recorded_at or datetime.utcnow())
+    entry = WeightEntryDB(
+        user_id=user_id, value_kg=value_kg, recorded_at=recorded_at or datetime.utcnow(),
+        version=bump_version(session, user_id),
+    )
     session.add(entry)
     session.commit()
     return entry
@@ -232,18 +801,54 @@ def get_weight_entries(session, user_id: str, limit: int = 100):
     )
 
 
+def get_changes_since(session, user_id: str, since: int = 0) -> dict:
+    """
+    Rows of the user's logs, foods, activities and weight entries written
+    after version `since`, and tombstones for rows deleted after it.
+    since=0 returns every row, archived months included (and no tombstones).
+    Archiving keeps ids and versions and writes no tombstones, so later
+    incremental syncs leave archived rows alone on the client.
+    """
+    def changed(model):
+        query = session.query(model).filter(model.user_id == user_id)
+        if since:
+            query = query.filter(model.version > since)
+        return query.order_by(model.version).all()
+
+    deleted = []
+    if since:
+        deleted = (
+            session.query(DeletedRowDB)
+            .filter(DeletedRowDB.user_id == user_id, DeletedRowDB.version > since)
+            .order_by(DeletedRowDB.version)
+            .all()
+        )
+    changes = {
+        "logs": changed(HealthLogDB),
+        "foods": changed(FoodDB),
+        "activities": changed(ActivityDB),
+        "weight_entries": changed(WeightEntryDB),
+        "deleted": deleted,
+    }
+    if not since:
+        # One decoded segment at a time, oldest month first, without churning the read cache.
+        for month in reversed(get_archived_months(session, user_id)):
+            for log in reversed(_archived_logs(user_id, month, lambda ts, _: True, cache=False)):
+                changes["logs"].append(log)
+                changes["foods"] += log.foods
+                changes["activities"] += log.activities
+    return changes
+
+
 # engine = create_engine("sqlite:///./local.db", connect_args={"check_same_thread": False})
 
 # engine = create_engine(
 #     DATABASE_URL,
 #     connect_args={"sslmode": "require"}
 # )
-engine = create_engine(
-    "sqlite:///./local.db",
-    connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base.metadata.create_all(engine)
+engine = catalogue_engine
+for _engine, _tables in tables_by_engine(Base.metadata.sorted_tables):
+    Base.metadata.create_all(_engine, tables=_tables)
 
 
 def _migrate_add_target_weight():
@@ -259,6 +864,178 @@ def _migrate_add_target_weight():
 _migrate_add_target_weight()
 
 
+def _migrate_add_versions():
+    """Add change-version columns to existing tables (pre-existing rows get version 0)."""
+    versioned = {"health_logs", "foods", "activities", "weight_entries"}
+    for shard, tables in tables_by_engine(Base.metadata.sorted_tables):
+        for table in tables:
+            if table.name not in versioned:
+                continue
+            with shard.connect() as conn:
+                try:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+
+
+_migrate_add_versions()
+
+
+def _migrate_add_food_source():
+    """Add foods.source to existing shards (pre-existing rows stay NULL, i.e. LLM-extracted)."""
+    for shard, tables in tables_by_engine(Base.metadata.sorted_tables):
+        if "foods" not in {table.name for table in tables}:
+            continue
+        with shard.connect() as conn:
+            try:
+                conn.execute(text("ALTER TABLE foods ADD COLUMN source TEXT"))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+
+
+_migrate_add_food_source()
+
+
+def _migrate_add_enrichment_claims():
+    """Add the enrichment lease columns to existing shards."""
+    for shard, tables in tables_by_engine(Base.metadata.sorted_tables):
+        if "pending_enrichments" not in {table.name for table in tables}:
+            continue
+        with shard.connect() as conn:
+            for column in ("claimed_by TEXT", "claimed_until DATETIME"):
+                try:
+                    conn.execute(text(f"ALTER TABLE pending_enrichments ADD COLUMN {column}"))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+
+
+_migrate_add_enrichment_claims()
+
+
+def _migrate_user_versions():
+    """Move change versions kept on users (before user_versions existed) into user_versions, single-file only."""
+    if SHARD_COUNT > 1:
+        return
+    with engine.begin() as conn:
+        columns = {c["name"] for c in inspect(conn).get_columns("users")}
+        if "change_version" in columns:
+            conn.execute(text(
+                "INSERT INTO user_versions (user_id, version) "
+                "SELECT username, change_version FROM users WHERE change_version > 0 "
+                "AND username NOT IN (SELECT user_id FROM user_versions)"
+            ))
+
+
+_migrate_user_versions()
+
+
+# Primary and foreign key columns converted to BinaryUUID.
+ID_COLUMNS = {
+    "users": ("id",),
+    "weight_entries": ("id",),
+    "health_logs": ("id",),
+    "activities": ("id", "log_id"),
+    "foods": ("id", "log_id"),
+    "pending_enrichments": ("id", "log_id"),
+}
+
+
+def _migrate_binary_ids():
+    """
+    Rewrite ids stored as 36-character text (databases created before
+    BinaryUUID) to 16-byte blobs in place, one UPDATE per column. SQLite keeps
+    blobs as-is in the old TEXT-declared columns, so no table rebuild is needed;
+    run VACUUM afterwards to hand the freed pages back.
+    """
+    for shard, tables in tables_by_engine(Base.metadata.sorted_tables):
+        if shard.dialect.name != "sqlite":
+            continue
+        with shard.begin() as conn:
+            conn.connection.driver_connection.create_function(
+                "uuid_blob", 1, lambda value: uuid.UUID(value).bytes, deterministic=True
+            )
+            for table in tables:
+                for column in ID_COLUMNS.get(table.name, ()):
+                    conn.execute(text(
+                        f"UPDATE {table.name} SET {column} = uuid_blob({column}) WHERE typeof({column}) = 'text'"
+                    ))
+
+
+_migrate_binary_ids()
+
+
+def _migrate_add_indexes():
+    """Create indexes added after the tables (create_all skips existing tables)."""
+    for shard, tables in tables_by_engine(Base.metadata.sorted_tables):
+        for table in tables:
+            for index in table.indexes:
+                index.create(bind=shard, checkfirst=True)
+
+
+_migrate_add_indexes()
+
+
+# Single-column indexes the (user_id, timestamp, id) / (user_id, recorded_at) composites made redundant.
+REDUNDANT_INDEXES = (
+    "ix_health_logs_user_id",
+    "ix_health_logs_timestamp",
+    "ix_weight_entries_user_id",
+    "ix_weight_entries_recorded_at",
+)
+
+
+def _migrate_drop_redundant_indexes():
+    """Drop indexes that earlier schemas created and the composite indexes now cover."""
+    for shard, _ in tables_by_engine(Base.metadata.sorted_tables):
+        with shard.begin() as conn:
+            for index in REDUNDANT_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+
+_migrate_drop_redundant_indexes()
+
+
+def _migrate_backfill_daily_totals():
+    """Build daily_totals from existing logs the first time the table is created, shard by shard."""
+    for index in shard_indexes():
+        with shard_session(index) as session:
+            _backfill_daily_totals(session)
+
+
+def _backfill_daily_totals(session):
+    if session.query(DailyTotalsDB).first() is not None or session.query(HealthLogDB).first() is None:
+        return
+    totals: dict[tuple[str, date_type], dict] = {}
+    food_sums = (
+        session.query(
+            HealthLogDB.user_id, HealthLogDB.timestamp,
+            *(func.sum(getattr(FoodDB, k)) for k in ("calories",) + TOTAL_FIELDS[2:]),
+        )
+        .join(FoodDB, FoodDB.log_id == HealthLogDB.id)
+        .group_by(HealthLogDB.id)
+    )
+    for user_id, ts, *sums in food_sums:
+        row = totals.setdefault((user_id, ts.date()), dict.fromkeys(TOTAL_FIELDS, 0))
+        row["calories_intake"] += sums[0] or 0
+        for k, v in zip(TOTAL_FIELDS[2:], sums[1:]):
+            row[k] += v or 0
+    burn_sums = (
+        session.query(HealthLogDB.user_id, HealthLogDB.timestamp, func.sum(ActivityDB.calories_burned))
+        .join(ActivityDB, ActivityDB.log_id == HealthLogDB.id)
+        .group_by(HealthLogDB.id)
+    )
+    for user_id, ts, burned in burn_sums:
+        totals.setdefault((user_id, ts.date()), dict.fromkeys(TOTAL_FIELDS, 0))["calories_burned"] += burned or 0
+    session.add_all(DailyTotalsDB(user_id=u, day=d, **row) for (u, d), row in totals.items())
+    session.commit()
+
+
+_migrate_backfill_daily_totals()
+
+
 def get_db():
     db = SessionLocal()
     try:
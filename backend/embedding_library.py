@@ -0,0 +1,218 @@
+"""
+Versioned activity embedding library.
+
+A bundle lives in ml_models/activity_library/:
+- v<N>.npy   float32 (rows, dim) matrix, rows L2-normalized
+- v<N>.json  manifest: labels, MET values, model fingerprint, source CSV
+             hash, matrix shape and sha256
+- CURRENT    the version the app loads
+
+load_library() memory-maps the current matrix (one np.load, no copy) and
+checks it against its manifest: shape, dtype, label / MET counts, the model
+fingerprint of the encoder in use and, unless ACTIVITY_LIBRARY_VERIFY=0, the
+matrix checksum. Any mismatch raises LibraryIntegrityError.
+
+Build from the catalogue CSV (from backend/):
+    python -m embedding_library build            # re-encode only new / renamed rows
+    python -m embedding_library build --full     # re-encode everything
+    python -m embedding_library verify
+Rows are reused from the current bundle when it was built with the same
+model; changing only MET values re-encodes nothing.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+BASE_DIR = Path(__file__).resolve().parent
+LIBRARY_DIR = BASE_DIR / "ml_models" / "activity_library"
+CATALOGUE_CSV = BASE_DIR / "ml_models" / "activity_with_met_2.csv"
+ACTIVITY_LIBRARY_VERIFY = os.getenv("ACTIVITY_LIBRARY_VERIFY", "1") == "1"
+ACTIVITY_LIBRARY_KEEP = int(os.getenv("ACTIVITY_LIBRARY_KEEP", "3"))
+BUNDLE_FORMAT = 1
+
+
+class LibraryIntegrityError(RuntimeError):
+    """The bundle on disk does not match its manifest or the encoder in use."""
+
+
+@dataclass(frozen=True)
+class ActivityLibrary:
+    version: int
+    matrix: np.ndarray  # (rows, dim), L2-normalized, usually a read-only memmap
+    labels: list[str]
+    met: np.ndarray
+    model_hash: str
+
+    @property
+    def met_lookup(self) -> dict:
+        return dict(zip(self.labels, self.met.tolist()))
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def current_version(library_dir: Path = LIBRARY_DIR) -> int | None:
+    pointer = library_dir / "CURRENT"
+    if not pointer.exists():
+        return None
+    return int(pointer.read_text().strip())
+
+
+def read_manifest(version: int, library_dir: Path = LIBRARY_DIR) -> dict:
+    with open(library_dir / f"v{version}.json") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: dict, version: int, library_dir: Path = LIBRARY_DIR) -> None:
+    """Write v{version}.json through a temp file, so a reader never sees it half-written."""
+    path = library_dir / f"v{version}.json"
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+def publish_version(version: int, library_dir: Path, keep: int, suffixes: tuple[str, ...] = (".json", ".npy")) -> None:
+    """
+    Point CURRENT at version, then delete the files (v{n}{suffix}) of all but
+    the newest keep versions.
+    """
+    # Switch CURRENT last, atomically, so a crash mid-build leaves the old version live.
+    tmp = library_dir / "CURRENT.tmp"
+    tmp.write_text(f"{version}\n")
+    os.replace(tmp, library_dir / "CURRENT")
+    versions = sorted({int(p.name[1:].split(".")[0]) for p in library_dir.glob("v*.json")})
+    for old in versions[:-keep]:
+        for suffix in suffixes:
+            (library_dir / f"v{old}{suffix}").unlink(missing_ok=True)
+
+
+def load_library(library_dir: Path = LIBRARY_DIR, model_hash: str | None = None,
+                 verify: bool = ACTIVITY_LIBRARY_VERIFY) -> ActivityLibrary | None:
+    """Memory-map the current bundle, or None if no bundle has been built yet."""
+    version = current_version(library_dir)
+    if version is None:
+        return None
+    try:
+        manifest = read_manifest(version, library_dir)
+    except (OSError, ValueError) as e:
+        raise LibraryIntegrityError(f"Unreadable manifest for v{version}: {e}") from e
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise LibraryIntegrityError(f"v{version}: unsupported bundle format {manifest.get('format')}")
+
+    matrix_path = library_dir / manifest["matrix_file"]
+    if verify and _sha256(matrix_path) != manifest["matrix_sha256"]:
+        raise LibraryIntegrityError(f"v{version}: matrix checksum mismatch")
+    matrix = np.load(matrix_path, mmap_mode="r")
+
+    rows, dim = manifest["rows"], manifest["dim"]
+    if matrix.shape != (rows, dim) or matrix.dtype != np.float32:
+        raise LibraryIntegrityError(f"v{version}: matrix is {matrix.shape} {matrix.dtype}, manifest says ({rows}, {dim}) float32")
+    if len(manifest["labels"]) != rows or len(manifest["met"]) != rows:
+        raise LibraryIntegrityError(f"v{version}: labels / MET not row-aligned with the matrix")
+    if model_hash is not None and manifest["model_hash"] != model_hash:
+        raise LibraryIntegrityError(f"v{version}: built with a different model; rebuild with `python -m embedding_library build --full`")
+
+    return ActivityLibrary(
+        version=version,
+        matrix=matrix,
+        labels=manifest["labels"],
+        met=np.asarray(manifest["met"], dtype=np.float64),
+        model_hash=manifest["model_hash"],
+    )
+
+
+def build(embed, model_hash: str, csv_path: Path = CATALOGUE_CSV, library_dir: Path = LIBRARY_DIR,
+          batch_size: int = 64, full: bool = False) -> dict:
+    """
+    Encode the catalogue and write the next bundle version. embed(list[str]) ->
+    (n, dim) array. Returns build stats.
+    """
+    catalogue = pd.read_csv(csv_path)
+    labels = catalogue["activity_name"].astype(str).tolist()
+    met = catalogue["MET"].astype(float).tolist()
+
+    previous = None if full else load_library(library_dir, verify=True)
+    reusable = {}
+    if previous is not None and previous.model_hash == model_hash:
+        if read_manifest(previous.version, library_dir)["source_sha256"] == _sha256(csv_path):
+            return {"version": previous.version, "rows": len(labels), "encoded": 0, "reused": len(labels), "unchanged": True}
+        reusable = {label: i for i, label in enumerate(previous.labels)}
+
+    missing = [label for label in dict.fromkeys(labels) if label not in reusable]
+    encoded = {}
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        encoded.update(zip(batch, normalize_rows(np.asarray(embed(batch), dtype=np.float32))))
+
+    dim = next(iter(encoded.values())).shape[0] if encoded else previous.matrix.shape[1]
+    matrix = np.empty((len(labels), dim), dtype=np.float32)
+    for row, label in enumerate(labels):
+        matrix[row] = encoded[label] if label in encoded else previous.matrix[reusable[label]]
+
+    library_dir.mkdir(parents=True, exist_ok=True)
+    version = (current_version(library_dir) or 0) + 1
+    matrix_file = f"v{version}.npy"
+    np.save(library_dir / matrix_file, matrix)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_hash": model_hash,
+        "source_csv": csv_path.name,
+        "source_sha256": _sha256(csv_path),
+        "rows": len(labels),
+        "dim": dim,
+        "matrix_file": matrix_file,
+        "matrix_sha256": _sha256(library_dir / matrix_file),
+        "labels": labels,
+        "met": met,
+    }
+    write_manifest(manifest, version, library_dir)
+    publish_version(version, library_dir, keep=ACTIVITY_LIBRARY_KEEP)
+    return {"version": version, "rows": len(labels), "encoded": len(encoded), "reused": len(labels) - sum(l in encoded for l in labels)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "verify"))
+    parser.add_argument("--csv", type=Path, default=CATALOGUE_CSV)
+    parser.add_argument("--full", action="store_true", help="re-encode every row")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    from encoder import get_onnx_embedding, load_encoder, model_fingerprint
+
+    model_hash = model_fingerprint()
+    if args.command == "verify":
+        library = load_library(model_hash=model_hash, verify=True)
+        print("no bundle built yet" if library is None else f"v{library.version} ok: {library.matrix.shape}")
+        return
+    session, tokenizer = load_encoder()
+    stats = build(lambda texts: get_onnx_embedding(texts, session, tokenizer, bucket=True), model_hash,
+                  csv_path=args.csv, batch_size=args.batch_size, full=args.full)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+MiniLM sentence encoder (quantized ONNX) shared by the parser and the
+embedding-library build.
+
+- load_encoder(): ONNX Runtime session + tokenizer from
+  onnx_model_all_minilm_quantized/. Inference is plain NumPy in and out; no
+  torch.
+- get_onnx_embedding(text | list, session, tokenizer): mean-pooled embeddings.
+- model_fingerprint(): sha256 over the model and tokenizer files, stored in
+  embedding bundles so a library built with another model is rejected.
+- get_encoder(): what the parser embeds with. With ENCODER_SOCKET set it
+  talks to the shared encoder service (encoder_service.py) and falls back to
+  an in-process session whenever the service is unreachable or does not
+  answer within ENCODER_TIMEOUT_S.
+
+Session tuning (env):
+- ENCODER_MODEL_FILE: which .onnx in the model dir (default
+  model_quantized.onnx, else model.onnx, else the only .onnx present)
+- ORT_INTRA_OP_THREADS / ORT_INTER_OP_THREADS: 0 = ONNX Runtime default
+- ORT_GRAPH_OPT_LEVEL: disable | basic | extended | all
+- ORT_MEM_ARENA: 1/0, CPU memory arena (off trades speed for lower RSS)
+- ORT_OPTIMIZED_MODEL_DIR: save the graph-optimized model there on first
+  load and load it directly (optimizations off) afterwards. The file name
+  carries the source hash and level, so a new model is never paired with a
+  stale optimized graph. Prefer "extended" when saving: "all" bakes in
+  hardware-specific layouts.
+- ENCODER_LENGTH_BUCKETS=1: in a batch, group texts of similar token length
+  and pad each group only to its own longest text.
+
+Tokenization uses the Rust `tokenizers` library on tokenizer.json directly
+(FastTokenizer): hard ENCODER_MAX_TOKENS truncation sized for short
+segments, an LRU cache of token ids for repeated strings
+(ENCODER_TOKEN_CACHE entries) and per-thread preallocated id / mask buffers.
+ENCODER_FAST_TOKENIZER=0 switches back to transformers' AutoTokenizer.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ipc import client_authkey, connect
+from telemetry import span
+
+# onnxruntime / tokenizers / transformers are imported where a session is
+# actually built, so API workers that only talk to the encoder service never
+# load them.
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_DIR = BASE_DIR / "onnx_model_all_minilm_quantized"
+
+ENCODER_MODEL_FILE = os.getenv("ENCODER_MODEL_FILE", "")
+# 0 lets ONNX Runtime pick (one thread per core). With several API workers on
+# one host, set ORT_INTRA_OP_THREADS so workers x threads <= cores, or run the
+# encoder service instead.
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPT_LEVEL = os.getenv("ORT_GRAPH_OPT_LEVEL", "all")
+ORT_MEM_ARENA = os.getenv("ORT_MEM_ARENA", "1") == "1"
+ORT_OPTIMIZED_MODEL_DIR = os.getenv("ORT_OPTIMIZED_MODEL_DIR", "")
+ENCODER_LENGTH_BUCKETS = os.getenv("ENCODER_LENGTH_BUCKETS", "0") == "1"
+ENCODER_FAST_TOKENIZER = os.getenv("ENCODER_FAST_TOKENIZER", "1") == "1"
+# Segments are usually under 10 words (~15 word pieces with [CLS]/[SEP]).
+ENCODER_MAX_TOKENS = int(os.getenv("ENCODER_MAX_TOKENS", "64"))
+ENCODER_TOKEN_CACHE = int(os.getenv("ENCODER_TOKEN_CACHE", "4096"))
+ENCODER_SOCKET = os.getenv("ENCODER_SOCKET", "")
+# Empty: use the key encoder_service stores next to the socket (see ipc.py).
+ENCODER_AUTHKEY = os.getenv("ENCODER_AUTHKEY", "")
+ENCODER_TIMEOUT_S = float(os.getenv("ENCODER_TIMEOUT_S", "5"))
+ENCODER_RETRY_S = float(os.getenv("ENCODER_RETRY_S", "30"))
+
+SERVICE_ERRORS = (OSError, EOFError, RuntimeError, AuthenticationError)
+
+FINGERPRINT_FILES = ("config.json", "tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "vocab.txt")
+GRAPH_OPT_LEVELS = ("disable", "basic", "extended", "all")
+# Padding-waste threshold for starting a new bucket: a text joins the current
+# group while its length is at least this fraction of the group's longest.
+BUCKET_FILL = 0.75
+
+
+def model_path(model_dir: Path = MODEL_DIR, file_name: str = ENCODER_MODEL_FILE) -> Path:
+    if file_name:
+        return model_dir / file_name
+    for name in ("model_quantized.onnx", "model.onnx"):
+        if (model_dir / name).exists():
+            return model_dir / name
+    candidates = sorted(model_dir.glob("*.onnx"))
+    if len(candidates) != 1:
+        raise FileNotFoundError(f"Expected one .onnx model in {model_dir} (or set ENCODER_MODEL_FILE), found {len(candidates)}")
+    return candidates[0]
+
+
+def session_options(intra_op_threads: int = ORT_INTRA_OP_THREADS, inter_op_threads: int = ORT_INTER_OP_THREADS,
+                    opt_level: str = ORT_GRAPH_OPT_LEVEL, mem_arena: bool = ORT_MEM_ARENA,
+                    optimized_model_path: Path | None = None):
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    if opt_level not in levels:
+        raise ValueError(f"ORT_GRAPH_OPT_LEVEL must be one of {GRAPH_OPT_LEVELS}, got {opt_level!r}")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = levels[opt_level]
+    options.enable_cpu_mem_arena = mem_arena
+    if optimized_model_path is not None:
+        options.optimized_model_filepath = str(optimized_model_path)
+    return options
+
+
+class FastTokenizer:
+    """
+    tokenizer.json through the Rust backend, no padding, hard truncation.
+    batch() fills this thread's preallocated buffers and returns views of
+    them, valid until the same thread's next batch() call.
+    """
+
+    def __init__(self, path: Path, max_tokens: int = ENCODER_MAX_TOKENS, cache_size: int = ENCODER_TOKEN_CACHE):
+        from tokenizers import Tokenizer
+
+        self._tokenizer = Tokenizer.from_file(str(path))
+        self._tokenizer.no_padding()
+        self._tokenizer.enable_truncation(max_length=max_tokens)
+        self.max_tokens = max_tokens
+        self.pad_token_id = self._tokenizer.token_to_id("[PAD]") or 0
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, list[int]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+
+    def ids(self, texts: list[str]) -> list[list[int]]:
+        """Token ids per text, served from the LRU cache where possible."""
+        out: list = [None] * len(texts)
+        misses = []
+        with self._cache_lock:
+            for i, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is None:
+                    misses.append(i)
+                else:
+                    self._cache.move_to_end(text)
+                    out[i] = cached
+        if misses:
+            encodings = self._tokenizer.encode_batch([texts[i] for i in misses])
+            with self._cache_lock:
+                for i, encoding in zip(misses, encodings):
+                    out[i] = encoding.ids
+                    self._cache[texts[i]] = encoding.ids
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return out
+
+    def _buffers(self, size: int) -> tuple[np.ndarray, np.ndarray]:
+        # Flat so that [:rows * width].reshape(rows, width) is a C-contiguous view ORT accepts without a copy.
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].size < size:
+            capacity = max(size, 64 * self.max_tokens)
+            buffers = (np.empty(capacity, dtype=np.int64), np.empty(capacity, dtype=np.int64))
+            self._local.buffers = buffers
+        return buffers
+
+    def batch(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(input_ids, attention_mask), padded to the longest text in the batch."""
+        return self.pad(self.ids(texts))
+
+    def pad(self, sequences: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+        rows, width = len(sequences), max(len(s) for s in sequences)
+        flat_ids, flat_mask = self._buffers(rows * width)
+        input_ids = flat_ids[:rows * width].reshape(rows, width)
+        attention_mask = flat_mask[:rows * width].reshape(rows, width)
+        input_ids.fill(self.pad_token_id)
+        attention_mask.fill(0)
+        for row, seq in enumerate(sequences):
+            input_ids[row, :len(seq)] = seq
+            attention_mask[row, :len(seq)] = 1
+        return input_ids, attention_mask
+
+
+class HFTokenizer:
+    """transformers AutoTokenizer behind the FastTokenizer interface."""
+
+    def __init__(self, model_dir: Path):
+        from transformers import AutoTokenizer
+
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.pad_token_id = self._tokenizer.pad_token_id
+
+    def ids(self, texts: list[str]) -> list[list[int]]:
+        return self._tokenizer(texts, truncation=True)["input_ids"]
+
+    def batch(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        inputs = self._tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        return inputs["input_ids"].astype(np.int64), inputs["attention_mask"].astype(np.int64)
+
+    def pad(self, sequences: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+        return _pad(sequences, self.pad_token_id)
+
+
+def load_tokenizer(model_dir: Path = MODEL_DIR, fast: bool = ENCODER_FAST_TOKENIZER):
+    if fast and (model_dir / "tokenizer.json").exists():
+        return FastTokenizer(model_dir / "tokenizer.json")
+    return HFTokenizer(model_dir)
+
+
+def load_encoder(model_dir: Path = MODEL_DIR, options=None, file_name: str = ENCODER_MODEL_FILE,
+                 opt_level: str = ORT_GRAPH_OPT_LEVEL):
+    import onnxruntime as ort
+
+    path = model_path(model_dir, file_name)
+    if options is None:
+        options = session_options(opt_level=opt_level)
+        if ORT_OPTIMIZED_MODEL_DIR:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+            optimized = Path(ORT_OPTIMIZED_MODEL_DIR) / f"{path.stem}-{digest}-{opt_level}.onnx"
+            if optimized.exists():
+                path, options = optimized, session_options(opt_level="disable")
+            else:
+                optimized.parent.mkdir(parents=True, exist_ok=True)
+                options.optimized_model_filepath = str(optimized)
+    session = ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+    tokenizer = load_tokenizer(model_dir)
+    logger.info("Encoder session: %s (opt=%s, arena=%s)", path.name, opt_level, ORT_MEM_ARENA)
+    return session, tokenizer
+
+
+def _run(session, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """One session run + mean pooling over the attention mask."""
+    feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+    names = {i.name for i in session.get_inputs()}
+    if "token_type_ids" in names:
+        feed["token_type_ids"] = np.zeros_like(input_ids)
+    with span("onnx_inference"):
+        token_embeddings = session.run(["last_hidden_state"], feed)[0]
+
+    # Mean Pooling logic
+    mask = attention_mask[..., None].astype(np.float32)
+    return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def _pad(sequences: list[list[int]], pad_id: int) -> tuple[np.ndarray, np.ndarray]:
+    width = max(len(s) for s in sequences)
+    input_ids = np.full((len(sequences), width), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(sequences), width), dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        input_ids[row, :len(seq)] = seq
+        attention_mask[row, :len(seq)] = 1
+    return input_ids, attention_mask
+
+
+def length_buckets(lengths: list[int], fill: float = BUCKET_FILL) -> list[list[int]]:
+    """Indices grouped so each group's shortest text is >= fill x its longest."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__, reverse=True)
+    groups: list[list[int]] = []
+    for i in order:
+        if groups and lengths[i] >= fill * lengths[groups[-1][0]]:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+
+def get_onnx_embedding(text, session, tokenizer, bucket: bool = ENCODER_LENGTH_BUCKETS):
+    texts = [text] if isinstance(text, str) else list(text)
+    if not bucket or len(texts) == 1:
+        with span("tokenization"):
+            input_ids, attention_mask = tokenizer.batch(texts)
+        return _run(session, input_ids, attention_mask)
+
+    with span("tokenization"):
+        ids = tokenizer.ids(texts)
+    out = None
+    for group in length_buckets([len(s) for s in ids]):
+        pooled = _run(session, *tokenizer.pad([ids[i] for i in group]))
+        if out is None:
+            out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+        out[group] = pooled
+    return out
+
+
+def model_fingerprint(model_dir: Path = MODEL_DIR, file_name: str = ENCODER_MODEL_FILE) -> str:
+    digest = hashlib.sha256()
+    try:
+        files = [model_path(model_dir, file_name)]
+    except FileNotFoundError:
+        files = []
+    files += [model_dir / name for name in FINGERPRINT_FILES]
+    for path in files:
+        if path.exists():
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class LocalEncoder:
+    """In-process ONNX session, loaded on first use unless eager."""
+
+    def __init__(self, eager: bool = True):
+        self._lock = threading.Lock()
+        self.session = self.tokenizer = None
+        if eager:
+            self._load()
+
+    def _load(self):
+        with self._lock:
+            if self.session is None:
+                self.session, self.tokenizer = load_encoder()
+
+    def embed(self, texts) -> np.ndarray:
+        if self.session is None:
+            self._load()
+        return get_onnx_embedding(texts, self.session, self.tokenizer)
+
+
+class RemoteEncoder:
+    """Client for encoder_service; a small pool of connections shared by request threads."""
+
+    def __init__(self, address: str = ENCODER_SOCKET, authkey: str = ENCODER_AUTHKEY, timeout: float = ENCODER_TIMEOUT_S):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return connect(self.address, client_authkey(self.authkey, self.address), self.timeout)
+
+    def embed(self, texts) -> np.ndarray:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            with span("encoder_rpc"):
+                conn.send(("embed", texts))
+                # A hung service must not hold request threads: time out so FallbackEncoder runs locally.
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"Encoder service did not answer within {self.timeout:g}s")
+                status, payload = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        if status != "ok":
+            raise RuntimeError(f"encoder service error: {payload}")
+        return payload
+
+
+class FallbackEncoder:
+    """Remote first; in-process while the service is down, retrying every ENCODER_RETRY_S."""
+
+    def __init__(self, remote: RemoteEncoder, local: LocalEncoder):
+        self.remote = remote
+        self.local = local
+        self._down_until = 0.0
+
+    def embed(self, texts) -> np.ndarray:
+        if time.monotonic() >= self._down_until:
+            try:
+                return self.remote.embed(texts)
+            except SERVICE_ERRORS as e:
+                self._down_until = time.monotonic() + ENCODER_RETRY_S
+                logger.warning("Encoder service at %s unavailable (%s); using in-process session", self.remote.address, e)
+        return self.local.embed(texts)
+
+
+def get_encoder():
+    """In-process encoder, or the shared service (with in-process fallback) when ENCODER_SOCKET is set."""
+    if not ENCODER_SOCKET:
+        return LocalEncoder()
+    remote = RemoteEncoder()
+    try:
+        remote.embed(["warm up"])
+    except SERVICE_ERRORS as e:
+        logger.warning("Encoder service at %s unavailable (%s); loading in-process session", ENCODER_SOCKET, e)
+        return FallbackEncoder(remote, LocalEncoder(eager=True))
+    logger.info("Using encoder service at %s", ENCODER_SOCKET)
+    return FallbackEncoder(remote, LocalEncoder(eager=False))
@@ -0,0 +1,123 @@
+"""
+Shared MiniLM encoder service for several API workers on one host.
+
+One process owns the ONNX Runtime session and serves embedding requests on
+a Unix socket (ENCODER_SOCKET). Requests from all connections are coalesced
+into batches of up to ENCODER_MAX_BATCH texts, waiting at most
+ENCODER_BATCH_WAIT_MS for more to arrive, so N workers share one model in
+memory and one set of ORT threads instead of N competing ones.
+
+Run it next to uvicorn (from backend/):
+    ENCODER_SOCKET=/tmp/nutrilog-encoder.sock python -m encoder_service
+and start the API with the same ENCODER_SOCKET. Workers fall back to an
+in-process session when the socket is missing (see encoder.get_encoder).
+
+Protocol (multiprocessing.connection, authenticated with ENCODER_AUTHKEY, or
+without it a random key kept in <ENCODER_SOCKET>.key, see ipc.py):
+    ("embed", text | [texts]) -> ("ok", float32 array (n, dim)) | ("error", message)
+    ("ping", None)            -> ("ok", stats dict)
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+import numpy as np
+from dotenv import load_dotenv
+
+from encoder import ENCODER_AUTHKEY, ENCODER_SOCKET, LocalEncoder
+from ipc import listen, service_authkey
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", "64"))
+ENCODER_BATCH_WAIT_MS = float(os.getenv("ENCODER_BATCH_WAIT_MS", "2"))
+
+
+class BatchingEncoder:
+    """Coalesces concurrent embed() calls into single model runs."""
+
+    def __init__(self, encoder, max_batch: int = ENCODER_MAX_BATCH, wait_ms: float = ENCODER_BATCH_WAIT_MS):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.wait_s = wait_ms / 1000
+        self.batches = self.texts = 0
+        self._queue: Queue = Queue()
+        threading.Thread(target=self._run, name="encoder-batcher", daemon=True).start()
+
+    def embed(self, texts) -> np.ndarray:
+        future: Future = Future()
+        self._queue.put(([texts] if isinstance(texts, str) else list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.wait_s
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            texts = [text for batch, _ in pending for text in batch]
+            try:
+                embeddings = np.asarray(self.encoder.embed(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for batch, future in pending:
+                future.set_result(embeddings[offset:offset + len(batch)])
+                offset += len(batch)
+
+
+def _serve_connection(conn, batcher: BatchingEncoder):
+    with conn:
+        while True:
+            try:
+                op, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if op == "embed":
+                    conn.send(("ok", batcher.embed(payload)))
+                elif op == "ping":
+                    conn.send(("ok", {"pid": os.getpid(), "batches": batcher.batches, "texts": batcher.texts}))
+                else:
+                    conn.send(("error", f"unknown op {op!r}"))
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                logger.exception("Encoder request failed")
+                conn.send(("error", repr(e)))
+
+
+def serve(address: str = ENCODER_SOCKET, authkey: str = ENCODER_AUTHKEY):
+    if not address:
+        raise SystemExit("Set ENCODER_SOCKET to the Unix socket path to listen on")
+    key = service_authkey(authkey, address)
+    batcher = BatchingEncoder(LocalEncoder())
+    with listen(address, key) as listener:
+        logger.info("Encoder service listening on %s", address)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # failed handshake (wrong authkey) etc.
+                logger.warning("Rejected encoder client: %s", e)
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, batcher), daemon=True).start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    serve()
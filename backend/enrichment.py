@@ -0,0 +1,86 @@
+"""
+Background enrichment of logs saved while the LLM was unavailable.
+
+When /log_input cannot get an extraction (breaker open, deadline, bad JSON),
+it saves the local results and queues the LLM-bound segments in
+pending_enrichments. A daemon thread in every API worker drains that queue
+whenever the circuit breaker lets calls through, attaching the extracted
+foods/activities to the original log. Workers lease rows before calling the
+LLM, so each row is sent once even with several workers.
+"""
+import logging
+import os
+import threading
+import uuid
+
+from dotenv import load_dotenv
+
+from crud import claim_pending_enrichments, complete_enrichment, release_enrichments, shard_indexes, shard_session, totals_delta
+from llm_resilience import LLMUnavailable, ResilientLLM
+from push import publish_summary
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+ENRICH_INTERVAL_S = float(os.getenv("LLM_ENRICH_INTERVAL_S", "15"))
+ENRICH_BATCH = int(os.getenv("LLM_ENRICH_BATCH", "20"))
+ENRICH_MAX_ATTEMPTS = int(os.getenv("LLM_ENRICH_MAX_ATTEMPTS", "5"))
+# How long a worker holds claimed rows; must cover ENRICH_BATCH LLM calls, after which others may retry them
+ENRICH_LEASE_S = float(os.getenv("LLM_ENRICH_LEASE_S", "600"))
+
+
+def drain_once(llm: ResilientLLM) -> int:
+    """
+    Process one batch of queued enrichments from each shard. Returns how many completed.
+
+    Rows are leased to this call first (every API worker runs this loop), and
+    no transaction is open while the LLM is called.
+    """
+    owner = uuid.uuid4().hex
+    done = 0
+    for index in shard_indexes():
+        with shard_session(index) as session:
+            claimed = [
+                (p.id, p.user_id, p.system_prompt, p.user_prompt)
+                for p in claim_pending_enrichments(
+                    session, owner, limit=ENRICH_BATCH, max_attempts=ENRICH_MAX_ATTEMPTS, lease_s=ENRICH_LEASE_S)
+            ]
+        for n, (pending_id, user_id, system_prompt, user_prompt) in enumerate(claimed):
+            unprocessed = [c[0] for c in claimed[n:]]
+            if llm.breaker.is_open():
+                with shard_session(index) as session:
+                    release_enrichments(session, unprocessed, owner)
+                return done
+            try:
+                parsed = llm.extract(system_prompt, user_prompt)
+            except LLMUnavailable as e:
+                with shard_session(index) as session:
+                    release_enrichments(session, unprocessed[:1], owner, failed=True)
+                    release_enrichments(session, unprocessed[1:], owner)
+                logger.warning("Enrichment of queued row %s failed: %s", pending_id, e)
+                return done
+            with shard_session(index) as session:
+                day = complete_enrichment(session, pending_id, owner, parsed.activities, parsed.foods)
+                if day is not None:
+                    publish_summary(session, user_id, day, totals_delta(parsed.activities, parsed.foods))
+                    done += 1
+    return done
+
+
+def start_worker(llm: ResilientLLM) -> threading.Thread:
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(ENRICH_INTERVAL_S):
+            try:
+                completed = drain_once(llm)
+                if completed:
+                    logger.info("Enriched %d queued logs", completed)
+            except Exception:
+                logger.exception("Enrichment worker iteration failed")
+
+    thread = threading.Thread(target=run, name="llm-enrichment", daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
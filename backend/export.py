@@ -0,0 +1,187 @@
+"""
+Streaming export of a user's full history.
+
+Rows are read with yield_per in EXPORT_CHUNK_ROWS chunks, merged in time
+order with the user's archived months (see archive.py) and encoded chunk by
+chunk, so memory stays flat however long the history is. Formats:
+- csv:      one table per export, header row first.
+- ndjson:   one JSON object per row, with a "table" field.
+- columnar: one JSON object per chunk, {"table": ..., "columns": {field: [values...]}}
+            (the same parallel-array layout as /today_summary?format=columnar).
+
+GET /export streams this over HTTP; the app's GZipMiddleware compresses it on
+the fly for clients that accept gzip. From the command line (from backend/):
+    python -m export alice --format csv --tables foods --out foods.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import heapq
+import io
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+
+import orjson
+from dotenv import load_dotenv
+
+import archive
+from crud import (
+    FOOD_NUTRIENTS,
+    ActivityDB,
+    FoodDB,
+    HealthLogDB,
+    SessionLocal,
+    WeightEntryDB,
+    get_archived_months,
+    use_shard,
+)
+
+load_dotenv(override=True)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+# Exported fields per table; the first field is the row's time, used for ordering.
+TABLES = {
+    "logs": ("timestamp", "id", "raw_text"),
+    "foods": ("timestamp", "log_id", "id", "name", "quantity", "unit", *FOOD_NUTRIENTS),
+    "activities": ("timestamp", "log_id", "id", "type", "quantity", "unit", "calories_burned"),
+    "weight_entries": ("recorded_at", "id", "value_kg"),
+}
+MODELS = {"logs": HealthLogDB, "foods": FoodDB, "activities": ActivityDB, "weight_entries": WeightEntryDB}
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "columnar": "application/x-ndjson"}
+EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "columnar": "columnar.ndjson"}
+
+
+def parse_tables(tables: str, format: str) -> list[str]:
+    """Validate a comma-separated table list for format; raises ValueError with a user-facing message."""
+    if format not in MEDIA_TYPES:
+        raise ValueError("Invalid format. Use csv, ndjson or columnar.")
+    selected = [t.strip() for t in tables.split(",") if t.strip()]
+    unknown = [t for t in selected if t not in TABLES]
+    if not selected or unknown:
+        raise ValueError(f"tables must be a comma-separated subset of {', '.join(TABLES)}.")
+    if format == "csv" and len(selected) != 1:
+        raise ValueError("csv exports one table at a time; pass a single table.")
+    return selected
+
+
+def _hot_rows(session, user_id: str, table: str):
+    model = MODELS[table]
+    columns = [
+        HealthLogDB.timestamp if field == "timestamp" else getattr(model, field) for field in TABLES[table]
+    ]
+    query = session.query(*columns).filter(model.user_id == user_id)
+    if model in (FoodDB, ActivityDB):
+        query = query.join(HealthLogDB, model.log_id == HealthLogDB.id)
+    return query.order_by(columns[0], model.id).yield_per(EXPORT_CHUNK_ROWS)
+
+
+def _archived_rows(session, user_id: str, table: str):
+    """Rows of the user's archived months, oldest first, one decoded segment at a time."""
+    if table == "weight_entries":
+        return
+    fields = TABLES[table]
+    for month in reversed(get_archived_months(session, user_id)):
+        segment = archive.read_segment(user_id, month, cache=False)
+        if segment is None:
+            continue
+        times = {log["id"]: datetime.fromisoformat(log["timestamp"]) for log in segment["logs"]}
+        key = "id" if table == "logs" else "log_id"
+        rows = [
+            tuple(times[row[key]] if field == "timestamp" else row[field] for field in fields)
+            for row in segment[table]
+        ]
+        rows.sort(key=lambda row: (row[0], row[fields.index("id")]))
+        yield from rows
+
+
+def table_rows(session, user_id: str, table: str):
+    """Every row of one table for the user, archived and hot, in time order."""
+    id_index = TABLES[table].index("id")
+    return heapq.merge(
+        _archived_rows(session, user_id, table),
+        (tuple(row) for row in _hot_rows(session, user_id, table)),
+        key=lambda row: (row[0], row[id_index]),
+    )
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while chunk := list(islice(rows, EXPORT_CHUNK_ROWS)):
+        yield chunk
+
+
+def _encode_csv(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in chunks:
+        writer.writerows(
+            tuple(v.isoformat() if isinstance(v, datetime) else v for v in row) for row in chunk
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _encode_ndjson(table, fields, chunks):
+    for chunk in chunks:
+        yield b"".join(orjson.dumps({"table": table, **dict(zip(fields, row))}) + b"\n" for row in chunk)
+
+
+def _encode_columnar(table, fields, chunks):
+    for chunk in chunks:
+        columns = {field: list(values) for field, values in zip(fields, zip(*chunk))}
+        yield orjson.dumps({"table": table, "columns": columns}) + b"\n"
+
+
+def stream_export(user_id: str, tables: list[str], format: str):
+    """
+    Encoded export of the user's tables, as byte chunks. Opens its own session
+    (one read transaction, so every table comes from the same snapshot) since
+    it outlives the request's dependencies when streamed.
+    """
+    with SessionLocal() as session:
+        use_shard(session, user_id)
+        for table in tables:
+            fields = TABLES[table]
+            chunks = _chunks(table_rows(session, user_id, table))
+            if format == "csv":
+                yield from _encode_csv(fields, chunks)
+            elif format == "ndjson":
+                yield from _encode_ndjson(table, fields, chunks)
+            else:
+                yield from _encode_columnar(table, fields, chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("username")
+    parser.add_argument("--format", default="ndjson", choices=list(MEDIA_TYPES))
+    parser.add_argument("--tables", default=",".join(TABLES), help="comma-separated subset of " + ", ".join(TABLES))
+    parser.add_argument("--out", help="output file (gzip-compressed if it ends in .gz); stdout by default")
+    args = parser.parse_args()
+    try:
+        tables = parse_tables(args.tables, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.out is None:
+        out = sys.stdout.buffer
+    elif args.out.endswith(".gz"):
+        out = gzip.open(args.out, "wb")
+    else:
+        out = open(args.out, "wb")
+    try:
+        for data in stream_export(args.username, tables, args.format):
+            out.write(data)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
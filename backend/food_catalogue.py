@@ -0,0 +1,482 @@
+"""
+Local food catalogue mined from past LLM extractions.
+
+Every food the LLM extracted is in `foods` with its name, quantity, unit and
+nutrients. The miner groups those rows by normalized name and unit, merges
+groups whose names the MiniLM encoder places together (same unit only), and
+publishes per-unit nutrient medians for clusters with enough consistent
+samples. hybrid_parser consults the catalogue for food segments ("had 2
+chapati", "a bowl of poha") and only falls back to the LLM when nothing
+matches confidently. Foods resolved from the catalogue are stored with
+source="catalogue" and never mined back.
+
+A bundle lives in ml_models/food_catalogue/:
+- v<N>.npy         float32 (entries, dim) matrix, rows L2-normalized
+- v<N>.json        manifest: entries (name, unit, aliases, samples, per-unit
+                   medians), model fingerprint, matrix shape / sha256, mining
+                   watermarks and the last projection report
+- v<N>.groups.json / v<N>.groups.npy
+                   per (name, unit) group counts, reservoir samples and name
+                   embeddings, so a refresh only reads rows added since
+- CURRENT          the version the app loads (read at startup)
+
+Build from backend/:
+    python -m food_catalogue build            # incremental: rows added since the last build
+    python -m food_catalogue build --full     # re-mine everything, archived months included
+    python -m food_catalogue report           # projected LLM-call reduction on logs newer than the build
+
+The report only counts logs the catalogue was not mined from (above the
+manifest's watermarks), so run it again once new logs have come in; each run
+records it in the current manifest ("projection"). build runs it too.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_library import current_version, normalize_rows, publish_version, read_manifest, write_manifest
+
+load_dotenv(override=True)
+
+BASE_DIR = Path(__file__).resolve().parent
+CATALOGUE_DIR = BASE_DIR / "ml_models" / "food_catalogue"
+FOOD_CATALOGUE_ENABLED = os.getenv("FOOD_CATALOGUE_ENABLED", "1") == "1"
+FOOD_MATCH_THRESHOLD = float(os.getenv("FOOD_MATCH_THRESHOLD", "0.9"))
+FOOD_MATCH_MARGIN = float(os.getenv("FOOD_MATCH_MARGIN", "0.03"))
+CATALOGUE_MIN_SAMPLES = int(os.getenv("CATALOGUE_MIN_SAMPLES", "3"))
+CATALOGUE_MAX_SPREAD = float(os.getenv("CATALOGUE_MAX_SPREAD", "0.35"))
+CATALOGUE_MERGE_THRESHOLD = float(os.getenv("CATALOGUE_MERGE_THRESHOLD", "0.92"))
+CATALOGUE_RESERVOIR = int(os.getenv("CATALOGUE_RESERVOIR", "200"))
+CATALOGUE_KEEP = int(os.getenv("CATALOGUE_KEEP", "3"))
+BUNDLE_FORMAT = 1
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat", "fibre", "sugar", "saturated_fat", "sodium")
+
+UNIT_ALIASES = {
+    "piece": "piece", "pieces": "piece", "pc": "piece", "pcs": "piece", "nos": "piece",
+    "serving": "serving", "servings": "serving", "portion": "serving", "portions": "serving",
+    "plate": "plate", "plates": "plate", "bowl": "bowl", "bowls": "bowl",
+    "cup": "cup", "cups": "cup", "glass": "glass", "glasses": "glass",
+    "slice": "slice", "slices": "slice", "katori": "bowl",
+    "tbsp": "tbsp", "tablespoon": "tbsp", "tablespoons": "tbsp",
+    "tsp": "tsp", "teaspoon": "tsp", "teaspoons": "tsp",
+    "g": "g", "gm": "g", "gms": "g", "gram": "g", "grams": "g", "kg": "kg",
+    "ml": "ml", "l": "l", "litre": "l", "liter": "l", "litres": "l", "liters": "l", "oz": "oz",
+}
+# Units a bare number cannot imply ("2 rice" is not 2 g): the segment has to say them.
+MEASURED_UNITS = {"g", "kg", "ml", "l", "oz"}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "half": 0.5}
+STOP_WORDS = {
+    "i", "we", "had", "have", "has", "ate", "eat", "eaten", "eating", "drank", "drink", "drinking",
+    "took", "some", "the", "of", "my", "for", "at", "in", "breakfast", "lunch", "dinner", "snack", "snacks",
+    "today", "just", "also", "then",
+}
+# More than one food in a segment: leave it to the LLM.
+_MULTI_FOOD = re.compile(r",|&|\+|\band\b|\bwith\b|\bplus\b")
+_TOKENS = re.compile(r"\d+(?:[./]\d+)?|[a-z]+")
+
+
+class CatalogueIntegrityError(RuntimeError):
+    """The bundle on disk does not match its manifest or the encoder in use."""
+
+
+class FoodQuery(NamedTuple):
+    phrase: str
+    quantity: float | None
+    unit: str | None
+
+
+def normalize_unit(unit: str) -> str:
+    unit = unit.strip().lower()
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def singular(word: str) -> str:
+    """Crude plural folding so "2 chapatis" and "1 chapati" share an entry."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def _number(token: str) -> float | None:
+    """3, 1.5 or 1/2 as a float (None for a zero denominator)."""
+    if "/" in token:
+        numerator, denominator = token.split("/")
+        return int(numerator) / int(denominator) if int(denominator) else None
+    return float(token)
+
+
+def parse_food_segment(segment: str) -> FoodQuery | None:
+    """Food phrase, quantity and unit of a single-food segment, or None if it names several foods or none."""
+    text = segment.lower()
+    if _MULTI_FOOD.search(text):
+        return None
+    quantity = unit = None
+    words = []
+    for token in _TOKENS.findall(text):
+        if token[0].isdigit() or (token in NUMBER_WORDS and not words):
+            if quantity is not None:
+                return None
+            quantity = _number(token) if token[0].isdigit() else NUMBER_WORDS[token]
+            if quantity is None:
+                return None
+        elif token in UNIT_ALIASES and unit is None and not words:
+            unit = UNIT_ALIASES[token]
+        elif token not in STOP_WORDS:
+            words.append(singular(token))
+    return FoodQuery(" ".join(words), quantity, unit) if words else None
+
+
+def normalize_name(name: str) -> str:
+    """Catalogue key for a food name: lowercase words without quantities, units or filler."""
+    query = parse_food_segment(name.replace(",", " "))
+    return query.phrase if query else " ".join(_TOKENS.findall(name.lower()))
+
+
+@dataclass(frozen=True)
+class FoodCatalogue:
+    version: int
+    matrix: np.ndarray  # (entries, dim), L2-normalized, usually a read-only memmap
+    entries: list[dict]
+    model_hash: str
+
+    def __post_init__(self):
+        aliases: dict[str, list[int]] = {}
+        for i, entry in enumerate(self.entries):
+            for alias in entry["aliases"]:
+                aliases.setdefault(alias, []).append(i)
+        object.__setattr__(self, "_aliases", aliases)
+
+    def exact(self, phrase: str) -> list[int]:
+        return self._aliases.get(phrase, [])
+
+    def _fits(self, index: int, unit: str | None) -> bool:
+        entry_unit = self.entries[index]["unit"]
+        return entry_unit == unit if unit else entry_unit not in MEASURED_UNITS
+
+    def resolve(self, query: FoodQuery, embedding: np.ndarray | None = None) -> tuple[dict, float] | None:
+        """
+        (Food fields, score) for query, or None. An exact alias scores 1.0;
+        otherwise the phrase embedding must reach FOOD_MATCH_THRESHOLD and beat
+        the best entry with a different name by FOOD_MATCH_MARGIN.
+        """
+        candidates = [i for i in self.exact(query.phrase) if self._fits(i, query.unit)]
+        score = 1.0
+        if not candidates:
+            if embedding is None:
+                return None
+            scores = self.matrix @ normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+            order = np.argsort(-scores)[:16]
+            fitting = [i for i in order if self._fits(i, query.unit)]
+            if not fitting or scores[fitting[0]] < FOOD_MATCH_THRESHOLD:
+                return None
+            best = fitting[0]
+            rival = next((i for i in order if self.entries[i]["name"] != self.entries[best]["name"]), None)
+            if rival is not None and scores[best] - scores[rival] < FOOD_MATCH_MARGIN:
+                return None
+            candidates, score = [best], float(scores[best])
+        entry = self.entries[max(candidates, key=lambda i: self.entries[i]["samples"])]
+        quantity = query.quantity or 1.0
+        food = {"name": entry["name"], "quantity": quantity, "unit": entry["unit"]}
+        food.update({k: round(v * quantity) for k, v in entry["per_unit"].items()})
+        return food, score
+
+
+def load_catalogue(catalogue_dir: Path = CATALOGUE_DIR, model_hash: str | None = None) -> FoodCatalogue | None:
+    """Memory-map the current bundle, or None if none is built (or FOOD_CATALOGUE_ENABLED=0)."""
+    version = current_version(catalogue_dir)
+    if version is None or not FOOD_CATALOGUE_ENABLED:
+        return None
+    try:
+        manifest = read_manifest(version, catalogue_dir)
+    except (OSError, ValueError) as e:
+        raise CatalogueIntegrityError(f"Unreadable manifest for v{version}: {e}") from e
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise CatalogueIntegrityError(f"v{version}: unsupported bundle format {manifest.get('format')}")
+    matrix_path = catalogue_dir / manifest["matrix_file"]
+    if hashlib.sha256(matrix_path.read_bytes()).hexdigest() != manifest["matrix_sha256"]:
+        raise CatalogueIntegrityError(f"v{version}: matrix checksum mismatch")
+    matrix = np.load(matrix_path, mmap_mode="r")
+    if matrix.shape != (len(manifest["entries"]), manifest["dim"]) or matrix.dtype != np.float32:
+        raise CatalogueIntegrityError(f"v{version}: matrix is {matrix.shape} {matrix.dtype}, manifest disagrees")
+    if model_hash is not None and manifest["model_hash"] != model_hash:
+        raise CatalogueIntegrityError(f"v{version}: built with a different model; rebuild with `python -m food_catalogue build --full`")
+    return FoodCatalogue(version=version, matrix=matrix, entries=manifest["entries"], model_hash=manifest["model_hash"])
+
+
+# -----------------------------
+# Mining
+# -----------------------------
+
+
+def _per_unit(quantity: float, nutrients) -> list[float] | None:
+    if not quantity or quantity <= 0:
+        return None
+    return [round(float(v or 0) / quantity, 4) for v in nutrients]
+
+
+def _mined_rows(full: bool, watermarks: dict[str, str]):
+    """
+    (shard, id, name, unit, per-unit nutrients) for LLM-extracted foods: every
+    row (hot and archived) when full, else hot UUIDv7 rows above the shard's
+    watermark. Reads with yield_per, one shard at a time.
+    """
+    from sqlalchemy import or_
+
+    import archive
+    from crud import ArchivedMonthDB, FoodDB
+    from storage import shard_indexes, shard_session
+
+    llm_rows = or_(FoodDB.source.is_(None), FoodDB.source == "llm")
+    for index in shard_indexes():
+        shard = str(index)
+        with shard_session(index) as session:
+            query = session.query(
+                FoodDB.id, FoodDB.name, FoodDB.unit, FoodDB.quantity, *(getattr(FoodDB, n) for n in NUTRIENTS)
+            ).filter(llm_rows)
+            if not full and shard in watermarks:
+                query = query.filter(FoodDB.id > watermarks[shard])
+            for row_id, name, unit, quantity, *nutrients in query.yield_per(5000):
+                if not full and uuid.UUID(row_id).version != 7:
+                    continue  # legacy uuid4 row, counted by the last full build
+                if (per_unit := _per_unit(quantity, nutrients)) is not None:
+                    yield shard, row_id, name, unit, per_unit
+            if not full:
+                continue
+            for user_id, month in session.query(ArchivedMonthDB.user_id, ArchivedMonthDB.month):
+                segment = archive.read_segment(user_id, month, cache=False) or {"foods": []}
+                for food in segment["foods"]:
+                    if food.get("source") in (None, "llm"):
+                        if (per_unit := _per_unit(food["quantity"], (food[n] for n in NUTRIENTS))) is not None:
+                            yield shard, food["id"], food["name"], food["unit"], per_unit
+
+
+def _read_groups(version: int | None, catalogue_dir: Path, model_hash: str) -> tuple[dict, np.ndarray | None, dict]:
+    if version is None:
+        return {}, None, {}
+    manifest = read_manifest(version, catalogue_dir)
+    with open(catalogue_dir / f"v{version}.groups.json") as f:
+        state = json.load(f)
+    vectors = np.load(catalogue_dir / f"v{version}.groups.npy") if manifest["model_hash"] == model_hash else None
+    groups = {(g["name"], g["unit"]): g for g in state["groups"]}
+    return groups, vectors, manifest.get("watermarks", {})
+
+
+def _cluster(groups: list[dict], vectors: np.ndarray) -> list[list[int]]:
+    """Greedy same-unit clustering, largest groups first: join the first leader within CATALOGUE_MERGE_THRESHOLD."""
+    leaders: dict[str, list[int]] = {}
+    clusters: dict[int, list[int]] = {}
+    for g in sorted(range(len(groups)), key=lambda g: -groups[g]["count"]):
+        unit_leaders = leaders.setdefault(groups[g]["unit"], [])
+        if unit_leaders:
+            sims = vectors[unit_leaders] @ vectors[g]
+            best = int(np.argmax(sims))
+            if sims[best] >= CATALOGUE_MERGE_THRESHOLD:
+                clusters[unit_leaders[best]].append(g)
+                continue
+        unit_leaders.append(g)
+        clusters[g] = [g]
+    return list(clusters.values())
+
+
+def _entry(groups: list[dict], members: list[int]) -> dict | None:
+    samples = np.asarray([s for g in members for s in groups[g]["samples"]], dtype=np.float64)
+    count = sum(groups[g]["count"] for g in members)
+    if count < CATALOGUE_MIN_SAMPLES or not len(samples):
+        return None
+    medians = np.median(samples, axis=0)
+    calories = samples[:, 0]
+    if medians[0] <= 0 or np.median(np.abs(calories - medians[0])) / medians[0] > CATALOGUE_MAX_SPREAD:
+        return None  # the LLM disagrees with itself about this food: keep asking it
+    leader = groups[members[0]]
+    return {
+        "name": leader["name"],
+        "unit": leader["unit"],
+        "aliases": sorted({groups[g]["name"] for g in members}),
+        "samples": count,
+        "per_unit": {n: round(float(v), 4) for n, v in zip(NUTRIENTS, medians)},
+    }
+
+
+def build(embed, model_hash: str, catalogue_dir: Path = CATALOGUE_DIR, full: bool = False, batch_size: int = 64) -> dict:
+    """
+    Mine foods into the next bundle version. embed(list[str]) -> (n, dim)
+    array. Incremental unless full, or the previous bundle used another model
+    or shard layout. Returns build stats.
+    """
+    from storage import SHARD_COUNT
+
+    previous = current_version(catalogue_dir)
+    if previous is None:
+        full = True
+    elif not full:
+        manifest = read_manifest(previous, catalogue_dir)
+        full = manifest["model_hash"] != model_hash or manifest.get("shard_count") != SHARD_COUNT
+    groups, old_vectors, watermarks = ({}, None, {}) if full else _read_groups(previous, catalogue_dir, model_hash)
+    old_index = {key: i for i, key in enumerate(groups)}
+    rng = random.Random(0)
+    mined = 0
+    for shard, row_id, name, unit, per_unit in _mined_rows(full, watermarks):
+        key = (normalize_name(name), normalize_unit(unit))
+        if not key[0]:
+            continue
+        group = groups.setdefault(key, {"name": key[0], "unit": key[1], "count": 0, "samples": []})
+        group["count"] += 1
+        if len(group["samples"]) < CATALOGUE_RESERVOIR:
+            group["samples"].append(per_unit)
+        elif (j := rng.randrange(group["count"])) < CATALOGUE_RESERVOIR:
+            group["samples"][j] = per_unit
+        if uuid.UUID(row_id).version == 7 and row_id > watermarks.get(shard, ""):
+            watermarks[shard] = row_id
+        mined += 1
+    if not groups:
+        return {"version": previous, "groups": 0, "entries": 0, "mined_rows": 0, "unchanged": True}
+
+    keys = list(groups)
+    names = list(dict.fromkeys(k[0] for k in keys))
+    known = {keys_name: old_vectors[i] for (keys_name, _), i in old_index.items()} if old_vectors is not None else {}
+    missing = [n for n in names if n not in known]
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        known.update(zip(batch, normalize_rows(np.asarray(embed(batch), dtype=np.float32))))
+    group_list = [groups[k] for k in keys]
+    vectors = np.stack([known[k[0]] for k in keys]).astype(np.float32)
+
+    entries, rows = [], []
+    for members in _cluster(group_list, vectors):
+        entry = _entry(group_list, members)
+        if entry is None:
+            continue
+        weights = np.asarray([group_list[g]["count"] for g in members], dtype=np.float32)
+        entries.append(entry)
+        rows.append((weights[:, None] * vectors[members]).sum(axis=0))
+    matrix = normalize_rows(np.asarray(rows, dtype=np.float32).reshape(len(rows), vectors.shape[1]))
+
+    catalogue_dir.mkdir(parents=True, exist_ok=True)
+    version = (previous or 0) + 1
+    np.save(catalogue_dir / f"v{version}.npy", matrix)
+    np.save(catalogue_dir / f"v{version}.groups.npy", vectors)
+    with open(catalogue_dir / f"v{version}.groups.json", "w") as f:
+        json.dump({"groups": group_list}, f)
+    stats = {
+        "version": version, "full": full, "mined_rows": mined, "groups": len(group_list),
+        "entries": len(entries), "encoded_names": len(missing),
+    }
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_hash": model_hash,
+        "shard_count": SHARD_COUNT,
+        "watermarks": watermarks,
+        "dim": int(vectors.shape[1]),
+        "matrix_file": f"v{version}.npy",
+        "matrix_sha256": hashlib.sha256((catalogue_dir / f"v{version}.npy").read_bytes()).hexdigest(),
+        "stats": stats,
+        "entries": entries,
+    }
+    write_manifest(manifest, version, catalogue_dir)
+    publish_version(version, catalogue_dir, keep=CATALOGUE_KEEP, suffixes=(".json", ".npy", ".groups.json", ".groups.npy"))
+    return stats
+
+
+def _held_out_texts(watermarks: dict[str, str] | None, sample: int) -> list[str]:
+    """
+    raw_text of the most recent `sample` logs per shard that the catalogue
+    was not mined from: UUIDv7 logs above the shard's watermark (ids are
+    time-ordered and a log's foods get ids after the log's own). Without
+    watermarks (no catalogue), the most recent logs.
+    """
+    from crud import HealthLogDB
+    from storage import shard_indexes, shard_session
+
+    texts = []
+    for index in shard_indexes():
+        with shard_session(index) as session:
+            query = session.query(HealthLogDB.id, HealthLogDB.raw_text).order_by(HealthLogDB.id.desc())
+            if watermarks is None:
+                texts += [t for _, t in query.limit(sample)]
+                continue
+            if str(index) in watermarks:
+                query = query.filter(HealthLogDB.id > watermarks[str(index)])
+            held_out = [t for row_id, t in query.yield_per(1000) if uuid.UUID(row_id).version == 7]
+            texts += held_out[:sample]
+    return texts
+
+
+def project(catalogue: FoodCatalogue | None, sample: int = 2000, batch_size: int = 64,
+            catalogue_dir: Path = CATALOGUE_DIR) -> dict:
+    """
+    Projected LLM-call reduction: re-parse up to `sample` recent logs per
+    shard with and without the catalogue and count logs that would still need
+    an LLM call and segments sent to it. Only logs newer than the catalogue's
+    mining watermarks count, so the foods being looked up were not the ones
+    the catalogue was built from; right after a build there may be none yet.
+    """
+    import hybrid_parser
+
+    watermarks = read_manifest(catalogue.version, catalogue_dir).get("watermarks", {}) if catalogue else None
+    texts = _held_out_texts(watermarks, sample)
+    counts = {}
+    active = hybrid_parser.food_catalogue
+    try:
+        for label, candidate in (("without", None), ("with", catalogue)):
+            hybrid_parser.food_catalogue = candidate
+            calls = segments = local_foods = 0
+            for start in range(0, len(texts), batch_size):
+                for result in hybrid_parser.parse_batch(texts[start:start + batch_size], 70.0):
+                    calls += bool(result["llm"])
+                    segments += len(result["llm"])
+                    local_foods += len(result["foods"])
+            counts[label] = {"llm_calls": calls, "llm_segments": segments, "catalogue_foods": local_foods}
+    finally:
+        hybrid_parser.food_catalogue = active
+    before, after = counts["without"]["llm_calls"], counts["with"]["llm_calls"]
+    return {
+        "logs": len(texts),
+        "basis": "logs newer than the mining watermarks" if catalogue else "most recent logs",
+        "catalogue_version": catalogue.version if catalogue else None,
+        **counts,
+        "llm_call_reduction_pct": round(100 * (before - after) / before, 1) if before else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "report"))
+    parser.add_argument("--full", action="store_true", help="re-mine every row, archived months included")
+    parser.add_argument("--sample", type=int, default=2000, help="logs per shard for the projection (newest first)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    from encoder import get_onnx_embedding, load_encoder, model_fingerprint
+
+    model_hash = model_fingerprint()
+    if args.command == "build":
+        session, tokenizer = load_encoder()
+        stats = build(lambda texts: get_onnx_embedding(texts, session, tokenizer, bucket=True), model_hash,
+                      full=args.full, batch_size=args.batch_size)
+        print(json.dumps(stats))
+    catalogue = load_catalogue(model_hash=model_hash)
+    report = project(catalogue, sample=args.sample, batch_size=args.batch_size)
+    if catalogue is not None:
+        manifest = read_manifest(catalogue.version, CATALOGUE_DIR)
+        manifest["projection"] = report
+        write_manifest(manifest, catalogue.version, CATALOGUE_DIR)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
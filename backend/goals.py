@@ -0,0 +1,124 @@
+"""
+Goal engine: per-user daily nutrient targets derived from profile and goal.
+
+Each goal focuses the dashboard on the nutrients that matter for it (decision
+records 001/002, docs/decision/thinking.md). Micronutrients named there
+(biotin, iron, zinc, vitamins C/E) are not tracked per food, so those goals
+use the closest tracked proxies.
+
+Targets depend only on the profile fields passed to daily_targets, which is
+memoised on exactly those values: a profile change is a new cache key and the
+next request recomputes, with no explicit invalidation.
+"""
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+GOAL_TARGET_CACHE = int(os.getenv("GOAL_TARGET_CACHE", "4096"))
+DEFAULT_AGE = 25  # age is not collected at signup; matches passive_calorie_burned
+
+# Daily energy expenditure multipliers on BMR (Harris-Benedict activity factors).
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "low": 1.375,
+    "moderate": 1.55,
+    "high": 1.725,
+    "very_high": 1.9,
+}
+
+# Nutrients shown per goal, in display order. "limit" nutrients are ceilings
+# (stay under), everything else is a floor to reach.
+GOAL_NUTRIENTS = {
+    "muscle_gain": ("protein", "calories", "carbs"),
+    "weight_loss": ("calories", "protein", "fibre", "sugar"),
+    "skin_health": ("sugar", "saturated_fat", "fibre"),
+    "hair_growth": ("protein", "calories"),
+    "energy_boost": ("calories", "carbs", "fibre"),
+    "pcos": ("sugar", "fibre", "carbs"),
+}
+DEFAULT_NUTRIENTS = ("calories", "protein", "carbs")
+LIMIT_NUTRIENTS = {"sugar", "saturated_fat", "sodium"}
+
+# Key in the daily totals that each nutrient is consumed from.
+CONSUMED_FIELDS = {"calories": "calories_intake"}
+
+PROTEIN_G_PER_KG = {"muscle_gain": 1.8, "weight_loss": 1.6, "hair_growth": 1.2}
+CALORIE_ADJUSTMENT = {"weight_loss": -500, "muscle_gain": 300}
+CARB_SHARE = {"muscle_gain": 0.50, "energy_boost": 0.55, "pcos": 0.40}
+SUGAR_SHARE = {"pcos": 0.05, "skin_health": 0.05, "weight_loss": 0.05}
+
+
+def normalize_goal(goal: str | None) -> str | None:
+    """'Muscle Gain' / 'muscle-gain' -> 'muscle_gain'; None for empty."""
+    if not goal:
+        return None
+    return goal.strip().lower().replace("-", "_").replace(" ", "_")
+
+
+def bmr(weight_kg: float, height_cm: float, gender: str, age: int = DEFAULT_AGE) -> float:
+    """Mifflin-St Jeor basal metabolic rate (kcal/day)."""
+    base = (10 * weight_kg) + (6.25 * height_cm) - (5 * age)
+    return base + 5 if (gender or "").lower() == "male" else base - 161
+
+
+@lru_cache(maxsize=GOAL_TARGET_CACHE)
+def daily_targets(
+    goal: str | None,
+    weight_kg: float,
+    height_cm: float,
+    gender: str,
+    activity_level: str,
+    age: int = DEFAULT_AGE,
+) -> tuple[tuple[str, str, int], ...]:
+    """
+    (nutrient, kind, target) for each nutrient the goal focuses on, where kind
+    is "target" or "limit". Calories in kcal, sodium in mg, the rest in grams.
+    """
+    goal = normalize_goal(goal)
+    resting = bmr(weight_kg, height_cm, gender, age)
+    factor = ACTIVITY_FACTORS.get(normalize_goal(activity_level) or "low", ACTIVITY_FACTORS["low"])
+    calories = max(resting, resting * factor + CALORIE_ADJUSTMENT.get(goal, 0))
+    values = {
+        "calories": calories,
+        "protein": weight_kg * PROTEIN_G_PER_KG.get(goal, 0.8),
+        "carbs": calories * CARB_SHARE.get(goal, 0.50) / 4,
+        "fibre": max(30.0, calories * 14 / 1000) if goal == "pcos" else calories * 14 / 1000,
+        "sugar": calories * SUGAR_SHARE.get(goal, 0.10) / 4,
+        "saturated_fat": calories * 0.10 / 9,
+        "sodium": 2300.0,
+    }
+    limits = LIMIT_NUTRIENTS | ({"calories"} if goal == "weight_loss" else set())
+    limits |= {"carbs"} if goal == "pcos" else set()
+    return tuple(
+        (name, "limit" if name in limits else "target", int(round(values[name])))
+        for name in GOAL_NUTRIENTS.get(goal, DEFAULT_NUTRIENTS)
+    )
+
+
+def targets_for_user(user) -> tuple[tuple[str, str, int], ...]:
+    return daily_targets(user.goal, user.weight_kg, user.height_cm, user.gender, user.activity_level)
+
+
+def goal_progress(goal: str | None, targets, totals: dict) -> dict:
+    """
+    Target, consumed and remaining per goal nutrient from one day's totals.
+    Calories burned by logged activities are earned back, so calories
+    remaining is target - intake + burned.
+    """
+    nutrients = []
+    for name, kind, target in targets:
+        consumed = totals.get(CONSUMED_FIELDS.get(name, name), 0)
+        remaining = target - consumed
+        if name == "calories":
+            remaining += totals.get("calories_burned", 0)
+        nutrients.append({
+            "nutrient": name,
+            "kind": kind,
+            "target": target,
+            "consumed": consumed,
+            "remaining": remaining,
+        })
+    return {"goal": normalize_goal(goal), "nutrients": nutrients}
@@ -1,65 +1,74 @@
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import re
 import json
 import pandas as pd
-from openai import OpenAI
 import os, psutil
+import logging
 from dotenv import load_dotenv
 from pathlib import Path
-
-from optimum.onnxruntime import ORTModelForFeatureExtraction
-from transformers import AutoTokenizer
-import torch
+from typing import NamedTuple
+
+from calibration import ActivityThresholds
+from embedding_library import load_library, normalize_rows
+from encoder import get_encoder, model_fingerprint
+from food_catalogue import load_catalogue, parse_food_segment
+from segmenter import RouterHead, route_segment, split_clauses
+from telemetry import Counter, register, span
 load_dotenv(override=True)
 
-api_key = os.getenv('OPENAI_API_KEY')
-client = OpenAI()
+logger = logging.getLogger(__name__)
+
 
 
 
 
 def log_mem(stage):
     process = psutil.Process(os.getpid())
-    print(f"{stage}: {process.memory_info().rss / 1024**2:.2f} MB")
+    logger.info("%s: %.2f MB", stage, process.memory_info().rss / 1024**2)
 # nlp = spacy.load("en_core_web_sm")
 # Load local embedding model
 
 log_mem("Before sentence transformer")
 
 
-def get_onnx_embedding(text, model, tokenizer):
-    inputs = tokenizer(text, padding=True, truncation=True, return_tensors="pt")
-    with torch.no_grad():
-        outputs = model(**inputs)
-    
-    # Mean Pooling logic
-    token_embeddings = outputs.last_hidden_state
-    mask = inputs['attention_mask'].unsqueeze(-1).expand(token_embeddings.size()).float()
-    sentence_embedding = torch.sum(token_embeddings * mask, 1) / torch.clamp(mask.sum(1), min=1e-9)
-    return sentence_embedding.numpy()
-
 # Canonical activities
 BASE_DIR = Path(__file__).resolve().parent
 csv_file_path = BASE_DIR / "ml_models" / "activity_with_met_2.csv"
 activity_embedding_file_path = BASE_DIR / "ml_models" / "activity_embeddings_onnx.npy"
-activity_list_file_path = BASE_DIR / "ml_models" / "activities_list.npy"
-df = pd.read_csv(csv_file_path)
-
-
-
-
-ACTIVITIES = df["activity_name"].to_list()
-MET_LOOKUP = dict(zip(df["activity_name"], df["MET"]))
 
 
 # Load the saved assets
-save_directory = "onnx_model_all_minilm_quantized"
-model = ORTModelForFeatureExtraction.from_pretrained(BASE_DIR / save_directory)
-tokenizer = AutoTokenizer.from_pretrained(BASE_DIR / save_directory)
-
-# Load the pre-calculated library (The "Matrix")
-activity_embeddings = np.load(activity_embedding_file_path)
+# In-process ONNX session, or the shared encoder service when ENCODER_SOCKET is set
+encoder = get_encoder()
+
+# Load the pre-calculated library (The "Matrix"): the versioned bundle from
+# `python -m embedding_library build`, or the notebook-built .npy + CSV until one exists.
+library = load_library(model_hash=model_fingerprint())
+if library is not None:
+    ACTIVITIES = library.labels
+    MET_LOOKUP = library.met_lookup
+    activity_embeddings = library.matrix
+    logger.info("Activity library v%d loaded: %s", library.version, activity_embeddings.shape)
+else:
+    df = pd.read_csv(csv_file_path)
+    ACTIVITIES = df["activity_name"].to_list()
+    MET_LOOKUP = dict(zip(df["activity_name"], df["MET"]))
+    activity_embeddings = normalize_rows(np.load(activity_embedding_file_path))
+    logger.warning("No activity library bundle; using %s", activity_embedding_file_path.name)
+
+# Foods mined from past LLM extractions (`python -m food_catalogue build`), tried before the LLM
+food_catalogue = load_catalogue(model_hash=model_fingerprint())
+if food_catalogue is not None:
+    logger.info("Food catalogue v%d loaded: %d foods", food_catalogue.version, len(food_catalogue.entries))
+catalogue_lookups = register(Counter(
+    "nutrilog_food_catalogue_lookups_total", "Food segments looked up in the food catalogue", "result"))
+
+# Optional activity / food / ignore head for segments the keyword trie can't route
+router_head = RouterHead.load()
+
+# Per-activity score / margin thresholds for resolving locally (see calibration.py)
+activity_thresholds = ActivityThresholds.load()
+ACTIVITY_TOP_K = int(os.getenv("ACTIVITY_TOP_K", "3"))
 
 log_mem("After imports")
 
@@ -180,13 +189,14 @@ def extract_reps(text: str):
     return None
 
 
-# 🧠 Split into segments (and, comma, period)
+# 🧠 Split into segments (clause boundaries; quantities stay with their nouns)
 def split_segments(text: str):
-    parts = re.split(
-    r'\b(?:and|then|after that|after|later|also|plus|n)\b|[,&.]',
-    text.lower()
-)
-    return [p.strip() for p in parts if p.strip()]
+    return split_clauses(text)
+
+
+def embed_segments(segments: list[str]):
+    """One batched ONNX pass for several segments -> (n, dim) array."""
+    return encoder.embed(segments)
 
 
 # 🧠 LLM fallback (placeholder)
@@ -199,87 +209,140 @@ def llm_fallback(segment: str):
 
 
 
+class Candidate(NamedTuple):
+    activity: str
+    score: float
+    met: float
+    margin: float  # score minus the next candidate's score
+
+
 # 🧠 Activity detection using embeddings
-def detect_activity(text: str):
+def detect_activity(text: str, k: int = ACTIVITY_TOP_K):
     """
-    Uses the ONNX model and pre-calculated library to find the best activity match.
+    Uses the ONNX model and pre-calculated library to find the top-k activity matches.
     """
     # 1. Generate the embedding for the user's input using the ONNX helper
-    input_embedding = get_onnx_embedding(text, model, tokenizer)
-    
-    # 2. Compare the user's vector to the pre-loaded library (the .npy file)
-    # This is a matrix-vector multiplication, which is incredibly fast
-    similarities = cosine_similarity(input_embedding, activity_embeddings)[0]
-
-    # 3. Find the index of the highest similarity score
-    best_idx = np.argmax(similarities)
-    
-    # 4. Retrieve the corresponding activity and MET value
-    activity = ACTIVITIES[best_idx]
-    best_score = similarities[best_idx]
-    met_value = MET_LOOKUP[activity]
-    
-    return activity, best_score, met_value
+    input_embedding = encoder.embed(text)
+    return match_activity(input_embedding, k)
+
+
+def match_activity(input_embedding, k: int = ACTIVITY_TOP_K):
+    """Top-k library activities (best first) for an already computed (1, dim) embedding."""
+    # 2. Compare the user's vector to the pre-loaded library (rows already
+    # L2-normalized, so cosine similarity is one matrix-vector product)
+    with span("similarity"):
+        similarities = activity_embeddings @ normalize_rows(input_embedding)[0]
+
+        # 3. Pick the k+1 highest scores (one extra for the last margin) without a full sort
+        n = min(k + 1, len(similarities))
+        top = np.argpartition(-similarities, n - 1)[:n]
+        top = top[np.argsort(-similarities[top])]
+
+    # 4. Retrieve the corresponding activities, MET values and margins
+    scores = similarities[top]
+    candidates = []
+    for i, idx in enumerate(top[:k]):
+        activity = ACTIVITIES[idx]
+        margin = scores[i] - scores[i + 1] if i + 1 < len(scores) else scores[i]
+        candidates.append(Candidate(activity, float(scores[i]), MET_LOOKUP[activity], float(margin)))
+    return candidates
 
 
 # 🧠 Main pipeline function (segment + decision engine)
+def _resolve_food(result: dict, seg: str, query, embedding=None):
+    """Add seg to result["foods"] if the food catalogue resolves it (exact alias, or embedding), else to result["llm"]."""
+    match = food_catalogue.resolve(query, embedding) if query is not None else None
+    if match is None:
+        if query is not None:
+            catalogue_lookups.inc("miss")
+        result["llm"].append(llm_fallback(seg))
+        return
+    food, score = match
+    catalogue_lookups.inc("exact" if score == 1.0 else "embedding")
+    result["foods"].append({"segment": seg, "food": food, "score": score, "source": "catalogue"})
+
+
 def parse_input(text: str,weight_kg,raw_input = False):
-    segments = split_segments(text)
-    print("Segments : ",segments)
-    results = {
-        "local": [],
-        "llm": []
-    }
-        
-
-    for seg in segments:
-
-        # clearing fields before use
-        # activity = None
-        # score = 0
-        # duration = None
-        # distance = None
-        # met_value = None
-        
-        # clean_seg = lemmatize_text_spa(seg)
-        clean_seg = seg
-        # print("Clean seg")
-        activity, score, met_value = detect_activity(clean_seg if raw_input==True else seg)
-        # print("\nRaw Sentence")
-        # r_activity, r_score, r_met_value = detect_activity(seg)
-
-        print("Activity Score MET : ",activity,score,met_value,seg)
-        duration = extract_duration(seg)
-        distance = extract_distance(seg)
+    return parse_batch([text], weight_kg)[0]
+
+
+def parse_batch(texts: list[str], weight_kg) -> list[dict]:
+    """
+    parse_input for several texts at once. Every segment that needs an
+    embedding, across all texts, goes to the encoder in a single call.
+    Returns one {"local": [...], "foods": [...], "llm": [...]} per text, in order:
+    "foods" are food segments resolved from the food catalogue.
+    """
+    with span("segmentation"):
+        segmented = [split_segments(text) for text in texts]
+    logger.debug("Segments: %s", segmented)
+    routed = [
+        (i, seg, route)
+        for i, segments in enumerate(segmented)
+        for seg in segments
+        if (route := route_segment(seg)) != "ignore"
+    ]
+    # Food segments are embedded by their food phrase, only if no catalogue alias matches it exactly.
+    food_queries = {}
+    to_embed = []
+    embed_row = {}
+    for n, (_, seg, route) in enumerate(routed):
+        if route == "food":
+            query = parse_food_segment(seg) if food_catalogue is not None else None
+            if query is None:
+                continue
+            food_queries[n] = query
+            if food_catalogue.exact(query.phrase):
+                continue
+            seg = query.phrase
+        embed_row[n] = len(to_embed)
+        to_embed.append(seg)
+    embeddings = encoder.embed(to_embed) if to_embed else None
+
+    results = [{"local": [], "foods": [], "llm": []} for _ in texts]
+    for n, (i, seg, route) in enumerate(routed):
+        input_embedding = embeddings[embed_row[n]:embed_row[n] + 1] if n in embed_row else None
+        if route == "food":
+            _resolve_food(results[i], seg, food_queries.get(n), input_embedding)
+            continue
+        if route == "unknown" and router_head is not None:
+            route = router_head.predict(input_embedding)
+            if route == "ignore":
+                continue
+            if route == "food":
+                _resolve_food(results[i], seg, parse_food_segment(seg) if food_catalogue is not None else None)
+                continue
+        candidates = match_activity(input_embedding)
+        activity, score, met_value, margin = candidates[0]
+
+        logger.debug("Activity Score Margin MET: %s %s %s %s %s", activity, score, margin, met_value, seg)
+        with span("regex_extraction"):
+            duration = extract_duration(seg)
+            distance = extract_distance(seg)
 
         unit = "minutes" if duration else "km"
 
         if(distance != None and activity in SPEED_MAP):
             duration = round((distance / SPEED_MAP[activity])*60,2)
-        # duration = distance / 5
-        # reps = extract_reps(seg)
-        # print("Duration",duration,"\t MET : ",met_value)
 
-        print("Dist and Duration : ",distance,duration,activity)
+        logger.debug("Dist and Duration: %s %s %s", distance, duration, activity)
         # Decision Engine
-        if activity and (duration or distance) and score > 0.50:
+        if activity and (duration or distance) and activity_thresholds.accept(activity, score, margin):
             calories_burned = met_value * weight_kg * (duration / 60)
-            results["local"].append({
+            results[i]["local"].append({
                 "segment": seg,
                 "activity": activity,
                 "score":float(score),
+                "margin": float(margin),
+                "candidates": [c.activity for c in candidates[1:]],
                 "quantity": duration if duration else distance,
                 "unit": unit,
-                # "reps": reps,
                 "calories_burned": round(float(calories_burned)),
                 "source": "local"
             })
 
         else:
-            results["llm"].append(llm_fallback(seg))
-
-        # print("-"*50)
-        # print("For Sentence : ",clean_seg,"\n",results)
+            results[i]["llm"].append(llm_fallback(seg))
 
     return results
 
@@ -0,0 +1,99 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a request with the same Idempotency-Key gets the first
+request's response back instead of a second parse, LLM call and log row:
+- completed keys replay the stored result until IDEMPOTENCY_TTL_S expires,
+- duplicates arriving while the first request is still running wait for it
+  and share its result (up to IDEMPOTENCY_WAIT_S),
+- a failed request is forgotten so the client's retry runs again,
+- reusing a key with a different request body is rejected.
+
+State is per worker process, like rate_limit; retries routed to another
+worker are not deduplicated.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from telemetry import Counter, register
+
+load_dotenv(override=True)
+
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_S = float(os.getenv("IDEMPOTENCY_WAIT_S", "60"))
+
+IDEMPOTENCY = register(Counter("nutrilog_idempotency_total", "Idempotency-Key requests by outcome.", "outcome"))
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body."""
+
+
+class _Entry:
+    __slots__ = ("future", "fingerprint", "expires")
+
+    def __init__(self, fingerprint: str):
+        self.future: Future = Future()
+        self.fingerprint = fingerprint
+        self.expires = math.inf  # set when the result is stored
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_s: float = IDEMPOTENCY_TTL_S, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl_s = ttl_s
+        self.max_keys = max_keys
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
+
+    def run(self, key: str, fingerprint: str, fn, wait_s: float = IDEMPOTENCY_WAIT_S):
+        """
+        fn() once per key. Returns (result, replayed). Raises
+        IdempotencyConflict for a different fingerprint, TimeoutError if an
+        in-flight original takes longer than wait_s, or the original's error.
+        """
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry(fingerprint)
+            elif entry.fingerprint != fingerprint:
+                IDEMPOTENCY.inc("conflict")
+                raise IdempotencyConflict(key)
+        if not owner:
+            IDEMPOTENCY.inc("replayed" if entry.future.done() else "coalesced")
+            return entry.future.result(timeout=wait_s), True
+
+        IDEMPOTENCY.inc("new")
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.future.set_exception(e)
+            raise
+        with self._lock:
+            entry.expires = time.monotonic() + self.ttl_s
+            # Completed keys move to the back so eviction stays oldest-first.
+            if self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+        entry.future.set_result(result)
+        return result, False
+
+
+idempotency_store = IdempotencyStore()
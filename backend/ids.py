@@ -0,0 +1,77 @@
+"""
+Time-ordered row identifiers.
+
+New rows get UUIDv7 ids (RFC 9562): a 48-bit millisecond timestamp followed
+by random bits, so consecutive inserts land at the right-hand edge of the
+primary-key B-tree instead of at random pages. They are stored as 16-byte
+binary (native uuid on PostgreSQL) and rendered as the usual 36-character
+string everywhere in Python and the API, so existing uuid4 ids keep working.
+"""
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    UUIDv7, monotonic within this process: ids minted in the same millisecond
+    use rand_a as a 12-bit counter (RFC 9562 method 1).
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms, _counter = ms, int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:  # counter exhausted: borrow the next millisecond
+                _last_ms, _counter = _last_ms + 1, 0
+        ms, counter = _last_ms, _counter
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    return str(uuid7())
+
+
+def is_valid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+
+class BinaryUUID(TypeDecorator):
+    """UUID string in Python, 16 bytes in the database."""
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import UUID
+
+            return dialect.type_descriptor(UUID(as_uuid=False))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return uuid.UUID(value).bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        if isinstance(value, str):  # row not yet migrated by crud._migrate_binary_ids
+            return value
+        return str(uuid.UUID(bytes=value))
@@ -0,0 +1,92 @@
+"""
+Keys, listeners and client connections for the local services that talk
+multiprocessing.connection over a Unix socket (encoder_service, pubsub).
+
+multiprocessing.connection unpickles whatever it receives, so only processes
+holding the service's key may connect. The key is the service's *_AUTHKEY
+env var when set. Otherwise the service generates a random one on first
+start and stores it next to the socket in <socket>.key (mode 0600); API
+workers running as the same user read it from there. A key file owned by
+someone else or readable by group/others is refused. Sockets are bound
+under umask 077, so the socket file is never connectable by other users,
+not even briefly.
+"""
+import os
+import secrets
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from pathlib import Path
+
+
+class ServiceKeyError(OSError):
+    """No usable key for a local service."""
+
+
+def key_path(address: str) -> Path:
+    return Path(f"{address}.key")
+
+
+def _read_key(path: Path) -> bytes:
+    fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    with os.fdopen(fd, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise ServiceKeyError(f"{path} must belong to this user and be private (chmod 600)")
+        key = f.read().strip()
+    if len(key) < 32:
+        raise ServiceKeyError(f"{path} holds no usable key")
+    return key
+
+
+def client_authkey(env_value: str, address: str) -> bytes:
+    """The env key, else the key the service stored next to its socket."""
+    if env_value:
+        return env_value.encode()
+    path = key_path(address)
+    try:
+        return _read_key(path)
+    except FileNotFoundError:
+        raise ServiceKeyError(f"No key for {address}: set the service's *_AUTHKEY or start it to create {path}") from None
+
+
+def service_authkey(env_value: str, address: str) -> bytes:
+    """The env key, else the stored key (kept across restarts so connected workers keep working), else a new one."""
+    if env_value:
+        return env_value.encode()
+    path = key_path(address)
+    try:
+        return _read_key(path)
+    except FileNotFoundError:
+        pass
+    key = secrets.token_hex(32).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def listen(address: str, authkey: bytes) -> Listener:
+    """Listener on a fresh Unix socket; the restrictive umask applies before bind()."""
+    Path(address).unlink(missing_ok=True)
+    previous = os.umask(0o077)
+    try:
+        return Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(previous)
+
+
+def connect(address: str, authkey: bytes, timeout: float):
+    """
+    Authenticated client connection. Gives up with TimeoutError if the
+    service accepts the socket but does not start the handshake within
+    timeout seconds (a hung service would otherwise block forever).
+    """
+    conn = Client(address, family="AF_UNIX")
+    try:
+        if not conn.poll(timeout):
+            raise TimeoutError(f"No handshake from {address} within {timeout:g}s")
+        answer_challenge(conn, authkey)
+        deliver_challenge(conn, authkey)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
@@ -0,0 +1,245 @@
+"""
+LLM provider layer for the extraction call in /log_input.
+
+LLM_PROVIDER selects the backend:
+- openai (default): the OpenAI chat completions API (honours OPENAI_BASE_URL,
+  so it can also point at benchmarks.stub_openai).
+- stub: an in-process stand-in that answers from a fixture table with no
+  network access.
+
+Both expose complete(system_prompt, user_prompt, timeout=None, max_tokens=None)
+-> Completion (raw message content plus token usage) and raise the openai
+SDK's exception types, so callers handle one set of errors.
+
+The stub is deterministic for a given LLM_STUB_SEED and can inject:
+- LLM_STUB_LATENCY: fixed:<ms> | uniform:<lo_ms>-<hi_ms> | lognormal:<median_ms>,<sigma>
+- LLM_STUB_TIMEOUT_RATE: fraction of calls that raise APITimeoutError
+  (after LLM_STUB_TIMEOUT_MS)
+- LLM_STUB_MALFORMED_RATE: fraction of calls that return truncated JSON
+- LLM_STUB_RATE_LIMIT_RATE: fraction of calls that raise RateLimitError
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+from prompts import count_tokens
+
+load_dotenv(override=True)
+
+BASE_DIR = Path(__file__).resolve().parent
+FIXTURES_PATH = Path(os.getenv("LLM_STUB_FIXTURES", BASE_DIR / "fixtures" / "llm_extractions.json"))
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
+# Retries are left to the resilience layer (hedging + breaker) by default.
+LLM_SDK_MAX_RETRIES = int(os.getenv("LLM_SDK_MAX_RETRIES", "0"))
+
+
+@dataclass
+class Completion:
+    content: str
+    usage: dict = field(default_factory=dict)  # prompt_tokens, completion_tokens, cached_tokens
+
+
+def _normalize(segment: str) -> str:
+    return " ".join(segment.lower().split())
+
+
+def parse_latency_spec(spec: str):
+    """Turn a LLM_STUB_LATENCY spec into a sampler rng -> seconds."""
+    kind, _, params = spec.partition(":")
+    if kind == "fixed":
+        ms = float(params or 0)
+        return lambda rng: ms / 1000
+    if kind == "uniform":
+        lo, hi = (float(x) for x in params.split("-"))
+        return lambda rng: rng.uniform(lo, hi) / 1000
+    if kind == "lognormal":
+        median, sigma = (float(x) for x in params.split(","))
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class StubExtractor:
+    """
+    Fixture-table extraction plus fault injection, shared by the in-process
+    StubProvider and the HTTP stand-in in benchmarks.stub_openai.
+    """
+
+    def __init__(
+        self,
+        fixtures_path: Path = FIXTURES_PATH,
+        latency: str = "fixed:0",
+        timeout_rate: float = 0.0,
+        timeout_ms: float = 30000,
+        malformed_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        with open(fixtures_path) as f:
+            self.fixtures = {_normalize(k): v for k, v in json.load(f).items()}
+        self.sample_latency = parse_latency_spec(latency)
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_ms / 1000
+        self.malformed_rate = malformed_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "StubExtractor":
+        return cls(
+            latency=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+            timeout_rate=float(os.getenv("LLM_STUB_TIMEOUT_RATE", "0")),
+            timeout_ms=float(os.getenv("LLM_STUB_TIMEOUT_MS", "30000")),
+            malformed_rate=float(os.getenv("LLM_STUB_MALFORMED_RATE", "0")),
+            rate_limit_rate=float(os.getenv("LLM_STUB_RATE_LIMIT_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "0")),
+        )
+
+    def _fallback_food(self, segment: str) -> dict:
+        """Deterministic made-up nutrition for segments not in the fixture table."""
+        h = int(hashlib.sha256(segment.encode()).hexdigest(), 16)
+        calories = 80 + h % 400
+        return {
+            "name": segment, "quantity": 1, "unit": "serving", "calories": calories,
+            "protein": calories // 25, "carbs": calories // 8, "fat": calories // 30,
+            "fibre": h % 6, "sugar": h % 10, "saturated_fat": h % 4, "sodium": 50 + h % 500,
+        }
+
+    def _contained_fixture(self, segment: str) -> dict | None:
+        """Longest fixture key that appears inside the segment, e.g. 'poha' in 'ate poha for breakfast'."""
+        matches = [k for k in self.fixtures if f" {k} " in f" {segment} "]
+        return self.fixtures[max(matches, key=len)] if matches else None
+
+    def extract(self, user_prompt: str) -> dict:
+        result = {"activities": [], "foods": []}
+        # Numbered entries from prompts.build_batch_message: tag items with their entry.
+        _, marker, entries = user_prompt.rpartition("Entries:\n")
+        if marker:
+            for line in entries.splitlines():
+                number, _, text = line.partition(". ")
+                for key in ("activities", "foods"):
+                    result[key].extend({**item, "segment": int(number)} for item in self._extract_text(text)[key])
+            return result
+        # Skip the per-user header built by prompts.build_user_message.
+        _, marker, text = user_prompt.rpartition("Text: ")
+        return self._extract_text(text if marker else user_prompt)
+
+    def _extract_text(self, text: str) -> dict:
+        result = {"activities": [], "foods": []}
+        for segment in text.split(" and "):
+            key = _normalize(segment)
+            if not key:
+                continue
+            fixture = self.fixtures.get(key) or self._contained_fixture(key)
+            if fixture is None:
+                result["foods"].append(self._fallback_food(key))
+            else:
+                result["activities"].extend(fixture.get("activities", []))
+                result["foods"].extend(fixture.get("foods", []))
+        return result
+
+    def plan(self) -> tuple[float, str | None]:
+        """Pick (delay seconds, fault) for one call: fault is None, 'timeout', 'rate_limit' or 'malformed'."""
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.sample_latency(self._rng)
+        if roll < self.timeout_rate:
+            return self.timeout_s, "timeout"
+        roll -= self.timeout_rate
+        if roll < self.rate_limit_rate:
+            return 0.0, "rate_limit"
+        roll -= self.rate_limit_rate
+        if roll < self.malformed_rate:
+            return delay, "malformed"
+        return delay, None
+
+    def render(self, user_prompt: str, fault: str | None) -> str:
+        content = json.dumps(self.extract(user_prompt))
+        if fault == "malformed":
+            return content[: max(1, len(content) // 2)]
+        return content
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, model: str = LLM_MODEL):
+        self.client = openai.OpenAI(max_retries=LLM_SDK_MAX_RETRIES)
+        self.model = model
+
+    def complete(self, system_prompt: str, user_prompt: str, timeout: float | None = None,
+                 max_tokens: int | None = None) -> Completion:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None) if usage else None
+        return Completion(
+            content=response.choices[0].message.content,
+            usage={
+                "prompt_tokens": usage.prompt_tokens if usage else 0,
+                "completion_tokens": usage.completion_tokens if usage else 0,
+                "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+            },
+        )
+
+
+class StubProvider:
+    name = "stub"
+
+    def __init__(self, extractor: StubExtractor | None = None):
+        self.extractor = extractor or StubExtractor.from_env()
+
+    def complete(self, system_prompt: str, user_prompt: str, timeout: float | None = None,
+                 max_tokens: int | None = None) -> Completion:
+        delay, fault = self.extractor.plan()
+        request = httpx.Request("POST", "http://stub.local/v1/chat/completions")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise openai.APITimeoutError(request=request)
+        time.sleep(delay)
+        if fault == "timeout":
+            raise openai.APITimeoutError(request=request)
+        if fault == "rate_limit":
+            response = httpx.Response(429, request=request)
+            raise openai.RateLimitError("Rate limit reached (stub)", response=response, body=None)
+        content = self.extractor.render(user_prompt, fault)
+        return Completion(
+            content=content,
+            usage={
+                "prompt_tokens": count_tokens(system_prompt) + count_tokens(user_prompt),
+                "completion_tokens": count_tokens(content),
+                "cached_tokens": 0,
+            },
+        )
+
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "stub": StubProvider,
+}
+
+
+def get_provider():
+    """Build the provider named by LLM_PROVIDER."""
+    name = os.getenv("LLM_PROVIDER", "openai")
+    if name not in PROVIDERS:
+        raise RuntimeError(f"Unknown LLM_PROVIDER: {name}")
+    return PROVIDERS[name]()
@@ -0,0 +1,338 @@
+"""
+Resilience layer around the LLM provider.
+
+ResilientLLM.extract(system_prompt, user_prompt) -> ExtractionResponse
+ResilientLLM.extract_batch(system_prompt, user_prompt, count) -> [ExtractionResponse | None]
+- enforces a per-call deadline (LLM_DEADLINE_S),
+- fires a hedged second request if the first has not answered after the
+  rolling p95 latency (LLM_HEDGE_DELAY_S until enough samples exist),
+- parses the reply with repair (markdown fences, trailing commas, truncated
+  output) and keeps every item that validates,
+- trips a circuit breaker after LLM_BREAKER_FAILURES consecutive failures;
+  while open, calls fail fast with LLMUnavailable for LLM_BREAKER_COOLDOWN_S,
+  then one half-open trial decides whether to close it again.
+
+Callers treat LLMUnavailable as "save local results and enqueue the segments
+for enrichment" (see enrichment.py).
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from models import Activity, ExtractionResponse, Food
+from prompts import LLM_MAX_OUTPUT_TOKENS
+from telemetry import Counter, Gauge, register, request_id, span
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "20"))
+LLM_HEDGE_DELAY_S = float(os.getenv("LLM_HEDGE_DELAY_S", "8"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+LLM_CALLS = register(Counter("nutrilog_llm_calls_total", "LLM extraction calls by outcome.", "outcome"))
+LLM_HEDGES = register(Counter("nutrilog_llm_hedges_total", "Hedged LLM requests by result.", "result"))
+LLM_TOKENS = register(Counter("nutrilog_llm_tokens_total", "LLM tokens by kind (prompt, completion, cached).", "kind"))
+LLM_BREAKER = register(Gauge("nutrilog_llm_breaker_state", "1 for the circuit breaker's current state, else 0.", "state"))
+
+
+class LLMUnavailable(RuntimeError):
+    """The LLM could not produce a usable extraction (breaker open, deadline, errors)."""
+
+
+# -----------------------------
+# JSON PARSING WITH REPAIR
+# -----------------------------
+
+
+def _strip_fences(content: str) -> str:
+    content = content.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", content, re.DOTALL)
+    if fenced:
+        content = fenced.group(1)
+    start = content.find("{")
+    return content[start:] if start >= 0 else content
+
+
+def _close_truncated(content: str) -> str:
+    """
+    Cut truncated JSON back to the last complete array item / object and close
+    the open brackets, e.g. '{"foods": [{..}, {"na' -> '{"foods": [{..}]}'.
+    """
+    stack = []
+    in_string = escaped = False
+    safe_end, safe_stack = None, None
+    for i, ch in enumerate(content):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            safe_end, safe_stack = i + 1, list(stack)
+            if not stack:
+                return content[:safe_end]
+    if safe_end is None:
+        return content
+    return content[:safe_end] + "".join(reversed(safe_stack))
+
+
+def _load_json(content: str) -> dict:
+    text = _strip_fences(content)
+    text = re.sub(r",\s*([}\]])", r"\1", text)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        repaired = re.sub(r",\s*([}\]])", r"\1", _close_truncated(text))
+        try:
+            data = json.loads(repaired)
+        except json.JSONDecodeError as e:
+            raise ValueError("Unrepairable LLM JSON") from e
+    if not isinstance(data, dict):
+        raise ValueError("LLM JSON is not an object")
+    return data
+
+
+def _valid(items, model) -> list:
+    kept = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        item = {k: round(v) if isinstance(v, float) and k != "quantity" else v for k, v in item.items()}
+        try:
+            kept.append(model(**item))
+        except ValidationError:
+            logger.warning("Dropping invalid %s from LLM reply: %s", model.__name__, item)
+    return kept
+
+
+def parse_extraction(content: str) -> ExtractionResponse:
+    """
+    Parse an LLM reply into ExtractionResponse, repairing common breakage.
+    Items that fail validation are dropped rather than failing the whole reply.
+    Raises ValueError if nothing JSON-shaped can be recovered.
+    """
+    data = _load_json(content)
+    return ExtractionResponse(
+        activities=_valid(data.get("activities"), Activity),
+        foods=_valid(data.get("foods"), Food),
+    )
+
+
+def parse_batch_extraction(content: str, count: int) -> list[ExtractionResponse | None]:
+    """
+    Parse a reply to a numbered-entries prompt (prompts.BATCH_SYSTEM_PROMPT)
+    into one ExtractionResponse per entry, using each item's 1-based
+    "segment" number. Items without a valid number are dropped. An entry the
+    reply has no items for (left out, or its number garbled) is None rather
+    than an empty extraction, so the caller can retry it instead of saving
+    nothing for it.
+    """
+    data = _load_json(content)
+    grouped = [{"activities": [], "foods": []} for _ in range(count)]
+    for key in ("activities", "foods"):
+        for item in data.get(key) if isinstance(data.get(key), list) else []:
+            index = item.pop("segment", None) if isinstance(item, dict) else None
+            if isinstance(index, int) and 1 <= index <= count:
+                grouped[index - 1][key].append(item)
+            elif count == 1:
+                grouped[0][key].append(item)
+            else:
+                logger.warning("Dropping LLM %s item without a valid segment number: %s", key, item)
+    return [
+        ExtractionResponse(activities=_valid(g["activities"], Activity), foods=_valid(g["foods"], Food))
+        if g["activities"] or g["foods"] else None
+        for g in grouped
+    ]
+
+
+# -----------------------------
+# CIRCUIT BREAKER
+# -----------------------------
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open after cooldown -> closed on success."""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown_s: float = LLM_BREAKER_COOLDOWN_S):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self):
+        for state in ("closed", "open", "half_open"):
+            LLM_BREAKER.set(state, 1 if self.state == state else 0)
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected outright (open and still cooling down)."""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.cooldown_s
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown_s:
+                self.state = "half_open"
+                self._publish()
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                logger.info("LLM circuit breaker closed")
+            self.state = "closed"
+            self._publish()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("LLM circuit breaker opened after %d failures", self._failures)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._publish()
+
+
+# -----------------------------
+# RESILIENT CLIENT
+# -----------------------------
+
+
+class ResilientLLM:
+    def __init__(self, provider, breaker: CircuitBreaker | None = None):
+        self.provider = provider
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < 20:
+            return LLM_HEDGE_DELAY_S
+        return float(np.percentile(samples, 95))
+
+    def _timed_call(self, system_prompt: str, user_prompt: str, timeout: float) -> str:
+        start = time.perf_counter()
+        completion = self.provider.complete(system_prompt, user_prompt, timeout=timeout, max_tokens=LLM_MAX_OUTPUT_TOKENS)
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._latencies.append(latency)
+        usage = completion.usage
+        for kind in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            LLM_TOKENS.inc(kind.removesuffix("_tokens"), usage.get(kind, 0))
+        logger.info(
+            "request_id=%s llm_call provider=%s latency_ms=%.0f prompt_tokens=%s completion_tokens=%s cached_tokens=%s",
+            request_id.get(), self.provider.name, latency * 1000,
+            usage.get("prompt_tokens"), usage.get("completion_tokens"), usage.get("cached_tokens"),
+        )
+        return completion.content
+
+    def _submit(self, system_prompt: str, user_prompt: str, timeout: float):
+        # Run in a copy of the caller's context so request_id follows the call.
+        ctx = contextvars.copy_context()
+        return self._pool.submit(ctx.run, self._timed_call, system_prompt, user_prompt, timeout)
+
+    def complete(self, system_prompt: str, user_prompt: str, deadline_s: float = LLM_DEADLINE_S) -> str:
+        """Raw completion with deadline and hedging. Raises LLMUnavailable on failure."""
+        start = time.monotonic()
+        primary = self._submit(system_prompt, user_prompt, deadline_s)
+        pending = {primary}
+        hedge = None
+        errors = []
+        while pending:
+            remaining = deadline_s - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            wait_for = remaining
+            if hedge is None and LLM_HEDGE_ENABLED:
+                wait_for = min(remaining, max(0.0, self.hedge_delay() - (time.monotonic() - start)))
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if hedge is not None:
+                    LLM_HEDGES.inc("hedge_won" if future is hedge else "primary_won")
+                return content
+            if hedge is None and LLM_HEDGE_ENABLED and time.monotonic() - start < deadline_s:
+                LLM_HEDGES.inc("sent")
+                remaining = deadline_s - (time.monotonic() - start)
+                hedge = self._submit(system_prompt, user_prompt, remaining)
+                pending.add(hedge)
+        if errors:
+            raise LLMUnavailable(f"LLM call failed: {errors[-1]!r}") from errors[-1]
+        raise LLMUnavailable(f"LLM call exceeded {deadline_s:.1f}s deadline")
+
+    def extract(self, system_prompt: str, user_prompt: str, deadline_s: float = LLM_DEADLINE_S) -> ExtractionResponse:
+        """Structured extraction through the breaker. Raises LLMUnavailable on any failure."""
+        return self._extract(system_prompt, user_prompt, deadline_s, parse_extraction)
+
+    def extract_batch(self, system_prompt: str, user_prompt: str, count: int,
+                      deadline_s: float = LLM_DEADLINE_S) -> list[ExtractionResponse | None]:
+        """extract() for a numbered-entries prompt: one ExtractionResponse per entry (None if the reply skipped it)."""
+        return self._extract(system_prompt, user_prompt, deadline_s, lambda c: parse_batch_extraction(c, count))
+
+    def _extract(self, system_prompt: str, user_prompt: str, deadline_s: float, parse):
+        if not self.breaker.allow():
+            LLM_CALLS.inc("breaker_open")
+            raise LLMUnavailable("LLM circuit breaker is open")
+        try:
+            content = self.complete(system_prompt, user_prompt, deadline_s)
+            with span("validation"):
+                parsed = parse(content)
+        except LLMUnavailable:
+            LLM_CALLS.inc("error")
+            self.breaker.record_failure()
+            raise
+        except ValueError as e:
+            LLM_CALLS.inc("malformed")
+            self.breaker.record_failure()
+            raise LLMUnavailable(str(e)) from e
+        LLM_CALLS.inc("ok")
+        self.breaker.record_success()
+        return parsed
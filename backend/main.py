@@ -1,35 +1,82 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import orjson
 from pydantic import BaseModel
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import os
 from dotenv import load_dotenv
 import json
 import logging  # for printing time taken by every query
+import uuid
+from datetime import timezone
 
-from hybrid_parser import parse_input
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException
 from sqlalchemy.orm import Session
 
-from auth import create_access_token, get_current_user
-
-from models import Activity, ActivityInput, ExtractionResponse, SignInInput, SignUpInput
-from utils import aggregate_summary
+from auth import create_access_token, get_current_user, security, verify_token
+
+from models import (
+    Activity,
+    ActivityInput,
+    ActivityPatch,
+    CatalogueFood,
+    ExtractionResponse,
+    FoodPatch,
+    LogPatch,
+    LogBatchInput,
+    SignInInput,
+    SignUpInput,
+    TodaySummaryColumnarResponse,
+    TodaySummaryResponse,
+    WeightEntryOut,
+)
+from responses import ORJSONResponse, not_modified, to_columns, version_etag
+from utils import aggregate_summary, decode_log_cursor, encode_log_cursor
+from passwords import HasherBusy
+from rate_limit import signin_by_ip, signin_by_username
 from met_engine import calculate_calories_burned, calculate_realtime_burn
+from goals import goal_progress, targets_for_user
+from llm_provider import get_provider
+from llm_resilience import LLMUnavailable, ResilientLLM
+from prompts import BATCH_SYSTEM_PROMPT, SYSTEM_PROMPT, build_batch_message, build_user_message, fit_to_budget, pack_batches
+from enrichment import start_worker
+from export import EXTENSIONS as EXPORT_EXTENSIONS, MEDIA_TYPES as EXPORT_MEDIA_TYPES, TABLES as EXPORT_TABLES, parse_tables, stream_export
+from idempotency import IdempotencyConflict, idempotency_store
+from push import events, publish_summary, publish_weight
+from telemetry import REQUEST_SECONDS, clean_request_id, profile_if_slow, render_prometheus, request_id, setup_logging, span
 
 
-# Configure logging to write to 'app.log'
-logging.basicConfig(
-    filename='nutrilog_info.log', 
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configure logging to write to 'nutrilog_info.log' (queued, non-blocking)
+setup_logging("nutrilog_info.log", level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
+
+from hybrid_parser import parse_batch, parse_input
 
 from crud import (
+    ActivityDB,
+    FoodDB,
+    HealthLogDB,
+    TotalsChange,
+    delete_activity,
+    delete_food,
+    delete_health_log,
+    SessionLocal,
+    get_change_version,
+    get_owned,
+    get_user_by_username,
+    totals_delta,
+    update_activity,
+    update_food,
+    update_health_log,
     create_health_log,
+    create_health_logs,
     create_user,
     get_db,
     get_daily_logs,
+    get_changes_since,
+    get_daily_totals,
+    get_logs_page,
     get_user_by_username_and_password,
     get_weight_entries,
     create_weight_entry,
@@ -38,8 +85,8 @@ from crud import (
 
 load_dotenv(override=True)
 
-api_key = os.getenv('OPENAI_API_KEY')
-client = OpenAI()
+llm = ResilientLLM(get_provider())
+enrichment_worker = start_worker(llm)
 
 import time
 
@@ -49,11 +96,10 @@ def measure_openai_latency(func, *args, **kwargs):
     end_time = time.time()
 
     duration = end_time - start_time
-    print(f"⏱️ OpenAI API call took {duration:.4f} seconds")
-    logging.info(f"OpenAI API call took {duration:.4f} seconds")
+    logging.info("request_id=%s LLM (%s) call took %.4f seconds", request_id.get(), llm.name, duration)
 
     return response
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -62,6 +108,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+LOG_BATCH_MAX = int(os.getenv("LOG_BATCH_MAX", "100"))
+
+FOOD_FIELDS = ("id", "name", "quantity", "unit", "calories", "protein", "carbs", "fat", "fibre", "sugar", "timestamp")
+ACTIVITY_FIELDS = ("id", "type", "quantity", "unit", "calories_burned", "timestamp")
 
 
 @app.post("/test")
@@ -74,15 +126,29 @@ from typing import List
 @app.middleware("http")
 async def log_time(request, call_next):
     import time
+    rid = clean_request_id(request.headers.get("X-Request-ID")) or uuid.uuid4().hex
+    token = request_id.set(rid)
     start = time.time()
-
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id.reset(token)
 
     duration = time.time() - start
-    logging.info(f"{request.url.path} took {duration:.4f}s")
+    # Label by route template (/foods/{food_id}), not the raw path, so ids and scanner 404s don't add series.
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(route.path if route is not None else "unmatched", duration)
+    logging.info("request_id=%s %s took %.4fs", rid, request.url.path, duration)
+    response.headers["X-Request-ID"] = rid
 
     return response
 
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage and per-path latency histograms in Prometheus text format."""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/signup")
 def signup(data: SignUpInput, db: Session = Depends(get_db)):
     try:
@@ -106,13 +172,29 @@ def signup(data: SignUpInput, db: Session = Depends(get_db)):
         }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again.", headers={"Retry-After": "1"})
 
 
 @app.post("/signin")
-def signin(data: SignInInput, db: Session = Depends(get_db)):
-    user = get_user_by_username_and_password(db, data.username, data.password)
+def signin(data: SignInInput, request: Request, db: Session = Depends(get_db)):
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = max(signin_by_username.retry_after(data.username), signin_by_ip.retry_after(client_ip))
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed sign-in attempts. Try again later.",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+    try:
+        user = get_user_by_username_and_password(db, data.username, data.password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again.", headers={"Retry-After": "1"})
     if user is None:
+        signin_by_username.hit(data.username)
+        signin_by_ip.hit(client_ip)
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    signin_by_username.reset(data.username)
     access_token = create_access_token(data={"sub": user.username})
     return {
         "success": True,
@@ -143,77 +225,263 @@ def passive_calorie_burned(current_user=Depends(get_current_user)):
     return int(total_burned)
 
 
-@app.get("/today_summary")
-def today_summary(date: str | None = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """Fetch aggregated calories/macros and food/activity entries for the user for a given date (YYYY-MM-DD). Defaults to today."""
+@app.get("/today_summary", response_model=TodaySummaryResponse | TodaySummaryColumnarResponse)
+def today_summary(
+    request: Request,
+    date: str | None = None,
+    format: str = "rows",
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Fetch aggregated calories/macros and food/activity entries for the user for a given date (YYYY-MM-DD). Defaults to today.
+    format=columnar returns foods and activities as parallel arrays instead of a list of objects.
+    `goal` holds target, consumed and remaining for the nutrients the user's goal focuses on.
+    Answers If-None-Match with 304 while nothing for the user has changed.
+    """
     from datetime import datetime as dt
+    if format not in ("rows", "columnar"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use rows or columnar.")
     if date:
         try:
             target_date = dt.strptime(date, "%Y-%m-%d").date()
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
     else:
-        target_date = None
+        target_date = dt.now().date()
+    etag = version_etag(
+        get_change_version(db, current_user.username), "today_summary", target_date, format,
+        current_user.goal, current_user.weight_kg, current_user.height_cm, current_user.gender, current_user.activity_level,
+    )
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
     logs = get_daily_logs(db, current_user.username, date=target_date)
-    calories_intake = 0
-    calories_burned = 0
-    protein = 0
-    carbs = 0
-    fibre = 0
-    sugar = 0
-    foods_list = []
-    activities_list = []
+    food_rows = []
+    activity_rows = []
     for log in logs:
         for f in log.foods:
-            calories_intake += f.calories
-            protein += f.protein
-            carbs += f.carbs
-            fibre += f.fibre
-            sugar += f.sugar
-            foods_list.append({
-                "name": f.name,
-                "quantity": f.quantity,
-                "unit": f.unit,
-                "calories": f.calories,
-                "protein": f.protein,
-                "carbs": f.carbs,
-                "fat": f.fat,
-                "fibre": f.fibre,
-                "sugar": f.sugar,
-                "timestamp": log.timestamp.isoformat() if log.timestamp else None,
-            })
+            food_rows.append((f.id, f.name, f.quantity, f.unit, f.calories, f.protein, f.carbs, f.fat, f.fibre, f.sugar, log.timestamp))
         for a in log.activities:
-            calories_burned += a.calories_burned
-            activities_list.append({
-                "type": a.type,
-                "quantity": a.quantity,
-                "unit": a.unit,
-                "calories_burned": a.calories_burned,
-                "timestamp": log.timestamp.isoformat() if log.timestamp else None,
-            })
+            activity_rows.append((a.id, a.type, a.quantity, a.unit, a.calories_burned, log.timestamp))
+    totals = get_daily_totals(db, current_user.username, target_date)
+    summary = {k: totals[k] for k in ("calories_intake", "calories_burned", "protein", "carbs", "fibre", "sugar")}
+    goal = goal_progress(current_user.goal, targets_for_user(current_user), totals)
+    if format == "columnar":
+        foods = to_columns(food_rows, FOOD_FIELDS)
+        activities = to_columns(activity_rows, ACTIVITY_FIELDS)
+    else:
+        foods = [dict(zip(FOOD_FIELDS, r)) for r in food_rows]
+        activities = [dict(zip(ACTIVITY_FIELDS, r)) for r in activity_rows]
+    return ORJSONResponse({"summary": summary, "goal": goal, "foods": foods, "activities": activities}, headers={"ETag": etag})
+
+
+@app.get("/logs")
+def list_logs(request: Request, before: str | None = None, limit: int = 20, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Page through the user's log history, newest first. Pass next_cursor back as `before` for the next page."""
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100.")
+    etag = version_etag(get_change_version(db, current_user.username), "logs", before, limit)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    try:
+        cursor = decode_log_cursor(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    logs = get_logs_page(db, current_user.username, before=cursor, limit=limit)
+    items = [
+        {
+            "id": log.id,
+            "raw_text": log.raw_text,
+            "timestamp": log.timestamp,
+            "foods": [
+                {
+                    "id": f.id,
+                    "name": f.name,
+                    "quantity": f.quantity,
+                    "unit": f.unit,
+                    "calories": f.calories,
+                    "protein": f.protein,
+                    "carbs": f.carbs,
+                    "fat": f.fat,
+                    "fibre": f.fibre,
+                    "sugar": f.sugar,
+                }
+                for f in log.foods
+            ],
+            "activities": [
+                {
+                    "id": a.id,
+                    "type": a.type,
+                    "quantity": a.quantity,
+                    "unit": a.unit,
+                    "calories_burned": a.calories_burned,
+                }
+                for a in log.activities
+            ],
+        }
+        for log in logs
+    ]
+    next_cursor = None
+    if len(logs) == limit and logs[-1].timestamp is not None:
+        next_cursor = encode_log_cursor(logs[-1].timestamp, logs[-1].id)
+    return ORJSONResponse({"logs": items, "next_cursor": next_cursor}, headers={"ETag": etag})
+
+
+def _food_out(f) -> dict:
     return {
-        "summary": {
-            "calories_intake": calories_intake,
-            "calories_burned": calories_burned,
-            "protein": protein,
-            "carbs": carbs,
-            "fibre": fibre,
-            "sugar": sugar,
-        },
-        "foods": foods_list,
-        "activities": activities_list,
+        "id": f.id, "log_id": f.log_id, "name": f.name, "quantity": f.quantity, "unit": f.unit,
+        **{k: getattr(f, k) for k in ("calories", "protein", "carbs", "fat", "fibre", "sugar", "saturated_fat", "sodium")},
+    }
+
+
+def _activity_out(a) -> dict:
+    return {
+        "id": a.id, "log_id": a.log_id, "type": a.type, "quantity": a.quantity, "unit": a.unit,
+        "calories_burned": a.calories_burned,
     }
 
 
+def _owned_or_404(db: Session, model, current_user, row_id: str):
+    row = get_owned(db, model, current_user.username, row_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Not found.")
+    return row
+
+
+def _publish_totals(db: Session, user_id: str, change: TotalsChange) -> None:
+    """Push the new totals of every day an edit or delete touched, so the user's other open tabs update."""
+    for day, delta in change.days.items():
+        if day is not None:
+            publish_summary(db, user_id, day, delta, change.version)
+
+
+def _changes(patch: BaseModel) -> dict:
+    changes = patch.model_dump(exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update.")
+    if changes.get("quantity", 1) <= 0:
+        raise HTTPException(status_code=400, detail="quantity must be positive; delete the entry instead.")
+    if any(isinstance(v, int) and v < 0 for v in changes.values()):
+        raise HTTPException(status_code=400, detail="Values must not be negative.")
+    return changes
+
+
+@app.patch("/foods/{food_id}")
+def edit_food(food_id: str, data: FoodPatch, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Correct a logged food. Sending only quantity rescales its nutrients locally (no LLM call)."""
+    food = _owned_or_404(db, FoodDB, current_user, food_id)
+    try:
+        change = update_food(db, food, _changes(data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _publish_totals(db, current_user.username, change)
+    return _food_out(food)
+
 
-@app.get("/weight_entries")
-def list_weight_entries(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@app.delete("/foods/{food_id}")
+def remove_food(food_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    change = delete_food(db, _owned_or_404(db, FoodDB, current_user, food_id))
+    _publish_totals(db, current_user.username, change)
+    return {"deleted": food_id}
+
+
+@app.patch("/activities/{activity_id}")
+def edit_activity(activity_id: str, data: ActivityPatch, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Correct a logged activity. Sending only quantity rescales calories_burned."""
+    activity = _owned_or_404(db, ActivityDB, current_user, activity_id)
+    try:
+        change = update_activity(db, activity, _changes(data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _publish_totals(db, current_user.username, change)
+    return _activity_out(activity)
+
+
+@app.delete("/activities/{activity_id}")
+def remove_activity(activity_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    change = delete_activity(db, _owned_or_404(db, ActivityDB, current_user, activity_id))
+    _publish_totals(db, current_user.username, change)
+    return {"deleted": activity_id}
+
+
+@app.patch("/logs/{log_id}")
+def edit_log(log_id: str, data: LogPatch, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Change a log's raw_text or timestamp (moving it to another day moves its totals)."""
+    changes = _changes(data)
+    if changes.get("timestamp") is not None and changes["timestamp"].tzinfo is not None:
+        changes["timestamp"] = changes["timestamp"].astimezone(timezone.utc).replace(tzinfo=None)
+    log = _owned_or_404(db, HealthLogDB, current_user, log_id)
+    change = update_health_log(db, log, changes)
+    _publish_totals(db, current_user.username, change)
+    return {"id": log.id, "raw_text": log.raw_text, "timestamp": log.timestamp}
+
+
+@app.delete("/logs/{log_id}")
+def remove_log(log_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Delete a whole log entry with its foods and activities."""
+    change = delete_health_log(db, _owned_or_404(db, HealthLogDB, current_user, log_id))
+    _publish_totals(db, current_user.username, change)
+    return {"deleted": log_id}
+
+
+@app.get("/weight_entries", response_model=List[WeightEntryOut])
+def list_weight_entries(request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """Fetch weight entries for the user, most recent first."""
+    etag = version_etag(get_change_version(db, current_user.username), "weight_entries")
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
     entries = get_weight_entries(db, current_user.username)
-    return [
-        {"value_kg": e.value_kg, "recorded_at": e.recorded_at.isoformat() if e.recorded_at else None}
-        for e in entries
-    ]
+    return ORJSONResponse([{"value_kg": e.value_kg, "recorded_at": e.recorded_at} for e in entries], headers={"ETag": etag})
+
+
+@app.get("/sync")
+def sync(request: Request, since: int = 0, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """
+    Rows created, updated or deleted since change version `since` (0 = everything,
+    archived months included). Store the returned `version` and pass it as `since`
+    next time; `deleted` lists {kind, id} tombstones. A `since` ahead of the server
+    version gets a full resync.
+    """
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must be >= 0.")
+    version = get_change_version(db, current_user.username)
+    full = since == 0 or since > version
+    etag = version_etag(version, "sync", 0 if full else since)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    if since == version:
+        changes = {"logs": [], "foods": [], "activities": [], "weight_entries": [], "deleted": []}
+    else:
+        changes = get_changes_since(db, current_user.username, 0 if full else since)
+    return ORJSONResponse({
+        "version": version,
+        "full": full,
+        "logs": [{"id": l.id, "raw_text": l.raw_text, "timestamp": l.timestamp} for l in changes["logs"]],
+        "foods": [_food_out(f) for f in changes["foods"]],
+        "activities": [_activity_out(a) for a in changes["activities"]],
+        "weight_entries": [
+            {"id": e.id, "value_kg": e.value_kg, "recorded_at": e.recorded_at} for e in changes["weight_entries"]
+        ],
+        "deleted": [{"kind": d.kind, "id": d.row_id} for d in changes["deleted"]],
+    }, headers={"ETag": etag})
+
+
+@app.get("/export")
+def export_history(format: str = "ndjson", tables: str = ",".join(EXPORT_TABLES), current_user=Depends(get_current_user)):
+    """
+    Stream the user's full history (archived months included) as csv (one table),
+    ndjson or columnar. Gzip-compressed on the fly when the client accepts it.
+    """
+    try:
+        selected = parse_tables(tables, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"nutrilog-{'-'.join(selected)}.{EXPORT_EXTENSIONS[format]}"
+    return StreamingResponse(
+        stream_export(current_user.username, selected, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 
@@ -237,12 +505,43 @@ def add_weight_entry(data: WeightEntryInput, db: Session = Depends(get_db), curr
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid recorded_at. Use YYYY-MM-DD.")
     entry = create_weight_entry(db, current_user.username, data.value_kg, recorded_at=recorded_at)
+    publish_weight(current_user.username, entry.value_kg, entry.recorded_at, entry.version)
     return {"value_kg": entry.value_kg, "recorded_at": entry.recorded_at.isoformat() if entry.recorded_at else None}
 
 
+def _idempotent(response: Response, current_user, scope: str, key: str | None, data: BaseModel, fn):
+    """Run fn once per (user, endpoint, Idempotency-Key); retries get the stored result."""
+    if key is None:
+        return fn()
+    if not key or len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters.")
+    try:
+        result, replayed = idempotency_store.run(f"{current_user.username}:{scope}:{key}", data.model_dump_json(), fn)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body.")
+    except TimeoutError:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress.")
+    if replayed:
+        response.headers["Idempotency-Replayed"] = "true"
+    return result
+
+
 @app.post("/log_input")
-def analyze_food(data: ActivityInput, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    user_config = {
+def analyze_food(
+    data: ActivityInput,
+    response: Response,
+    idempotency_key: str | None = Header(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Send an Idempotency-Key header to make retries return the first response instead of logging twice."""
+    with profile_if_slow("log_input"):
+        return _idempotent(response, current_user, "log_input", idempotency_key, data,
+                           lambda: _analyze_food(data, db, current_user))
+
+
+def _user_config(current_user) -> dict:
+    return {
         "username": current_user.username,
         "age": 25,
         "weight": current_user.weight_kg,
@@ -250,84 +549,28 @@ def analyze_food(data: ActivityInput, db: Session = Depends(get_db), current_use
         "height": current_user.height_cm,
         "activity_level": current_user.activity_level,
     }
-    system_prompt = f"""
-You are a structured health data extraction and estimation engine.
-User details:
-Age: {user_config['age']}
-Weight: {user_config['weight']} kg
-Gender: {user_config['gender']}
-Region: India, Maharastra
-From the user's sentence, extract:
-
-1) Physical activities performed.
-2) Foods consumed.
-
-Return ONLY valid JSON.
-Do NOT include explanations.
-Do NOT include markdown.
-Do NOT include text before or after the JSON.
-
-Output format must be exactly:
-
-{{
-  "activities": [
-    {{
-      "type": string,
-      "quantity": number,
-      "unit": string,
-      "calories_burned": number
-    }}
-  ],
-  "foods": [
-    {{
-      "name": string,
-      "quantity": number,
-      "unit": string,
-      "calories": number,
-      "protein": number,
-      "carbs": number,
-      "fat": number,
-      "fibre": number,
-      "sugar": number,
-      "saturated_fat": number,
-      "sodium": number
-    }}
-  ]
-}}
-
-Rules:
-- All numbers must be integers.
-- Always include unit.
-- If qty or unit is not very clear in input then make realistic guess using activity or food
-- Estimate realistic nutritional values.
-- Estimate calories burned using user weight and realistic MET values.
-- If a category has no entries, return an empty array.
-- Do not invent unrealistic quantities.
-
-"""
-    
-    parser_result = parse_input(data.sentence,float(user_config['weight']))
-
-    llm_required_segs = [item["segment"] for item in parser_result["llm"]]
-    user_promt = " and ".join(llm_required_segs) if llm_required_segs else None
 
-    # llm_required_seg = " and ".join([item["segment"] for item in parser_result["llm"]])
 
-    if(user_promt):
-        response = measure_openai_latency(
-            client.chat.completions.create,
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_promt}
-            ],
-        )
+def _analyze_food(data: ActivityInput, db: Session, current_user):
+    user_config = _user_config(current_user)
+    parser_result = parse_input(data.sentence,float(user_config['weight']))
 
-        print("-"*20,"User Promt","-"*20)
-        print(user_promt)
+    llm_required_segs = [item["segment"] for item in parser_result["llm"]]
 
-        llm_return = json.loads(response.choices[0].message.content)
-        parsed = ExtractionResponse(**llm_return)
+    pending_llm = []
+    if(llm_required_segs):
+        user_promt, prompt_tokens, overflow = fit_to_budget(user_config, llm_required_segs)
+        if overflow:
+            pending_llm.append((SYSTEM_PROMPT, build_user_message(user_config, overflow)))
+        logging.debug("request_id=%s User Prompt (%d tokens): %s", request_id.get(), prompt_tokens, user_promt)
+        try:
+            with span("llm_call", segments=len(llm_required_segs)):
+                parsed = measure_openai_latency(llm.extract, SYSTEM_PROMPT, user_promt)
+        except LLMUnavailable as e:
+            # Degrade: keep the local results now, enrich the LLM segments later.
+            logging.warning("request_id=%s LLM unavailable, queueing for enrichment: %s", request_id.get(), e)
+            parsed = ExtractionResponse(activities=[], foods=[])
+            pending_llm.append((SYSTEM_PROMPT, user_promt))
     
     else: 
         # No LLM needed → create empty structure
@@ -337,18 +580,10 @@ Rules:
         )
 
     # parsed.activities.extend(parser_result["local"])
-    parsed.activities.extend([
-    Activity(
-        type=item["activity"],
-        quantity=item["quantity"],
-        unit=item["unit"],
-        calories_burned=item["calories_burned"]
-    )
-    for item in parser_result["local"]
-])
+    parsed.activities.extend(_local_activities(parser_result))
+    parsed.foods.extend(_local_foods(parser_result))
     # print(json.dumps(parsed,indent=2))
-    print("-"*20,"PARSED Data","-"*20)
-    print(parsed)
+    logging.debug("request_id=%s PARSED Data: %s", request_id.get(), parsed)
     summary = aggregate_summary(parsed.activities, parsed.foods)
     # tmp_calori_burned = 0
     # for activity in parsed.activities:
@@ -360,13 +595,185 @@ Rules:
     #     summary["calories_burned"] = tmp_calori_burned
 
         # ---- save to database ----
-    create_health_log(
-        session=db,
-        user_id=current_user.username,
-        raw_text=data.sentence,
-        activities=parsed.activities,
-        foods=parsed.foods
+    with span("db_commit"):
+        log = create_health_log(
+            session=db,
+            user_id=current_user.username,
+            raw_text=data.sentence,
+            activities=parsed.activities,
+            foods=parsed.foods,
+            pending_llm=pending_llm
+        )
+
+    publish_summary(db, current_user.username, log.timestamp.date(),
+                    totals_delta(parsed.activities, parsed.foods), log.version)
+
+    if pending_llm:
+        summary["pending_enrichment"] = True
+
+    return summary
+
+
+def _local_activities(parser_result) -> list[Activity]:
+    return [
+        Activity(
+            type=item["activity"],
+            quantity=item["quantity"],
+            unit=item["unit"],
+            calories_burned=item["calories_burned"]
+        )
+        for item in parser_result["local"]
+    ]
+
+
+def _local_foods(parser_result) -> list[CatalogueFood]:
+    return [CatalogueFood(**item["food"]) for item in parser_result["foods"]]
+
+
+@app.post("/log_input/batch")
+def analyze_food_batch(
+    data: LogBatchInput,
+    response: Response,
+    idempotency_key: str | None = Header(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Log many sentences at once (e.g. entries queued while the client was offline).
+    All entries share one parser/embedding run; their distinct LLM-bound segments are
+    extracted in as few LLM calls as the prompt budget allows, and everything is
+    saved in one transaction. Entries keep their client logged_at time.
+    Returns per-entry results plus an aggregate_summary over all entries.
+    Honours Idempotency-Key like /log_input.
+    """
+    if not data.entries:
+        raise HTTPException(status_code=400, detail="entries must not be empty.")
+    if len(data.entries) > LOG_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {LOG_BATCH_MAX} entries per batch.")
+    with profile_if_slow("log_input_batch"):
+        return _idempotent(response, current_user, "log_input_batch", idempotency_key, data,
+                           lambda: _analyze_food_batch(data, db, current_user))
+
+
+def _analyze_food_batch(data: LogBatchInput, db: Session, current_user):
+    user_config = _user_config(current_user)
+    parser_results = parse_batch([e.sentence for e in data.entries], float(user_config["weight"]))
+
+    # Each distinct LLM-bound segment is extracted once, however many entries contain it.
+    entry_segments = [[item["segment"] for item in r["llm"]] for r in parser_results]
+    distinct = list(dict.fromkeys(seg for segs in entry_segments for seg in segs))
+    extracted = {}
+    failed = set()
+    for batch in pack_batches(user_config, distinct):
+        try:
+            with span("llm_call", segments=len(batch)):
+                parsed = measure_openai_latency(
+                    llm.extract_batch, BATCH_SYSTEM_PROMPT, build_batch_message(user_config, batch), len(batch))
+        except LLMUnavailable as e:
+            logging.warning("request_id=%s LLM unavailable for %d batched segments, queueing: %s", request_id.get(), len(batch), e)
+            failed.update(batch)
+            continue
+        # A segment the reply has no items for (left out, or a garbled number) is queued like an unavailable call.
+        missing = [seg for seg, result in zip(batch, parsed) if result is None]
+        if missing:
+            logging.warning("request_id=%s LLM reply had no items for %d of %d batched segments, queueing them",
+                            request_id.get(), len(missing), len(batch))
+            failed.update(missing)
+        extracted.update((seg, result) for seg, result in zip(batch, parsed) if result is not None)
+
+    entries = []
+    for entry, parser_result, segments in zip(data.entries, parser_results, entry_segments):
+        activities = []
+        foods = []
+        for seg in segments:
+            if seg in extracted:
+                activities.extend(a.model_copy() for a in extracted[seg].activities)
+                foods.extend(f.model_copy() for f in extracted[seg].foods)
+        activities.extend(_local_activities(parser_result))
+        foods.extend(_local_foods(parser_result))
+        unresolved = [seg for seg in segments if seg in failed]
+        timestamp = entry.logged_at
+        if timestamp is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        entries.append({
+            "raw_text": entry.sentence,
+            "activities": activities,
+            "foods": foods,
+            "pending_llm": [(SYSTEM_PROMPT, build_user_message(user_config, unresolved))] if unresolved else [],
+            "timestamp": timestamp,
+        })
+
+    with span("db_commit", entries=len(entries)):
+        logs = create_health_logs(db, current_user.username, entries)
+
+    day_deltas = {}
+    day_versions = {}
+    for entry, log in zip(entries, logs):
+        delta = totals_delta(entry["activities"], entry["foods"])
+        day = log.timestamp.date()
+        acc = day_deltas.setdefault(day, dict.fromkeys(delta, 0))
+        for k, v in delta.items():
+            acc[k] += v
+        day_versions[day] = log.version
+    for day, delta in day_deltas.items():
+        publish_summary(db, current_user.username, day, delta, day_versions[day])
+
+    results = []
+    for index, (entry, log) in enumerate(zip(entries, logs)):
+        summary = aggregate_summary(entry["activities"], entry["foods"])
+        if entry["pending_llm"]:
+            summary["pending_enrichment"] = True
+        results.append({"index": index, "log_id": log.id, "timestamp": log.timestamp, "summary": summary})
+    combined = aggregate_summary(
+        [a for e in entries for a in e["activities"]],
+        [f for e in entries for f in e["foods"]],
     )
+    if any(e["pending_llm"] for e in entries):
+        combined["pending_enrichment"] = True
+    return {"results": results, "aggregate_summary": combined}
+
+
+def _push_user(token: str | None):
+    """User for a push connection from its bearer token, or None if the token is missing or invalid."""
+    if not token:
+        return None
+    try:
+        username = verify_token(token).get("sub")
+    except HTTPException:
+        return None
+    with SessionLocal() as db:
+        return get_user_by_username(db, username) if username else None
+
+
+@app.websocket("/ws")
+async def push_websocket(websocket: WebSocket, token: str | None = None):
+    """
+    Push channel: summary deltas after each log or weight entry, and passive-burn ticks.
+    Browsers cannot set headers on WebSockets, so the access token goes in ?token=.
+    """
+    user = await run_in_threadpool(_push_user, token)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        async for event in events(user):
+            await websocket.send_text(orjson.dumps(event).decode())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@app.get("/events")
+async def push_events(request: Request, token: str | None = None, credentials=Depends(security)):
+    """Server-sent events version of /ws, for clients that prefer plain HTTP. Token via Bearer header or ?token=."""
+    user = await run_in_threadpool(_push_user, credentials.credentials if credentials else token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
 
+    async def stream():
+        async for event in events(user):
+            if await request.is_disconnected():
+                break
+            yield f"event: {event['type']}\ndata: {orjson.dumps(event).decode()}\n\n"
 
-    return summary
\ No newline at end of file
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -63,13 +63,14 @@ def calculate_calories_burned(results: dict, weight_kg: float):
 
 # --- Real-time calorie burn calculation ---
 from datetime import datetime as dt
+from functools import lru_cache
 
-def calculate_realtime_burn(weight_kg: float, height_cm: float, gender: str, activity_level: str | None = None, age: int | None = None) -> float:
+
+@lru_cache(maxsize=4096)
+def passive_burn_rates(weight_kg: float, height_cm: float, gender: str, activity_level: str | None = None, age: int | None = None) -> tuple[float, float]:
     """
-    Calculates calories burned from 12:00 AM till current moment.
-    Assumes:
-    - First 6 hours (00:00–06:00) sleeping
-    - Remaining hours waking
+    (sleep, wake) calories burned per hour for a profile. Cached on the
+    profile, so push ticks only do the time arithmetic.
     """
     if age is None:
         age = 25
@@ -92,15 +93,28 @@ def calculate_realtime_burn(weight_kg: float, height_cm: float, gender: str, act
 
     sleep_cal_per_hour = (bmr / 24) * 0.95
     wake_cal_per_hour = (bmr / 24) * activity_multiplier
+    return sleep_cal_per_hour, wake_cal_per_hour
+
 
-    now = dt.now()
+def passive_burn_since_midnight(rates: tuple[float, float], now: dt | None = None) -> float:
+    """Calories burned from 12:00 AM till now at the given (sleep, wake) hourly rates."""
+    sleep_cal_per_hour, wake_cal_per_hour = rates
+    now = now or dt.now()
     hours_since_midnight = now.hour + now.minute / 60
 
     sleep_hours = min(hours_since_midnight, 6)
     wake_hours = max(0, hours_since_midnight - 6)
 
-    # print("Sleep Hours: ",sleep_hours,"\t Wake Hours:",wake_hours)
-
     total_burned = (sleep_hours * sleep_cal_per_hour) + (wake_hours * wake_cal_per_hour)
 
     return round(total_burned, 2)
+
+
+def calculate_realtime_burn(weight_kg: float, height_cm: float, gender: str, activity_level: str | None = None, age: int | None = None) -> float:
+    """
+    Calculates calories burned from 12:00 AM till current moment.
+    Assumes:
+    - First 6 hours (00:00–06:00) sleeping
+    - Remaining hours waking
+    """
+    return passive_burn_since_midnight(passive_burn_rates(weight_kg, height_cm, gender, activity_level, age))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -23,6 +23,11 @@ class Food(BaseModel):
     saturated_fat: int
     sodium: int
 
+
+class CatalogueFood(Food):
+    """A food resolved from the local food catalogue instead of the LLM."""
+    source: str = "catalogue"
+
 class HealthLog(BaseModel):
     user_id: str
     timestamp: datetime
@@ -38,6 +43,43 @@ class ActivityInput(BaseModel):
     sentence: str
 
 
+class FoodPatch(BaseModel):
+    """Fields to change on a logged food; a new quantity alone rescales the nutrients."""
+    name: Optional[str] = None
+    quantity: Optional[float] = None
+    unit: Optional[str] = None
+    calories: Optional[int] = None
+    protein: Optional[int] = None
+    carbs: Optional[int] = None
+    fat: Optional[int] = None
+    fibre: Optional[int] = None
+    sugar: Optional[int] = None
+    saturated_fat: Optional[int] = None
+    sodium: Optional[int] = None
+
+
+class ActivityPatch(BaseModel):
+    """Fields to change on a logged activity; a new quantity alone rescales calories_burned."""
+    type: Optional[str] = None
+    quantity: Optional[float] = None
+    unit: Optional[str] = None
+    calories_burned: Optional[int] = None
+
+
+class LogPatch(BaseModel):
+    raw_text: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+
+class LogBatchEntry(BaseModel):
+    sentence: str
+    logged_at: Optional[datetime] = None  # client time the entry was made; defaults to now
+
+
+class LogBatchInput(BaseModel):
+    entries: List[LogBatchEntry]
+
+
 class SignInInput(BaseModel):
     username: str
     password: str
@@ -54,6 +96,100 @@ class SignUpInput(BaseModel):
     goal:str
 
 
+# -----------------------------
+# RESPONSE MODELS (read endpoints)
+# -----------------------------
+
+
+class FoodEntry(BaseModel):
+    id: str
+    name: str
+    quantity: float
+    unit: str
+    calories: int
+    protein: int
+    carbs: int
+    fat: int
+    fibre: int
+    sugar: int
+    timestamp: Optional[datetime]
+
+
+class ActivityEntry(BaseModel):
+    id: str
+    type: str
+    quantity: float
+    unit: str
+    calories_burned: int
+    timestamp: Optional[datetime]
+
+
+class FoodColumns(BaseModel):
+    """Columnar form of List[FoodEntry]: one parallel array per field."""
+    id: List[str]
+    name: List[str]
+    quantity: List[float]
+    unit: List[str]
+    calories: List[int]
+    protein: List[int]
+    carbs: List[int]
+    fat: List[int]
+    fibre: List[int]
+    sugar: List[int]
+    timestamp: List[Optional[datetime]]
+
+
+class ActivityColumns(BaseModel):
+    """Columnar form of List[ActivityEntry]: one parallel array per field."""
+    id: List[str]
+    type: List[str]
+    quantity: List[float]
+    unit: List[str]
+    calories_burned: List[int]
+    timestamp: List[Optional[datetime]]
+
+
+class DailySummary(BaseModel):
+    calories_intake: int
+    calories_burned: int
+    protein: int
+    carbs: int
+    fibre: int
+    sugar: int
+
+
+class GoalNutrient(BaseModel):
+    nutrient: str
+    kind: str  # target | limit
+    target: int
+    consumed: int
+    remaining: int
+
+
+class GoalProgress(BaseModel):
+    goal: Optional[str]
+    nutrients: List[GoalNutrient]
+
+
+class TodaySummaryResponse(BaseModel):
+    summary: DailySummary
+    goal: GoalProgress
+    foods: List[FoodEntry]
+    activities: List[ActivityEntry]
+
+
+class TodaySummaryColumnarResponse(BaseModel):
+    summary: DailySummary
+    goal: GoalProgress
+    foods: FoodColumns
+    activities: ActivityColumns
+
+
+class WeightEntryOut(BaseModel):
+    value_kg: float
+    recorded_at: Optional[datetime]
+
+
 def total_macros(log: HealthLog) -> dict:
     return {
         "protein": sum(f.protein for f in log.foods),
@@ -0,0 +1,177 @@
+"""
+Password hashing.
+
+Hashes are stored as "<scheme>$<params...>". The active scheme is picked with
+PASSWORD_HASHER (default: scrypt). Legacy rows hold a bare unsalted SHA-256
+hex digest; they still verify and are flagged for rehash so crud can upgrade
+them on the next successful sign-in.
+
+KDF work runs on a dedicated, bounded thread pool (hashlib.scrypt releases the
+GIL), so a login burst is capped at PASSWORD_HASH_WORKERS cores instead of
+eating every request thread. When more than PASSWORD_HASH_MAX_PENDING
+verifications are queued or running, new ones fail fast with HasherBusy; a
+caller that waits longer than PASSWORD_HASH_TIMEOUT_S also gets HasherBusy
+(the endpoints answer 503 with Retry-After), while its hash keeps its pending
+slot until it actually finishes.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+HASH_TIMEOUT_S = float(os.getenv("PASSWORD_HASH_TIMEOUT_S", "10"))
+
+_LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class HasherBusy(RuntimeError):
+    """Raised when the hashing pool backlog is full."""
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class ScryptHasher:
+    """scrypt via hashlib (OpenSSL). Format: scrypt$n$r$p$salt$hash."""
+
+    scheme = "scrypt"
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1, dklen: int = 32):
+        self.n, self.r, self.p, self.dklen = n, r, p, dklen
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int, dklen: int) -> bytes:
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p, dklen=dklen, maxmem=256 * n * r * p
+        )
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p, self.dklen)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(digest)}"
+
+    def verify(self, password: str, stored_hash: str) -> bool:
+        try:
+            _, n, r, p, salt, digest = stored_hash.split("$")
+            expected = _unb64(digest)
+            actual = self._derive(password, _unb64(salt), int(n), int(r), int(p), len(expected))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        parts = stored_hash.split("$")
+        return len(parts) != 6 or parts[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+
+class Argon2Hasher:
+    """argon2id via argon2-cffi (optional dependency). Stores the standard PHC string."""
+
+    scheme = "argon2"
+
+    def __init__(self):
+        from argon2 import PasswordHasher
+
+        self._ph = PasswordHasher()
+
+    def hash(self, password: str) -> str:
+        return self._ph.hash(password)
+
+    def verify(self, password: str, stored_hash: str) -> bool:
+        from argon2.exceptions import InvalidHashError, VerificationError
+
+        try:
+            return self._ph.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        return self._ph.check_needs_rehash(stored_hash)
+
+
+HASHERS = {
+    "scrypt": ScryptHasher,
+    "argon2": Argon2Hasher,
+}
+
+
+def _scheme_of(stored_hash: str) -> str:
+    if _LEGACY_SHA256.match(stored_hash):
+        return "sha256"
+    if stored_hash.startswith("$argon2"):
+        return "argon2"
+    return stored_hash.split("$", 1)[0]
+
+
+_hasher = HASHERS[os.getenv("PASSWORD_HASHER", "scrypt")]()
+_verifiers = {_hasher.scheme: _hasher}
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+_pending = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+
+def _verifier_for(scheme: str):
+    if scheme not in _verifiers:
+        _verifiers[scheme] = HASHERS[scheme]()
+    return _verifiers[scheme]
+
+
+def _run_in_pool(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise HasherBusy("Too many concurrent password checks")
+    try:
+        future = _pool.submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # Released when the hash finishes, not when the caller stops waiting, so the limit holds under timeouts.
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT_S)
+    except TimeoutError:
+        future.cancel()  # drops it if still queued; a running hash finishes and frees its slot then
+        raise HasherBusy(f"Password check queued for more than {HASH_TIMEOUT_S:g}s") from None
+
+
+def _verify(password: str, stored_hash: str) -> bool:
+    scheme = _scheme_of(stored_hash)
+    if scheme == "sha256":
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored_hash)
+    if scheme not in HASHERS:
+        return False
+    return _verifier_for(scheme).verify(password, stored_hash)
+
+
+def hash_password(password: str) -> str:
+    """Hash with the active scheme on the hashing pool."""
+    return _run_in_pool(_hasher.hash, password)
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """Constant-time check against any known scheme, on the hashing pool."""
+    return _run_in_pool(_verify, password, stored_hash)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True for legacy SHA-256 rows, other schemes, or outdated parameters."""
+    if _scheme_of(stored_hash) != _hasher.scheme:
+        return True
+    return _hasher.needs_rehash(stored_hash)
+
+
+# Verified when the username does not exist, so unknown users cost the same
+# KDF time as wrong passwords and response timing does not leak usernames.
+DUMMY_HASH = _hasher.hash("nutrilog-dummy-password")
@@ -0,0 +1,118 @@
+"""
+Prompt building and token budgeting for the extraction call.
+
+The system prompt is a single static string, identical for every user and
+request, so providers that cache prompt prefixes can reuse it. Everything
+per-user (age, weight, gender, region) goes into a short header on the user
+message, after the cacheable prefix.
+
+Token counts use tiktoken when it is installed and its encoding is available
+locally, and a ~4 characters/token estimate otherwise.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "1200"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "800"))
+# Entries per batch call; bounded by the reply fitting LLM_MAX_OUTPUT_TOKENS.
+LLM_BATCH_MAX_SEGMENTS = int(os.getenv("LLM_BATCH_MAX_SEGMENTS", "12"))
+
+ACTIVITY_FIELDS = ("type", "quantity", "unit", "calories_burned")
+FOOD_FIELDS = (
+    "name", "quantity", "unit", "calories", "protein", "carbs", "fat",
+    "fibre", "sugar", "saturated_fat", "sodium",
+)
+
+SYSTEM_PROMPT = f"""You are a structured health data extraction and estimation engine.
+Extract physical activities performed and foods consumed from the user's text.
+Reply with one JSON object only, no markdown or prose:
+{{"activities":[{{{",".join(ACTIVITY_FIELDS)}}}],"foods":[{{{",".join(FOOD_FIELDS)}}}]}}
+Rules:
+- type, name and unit are strings; quantity is a number; every other field is an integer.
+- If quantity or unit is unclear, make a realistic guess for that food or activity.
+- Estimate realistic nutrition; estimate calories_burned from the user's weight and realistic MET values.
+- Use an empty array for a category with no entries. Do not invent unrealistic quantities."""
+
+# Variant for /log_input/batch: several independent entries in one call, each
+# item tagged with the entry it came from. Also a static, cacheable prefix.
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+- The text is a numbered list of separate entries. Add "segment": <entry number> to every activity and food."""
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # not installed, or encoding not cached and no network
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _header(user_config: dict) -> str:
+    return (
+        f"User: age {user_config['age']}, weight {user_config['weight']} kg, "
+        f"gender {user_config['gender']}, region India, Maharashtra."
+    )
+
+
+def build_user_message(user_config: dict, segments: list[str]) -> str:
+    """Short per-user header plus the segments to extract."""
+    return f"{_header(user_config)}\nText: {' and '.join(segments)}"
+
+
+def build_batch_message(user_config: dict, segments: list[str]) -> str:
+    """Per-user header plus segments as a numbered list, for BATCH_SYSTEM_PROMPT."""
+    lines = "\n".join(f"{i}. {seg}" for i, seg in enumerate(segments, 1))
+    return f"{_header(user_config)}\nEntries:\n{lines}"
+
+
+def pack_batches(user_config: dict, segments: list[str], max_tokens: int = LLM_MAX_INPUT_TOKENS,
+                 max_segments: int = LLM_BATCH_MAX_SEGMENTS) -> list[list[str]]:
+    """
+    Split segments into as few numbered-entry prompts as fit max_tokens and
+    max_segments each (greedy, order kept). A segment too long on its own
+    still gets a call.
+    """
+    budget = max_tokens - count_tokens(BATCH_SYSTEM_PROMPT) - count_tokens(_header(user_config) + "\nEntries:")
+    batches, current, used = [], [], 0
+    for seg in segments:
+        cost = count_tokens(f"\n{len(current) + 1}. {seg}")
+        if current and (used + cost > budget or len(current) >= max_segments):
+            batches.append(current)
+            current, used = [], 0
+            cost = count_tokens(f"\n1. {seg}")
+        current.append(seg)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def fit_to_budget(user_config: dict, segments: list[str], max_tokens: int = LLM_MAX_INPUT_TOKENS) -> tuple[str, int, list[str]]:
+    """
+    Build the user message, keeping system + user under max_tokens by moving
+    trailing segments out. Returns (message, input token count, overflow
+    segments); at least one segment is always kept.
+    """
+    system_tokens = count_tokens(SYSTEM_PROMPT)
+    kept = list(segments)
+    while True:
+        message = build_user_message(user_config, kept)
+        total = system_tokens + count_tokens(message)
+        if total <= max_tokens or len(kept) <= 1:
+            break
+        kept.pop()
+    overflow = segments[len(kept):]
+    if overflow:
+        logger.warning("Prompt over %d-token budget; deferring %d segment(s)", max_tokens, len(overflow))
+    return message, total, overflow
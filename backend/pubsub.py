@@ -0,0 +1,188 @@
+"""
+Channel pub/sub for server push (/ws and /events).
+
+InProcessPubSub fans messages out to subscribers in this process: publish()
+may be called from any thread (sync endpoints, the enrichment worker) and
+delivers onto each subscriber's asyncio loop.
+
+With several API workers, a write handled by one worker must reach a user
+connected to another. Set PUBSUB_SOCKET and run the local broker next to
+uvicorn (from backend/):
+    PUBSUB_SOCKET=/tmp/nutrilog-pubsub.sock python -m pubsub
+Each worker then publishes through the broker, which relays every message
+to all workers. If the broker is unreachable a worker keeps delivering to
+its own subscribers and reconnects every PUBSUB_RETRY_S.
+
+Protocol (multiprocessing.connection, authenticated with PUBSUB_AUTHKEY, or
+without it a random key kept in <PUBSUB_SOCKET>.key, see ipc.py):
+    ("publish", channel, message) in both directions.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+from dotenv import load_dotenv
+
+from ipc import client_authkey, connect, listen, service_authkey
+
+load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_SOCKET = os.getenv("PUBSUB_SOCKET", "")
+# Empty: use the key the broker stores next to the socket (see ipc.py).
+PUBSUB_AUTHKEY = os.getenv("PUBSUB_AUTHKEY", "")
+PUBSUB_RETRY_S = float(os.getenv("PUBSUB_RETRY_S", "5"))
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    """One subscriber's bounded queue; the oldest message is dropped when a slow client falls behind."""
+
+    def __init__(self, hub: "InProcessPubSub", channel: str, loop: asyncio.AbstractEventLoop):
+        self.hub = hub
+        self.channel = channel
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=PUBSUB_QUEUE_SIZE)
+
+    def _put(self, message) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    def deliver(self, message) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # loop already closed
+            self.close()
+
+    async def get(self, timeout: float):
+        """Next message, or None if none arrives within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class InProcessPubSub:
+    def __init__(self):
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        """Call from the event loop that will consume the subscription."""
+        sub = Subscription(self, channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def publish(self, channel: str, message) -> None:
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub.deliver(message)
+
+
+class BrokerPubSub(InProcessPubSub):
+    """InProcessPubSub whose publishes go through the local broker to every worker."""
+
+    def __init__(self, address: str = PUBSUB_SOCKET, authkey: str = PUBSUB_AUTHKEY):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self._conn = None
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, name="pubsub-broker", daemon=True).start()
+
+    def _receive(self):
+        while True:
+            try:
+                conn = connect(self.address, client_authkey(self.authkey, self.address), PUBSUB_RETRY_S)
+            except (OSError, EOFError, AuthenticationError) as e:
+                logger.warning("Pub/sub broker %s unavailable (%s); delivering locally", self.address, e)
+                time.sleep(PUBSUB_RETRY_S)
+                continue
+            self._conn = conn
+            try:
+                while True:
+                    _, channel, message = conn.recv()
+                    super().publish(channel, message)
+            except (OSError, EOFError):
+                logger.warning("Lost pub/sub broker connection; reconnecting")
+            finally:
+                self._conn = None
+                conn.close()
+            time.sleep(PUBSUB_RETRY_S)
+
+    def publish(self, channel: str, message) -> None:
+        conn = self._conn
+        if conn is not None:
+            try:
+                with self._send_lock:
+                    conn.send(("publish", channel, message))
+                return  # the broker echoes it back to this worker's subscribers too
+            except (OSError, EOFError, ValueError):
+                pass
+        super().publish(channel, message)
+
+
+def get_pubsub() -> InProcessPubSub:
+    return BrokerPubSub() if PUBSUB_SOCKET else InProcessPubSub()
+
+
+def _relay(conn, clients: dict, lock: threading.Lock):
+    with conn:
+        while True:
+            try:
+                item = conn.recv()
+            except (EOFError, OSError):
+                break
+            with lock:
+                targets = list(clients.items())
+            for other, send_lock in targets:
+                try:
+                    with send_lock:
+                        other.send(item)
+                except (EOFError, OSError):
+                    pass
+    with lock:
+        clients.pop(conn, None)
+
+
+def serve(address: str = PUBSUB_SOCKET, authkey: str = PUBSUB_AUTHKEY):
+    """Local broker: relay every published message to all connected workers."""
+    if not address:
+        raise SystemExit("Set PUBSUB_SOCKET to the Unix socket path to listen on")
+    key = service_authkey(authkey, address)
+    clients: dict = {}
+    lock = threading.Lock()
+    with listen(address, key) as listener:
+        logger.info("Pub/sub broker listening on %s", address)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # failed handshake (wrong authkey) etc.
+                logger.warning("Rejected pub/sub client: %s", e)
+                continue
+            with lock:
+                clients[conn] = threading.Lock()
+            threading.Thread(target=_relay, args=(conn, clients, lock), daemon=True).start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    serve()
@@ -0,0 +1,67 @@
+"""
+Per-user push stream for the dashboard, replacing polling of
+/today_summary and /passive_calorie_burned.
+
+Events (JSON objects with a "type"):
+- summary:      after a log is saved or enriched. Carries the day, the
+                entry's delta and that day's new totals.
+- weight:       after a weight entry is saved.
+- passive_burn: every PUSH_TICK_S, calories burned since midnight from the
+                user's cached BMR rates (met_engine.passive_burn_rates).
+"""
+import os
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+from crud import get_daily_totals
+from met_engine import passive_burn_rates, passive_burn_since_midnight
+from pubsub import get_pubsub
+
+load_dotenv(override=True)
+
+PUSH_TICK_S = float(os.getenv("PUSH_TICK_S", "60"))
+
+hub = get_pubsub()
+
+
+def publish_summary(session, user_id: str, day: date, delta: dict, version: int | None = None) -> None:
+    hub.publish(user_id, {
+        "type": "summary",
+        "day": day.isoformat(),
+        "delta": delta,
+        "totals": get_daily_totals(session, user_id, day),
+        "version": version,
+    })
+
+
+def publish_weight(user_id: str, value_kg: float, recorded_at, version: int | None = None) -> None:
+    hub.publish(user_id, {
+        "type": "weight",
+        "value_kg": value_kg,
+        "recorded_at": recorded_at.isoformat() if recorded_at else None,
+        "version": version,
+    })
+
+
+def passive_burn_event(rates: tuple[float, float]) -> dict:
+    return {"type": "passive_burn", "calories": int(passive_burn_since_midnight(rates))}
+
+
+async def events(user, tick_s: float = PUSH_TICK_S):
+    """Async stream of events for one connection: a passive_burn tick now and every tick_s, published events as they come."""
+    rates = passive_burn_rates(user.weight_kg, user.height_cm, user.gender, user.activity_level, 25)
+    sub = hub.subscribe(user.username)
+    try:
+        yield passive_burn_event(rates)
+        next_tick = time.monotonic() + tick_s
+        while True:
+            message = await sub.get(max(0.0, next_tick - time.monotonic()))
+            if message is None:
+                yield passive_burn_event(rates)
+                next_tick = time.monotonic() + tick_s
+            else:
+                yield message
+    finally:
+        sub.close()
@@ -0,0 +1,86 @@
+"""
+In-process sliding-window rate limiting for sign-in.
+
+Failed attempts are counted per username and per client IP. A successful
+sign-in clears the username's window. State is per worker process, which is
+enough to blunt online guessing against a single node.
+
+Keys are kept in last-hit order, so expired keys are swept from the front on
+every hit, and at most SIGNIN_LIMITER_MAX_KEYS keys are tracked (the least
+recently hit is dropped first): credential stuffing with endless distinct
+usernames or IPs cannot grow the state without bound.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+
+class SlidingWindowLimiter:
+    """Allows at most `limit` hits per key within `window_s` seconds."""
+
+    def __init__(self, limit: int, window_s: float, max_keys: int = 100_000):
+        self.limit = limit
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self._hits: OrderedDict[str, deque] = OrderedDict()  # least recently hit first
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float) -> deque:
+        hits = self._hits.get(key)
+        if hits is None:
+            return deque()
+        while hits and hits[0] <= now - self.window_s:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+        return hits
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until the key may try again; 0 if it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._prune(key, now)
+            if len(hits) < self.limit:
+                return 0.0
+            return hits[0] + self.window_s - now
+
+    def _sweep(self, now: float) -> None:
+        # A key's newest hit is its last; once the front key's is outside the window, all of its hits are.
+        while self._hits:
+            key, hits = next(iter(self._hits.items()))
+            if hits[-1] > now - self.window_s and len(self._hits) <= self.max_keys:
+                break
+            del self._hits[key]
+
+    def hit(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._hits.setdefault(key, deque()).append(now)
+            self._hits.move_to_end(key)
+            self._sweep(now)
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+SIGNIN_LIMITER_MAX_KEYS = int(os.getenv("SIGNIN_LIMITER_MAX_KEYS", "100000"))
+
+signin_by_username = SlidingWindowLimiter(
+    limit=int(os.getenv("SIGNIN_MAX_FAILURES_PER_USER", "5")),
+    window_s=float(os.getenv("SIGNIN_WINDOW_S", "300")),
+    max_keys=SIGNIN_LIMITER_MAX_KEYS,
+)
+signin_by_ip = SlidingWindowLimiter(
+    limit=int(os.getenv("SIGNIN_MAX_FAILURES_PER_IP", "30")),
+    window_s=float(os.getenv("SIGNIN_WINDOW_S", "300")),
+    max_keys=SIGNIN_LIMITER_MAX_KEYS,
+)
@@ -0,0 +1,45 @@
+"""
+Fast JSON responses for read endpoints.
+
+ORJSONResponse renders with orjson, which serializes datetimes natively, so
+handlers can hand it rows without calling isoformat() per value. Handlers
+that return it directly also skip FastAPI's jsonable_encoder pass.
+
+version_etag / not_modified let read endpoints answer If-None-Match with a
+bodiless 304 from the user's change version, before loading any rows.
+"""
+import hashlib
+from typing import Any, Iterable, Sequence
+
+import orjson
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def to_columns(rows: Iterable[tuple], fields: Sequence[str]) -> dict:
+    """Transpose row tuples into {field: [values...]} parallel arrays."""
+    columns = list(zip(*rows))
+    if not columns:
+        return {field: [] for field in fields}
+    return {field: list(col) for field, col in zip(fields, columns)}
+
+
+def version_etag(version: int, *parts) -> str:
+    """Weak ETag for a response determined by the user's change version and the request parts."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 response if the request's If-None-Match already has etag, else None."""
+    header = request.headers.get("if-none-match")
+    if header and (header.strip() == "*" or etag in (t.strip() for t in header.split(","))):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -0,0 +1,285 @@
+"""
+Clause segmentation and cheap routing for the hybrid parser.
+
+split_clauses() tokenizes with one compiled regex (numbers keep their
+decimals, fractions, ranges and attached units, so "1.5 cup", "1/2 cup",
+"2-3 rotis" and "10km" survive; words are Unicode letters with their
+combining marks, so "चाय" is one token) and splits on clause boundaries:
+- strong boundaries (punctuation, "then", "later", "after that") always split;
+- weak connectors ("and", "&", "plus", "n", "also") split only when the
+  right-hand side starts a new item: it has a quantity, a subject pronoun or
+  an action verb. "rice and dal" stays one segment, "ran 5 km and ate poha"
+  becomes two.
+Segments are sliced out of the original text by token offsets, so their
+case, script and punctuation reach the LLM, the food catalogue and the
+activity matcher unchanged.
+
+route_segment() sends each segment to "activity", "food" or "ignore" before
+any model runs, using a keyword trie. Segments the trie cannot decide are
+"unknown"; if a trained linear head (ml_models/segment_router_head.npz) is
+present, parse_input asks it to classify the MiniLM embedding instead of
+running the activity similarity search blindly.
+
+Train the head from a labelled CSV (columns: segment,label):
+    python -m segmenter train ml_models/segment_corpus.csv
+"""
+import os
+import re
+import sys
+import unicodedata
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+BASE_DIR = Path(__file__).resolve().parent
+ROUTER_HEAD_PATH = BASE_DIR / "ml_models" / "segment_router_head.npz"
+ROUTER_HEAD_MIN_PROB = float(os.getenv("ROUTER_HEAD_MIN_PROB", "0.8"))
+
+ROUTES = ("activity", "food", "ignore")
+
+# Combining marks (Devanagari matras, viramas, accents ...) are not \w in re, but belong inside words.
+_MARKS = "".join(chr(c) for c in range(0x10000) if unicodedata.category(chr(c)).startswith("M"))
+_LETTER = rf"(?:[^\W\d_]|[{re.escape(_MARKS)}])"
+_TOKEN_RE = re.compile(
+    rf"\d+(?:[.,/-]\d+)*{_LETTER}*"  # 1.5, 1/2, 2-3, 10km
+    rf"|{_LETTER}+(?:['’-]{_LETTER}+)*"
+    r"|[,;:.!?&।]"
+)
+
+STRONG_BOUNDARIES = {",", ";", ":", ".", "!", "?", "।", "then", "later", "afterwards"}
+STRONG_PHRASES = (("after", "that"), ("followed", "by"))
+WEAK_CONNECTORS = {"and", "&", "plus", "n", "also"}
+
+SUBJECTS = {"i", "we", "i'm", "i’ve", "i've"}
+NUMBER_WORDS = {
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "half", "quarter", "couple", "few", "dozen", "twenty", "thirty", "forty", "fifty",
+}
+FILLER = {
+    "i", "we", "me", "my", "today", "tonight", "yesterday", "morning", "evening", "afternoon",
+    "night", "in", "the", "a", "an", "then", "that", "after", "also", "so", "ok", "okay",
+    "some", "too", "as", "well", "just", "for", "at", "of", "this", "and", "n", "plus",
+}
+
+ACTIVITY_KEYWORDS = [
+    "walk", "walked", "walking", "ran", "run", "running", "jog", "jogged", "jogging",
+    "cycle", "cycled", "cycling", "bike", "biked", "biking", "swim", "swam", "swimming",
+    "hike", "hiked", "hiking", "yoga", "gym", "workout", "exercise", "exercised",
+    "stretching", "stretched", "pushups", "pushup", "squats", "pullups", "situps", "plank",
+    "played", "play", "playing", "danced", "dance", "dancing", "trekking", "treadmill",
+    "skipping", "skipped", "rope", "climbed", "climbing", "stairs", "cricket", "football",
+    "soccer", "badminton", "basketball", "tennis", "boxing", "hiit", "weight training",
+    "weights", "lifting", "rowing", "zumba", "aerobics", "pilates", "steps", "cleaned",
+    "cleaning", "mopped", "mopping", "gardened", "gardening", "sweeping", "km", "kms",
+    "kilometers", "miles", "mile", "sprinted", "sprint", "kayaked", "kayaking", "rowed",
+    "skated", "skating", "crossfit", "burpees", "lunges", "jumping jacks", "martial arts",
+]
+FOOD_KEYWORDS = [
+    "ate", "eat", "eaten", "eating", "drank", "drink", "drinking", "breakfast", "lunch",
+    "dinner", "snack", "snacks", "meal", "cup", "cups", "plate", "plates", "bowl", "bowls",
+    "glass", "glasses", "slice", "slices", "piece", "pieces", "wati", "katori", "spoon",
+    "tablespoon", "teaspoon", "serving", "chapati", "chapatis", "roti", "rotis", "rice",
+    "dal", "poha", "upma", "idli", "dosa", "masala dosa", "paratha", "sabzi", "curry",
+    "tea", "chai", "coffee", "milk", "juice", "egg", "eggs", "banana", "apple", "bread",
+    "sandwich", "pizza", "burger", "biscuits", "paneer", "chicken", "fish", "salad",
+    "oats", "curd", "yogurt", "bhaji", "pav", "vada", "samosa", "biryani", "khichdi",
+]
+ACTION_VERBS = {
+    "walked", "ran", "jogged", "cycled", "swam", "hiked", "played", "did", "danced",
+    "ate", "had", "drank", "eat", "drink", "took", "went", "climbed", "lifted", "made",
+}
+
+
+class KeywordTrie:
+    """Token-level trie; longest_matches() returns the labels of the longest keyword hits."""
+
+    _END = "__label__"
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def add(self, phrase: str, label: str) -> None:
+        node = self.root
+        for token in phrase.split():
+            node = node.setdefault(token, {})
+        node[self._END] = label
+
+    def longest_matches(self, tokens: list[str]) -> list[str]:
+        labels = []
+        i = 0
+        while i < len(tokens):
+            node, j, hit, hit_end = self.root, i, None, i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if self._END in node:
+                    hit, hit_end = node[self._END], j
+            if hit is None:
+                i += 1
+            else:
+                labels.append(hit)
+                i = hit_end
+        return labels
+
+
+KEYWORDS = KeywordTrie()
+for _phrase in ACTIVITY_KEYWORDS:
+    KEYWORDS.add(_phrase, "activity")
+for _phrase in FOOD_KEYWORDS:
+    KEYWORDS.add(_phrase, "food")
+
+
+class Token(NamedTuple):
+    text: str  # lowercased
+    start: int  # offsets into the original string
+    end: int
+
+
+def tokens_with_offsets(text: str) -> list[Token]:
+    return [Token(m.group().lower(), m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+
+
+def tokenize(text: str) -> list[str]:
+    return [token.text for token in tokens_with_offsets(text)]
+
+
+def _is_quantity(token: str) -> bool:
+    return token[0].isdigit() or token in NUMBER_WORDS
+
+
+def _starts_new_item(tokens: list[str]) -> bool:
+    if not tokens:
+        return False
+    if tokens[0] in SUBJECTS or tokens[0] in ACTION_VERBS:
+        return True
+    return any(_is_quantity(t) for t in tokens)
+
+
+def _strong_chunks(tokens: list[Token]) -> list[list[Token]]:
+    chunks, current = [], []
+    i = 0
+    while i < len(tokens):
+        if tuple(t.text for t in tokens[i:i + 2]) in STRONG_PHRASES:
+            chunks.append(current)
+            current = []
+            i += 2
+            continue
+        if tokens[i].text in STRONG_BOUNDARIES:
+            chunks.append(current)
+            current = []
+        else:
+            current.append(tokens[i])
+        i += 1
+    chunks.append(current)
+    return [c for c in chunks if c]
+
+
+def split_clauses(text: str) -> list[str]:
+    """Split free text into item-level segments (see module docstring)."""
+    segments = []
+    for chunk in _strong_chunks(tokens_with_offsets(text)):
+        # "and also", "and then plus" ... act as one connector
+        chunk = [
+            t for i, t in enumerate(chunk)
+            if not (t.text in WEAK_CONNECTORS and i and chunk[i - 1].text in WEAK_CONNECTORS)
+        ]
+        words = [t.text for t in chunk]
+        weak_at = [i for i, t in enumerate(words) if t in WEAK_CONNECTORS]
+        start = 0
+        for pos, i in enumerate(weak_at):
+            nxt = weak_at[pos + 1] if pos + 1 < len(weak_at) else len(chunk)
+            left, right = chunk[start:i], words[i + 1:nxt]
+            if left and _starts_new_item(right):
+                segments.append(left)
+                start = i + 1
+            elif not left:
+                start = i + 1
+        tail = chunk[start:]
+        if tail and tail[-1].text in WEAK_CONNECTORS:
+            tail = tail[:-1]
+        if tail:
+            segments.append(tail)
+    return [text[s[0].start:s[-1].end] for s in segments]
+
+
+def route_segment(segment: str) -> str:
+    """'activity' | 'food' | 'ignore' from keywords alone, or 'unknown'."""
+    tokens = tokenize(segment)
+    if all(t in FILLER for t in tokens):
+        return "ignore"
+    labels = set(KEYWORDS.longest_matches(tokens))
+    if labels == {"activity"}:
+        return "activity"
+    if labels == {"food"}:
+        return "food"
+    return "unknown"
+
+
+class RouterHead:
+    """Softmax-regression head over sentence embeddings: activity / food / ignore."""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, scale: np.ndarray):
+        self.weights, self.bias, self.mean, self.scale = weights, bias, mean, scale
+
+    @classmethod
+    def load(cls, path: Path = ROUTER_HEAD_PATH) -> "RouterHead | None":
+        if not path.exists():
+            return None
+        data = np.load(path)
+        return cls(data["weights"], data["bias"], data["mean"], data["scale"])
+
+    def _logits(self, embeddings: np.ndarray) -> np.ndarray:
+        return ((embeddings - self.mean) / self.scale) @ self.weights + self.bias
+
+    def predict(self, embedding: np.ndarray, min_prob: float = ROUTER_HEAD_MIN_PROB) -> str:
+        """Route for one embedding, or 'unknown' below min_prob."""
+        logits = self._logits(np.atleast_2d(embedding))[0]
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return ROUTES[best] if probs[best] >= min_prob else "unknown"
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, labels: list[str], epochs: int = 500, lr: float = 0.5, l2: float = 1e-3):
+        mean = embeddings.mean(axis=0)
+        scale = embeddings.std(axis=0) + 1e-6
+        x = (embeddings - mean) / scale
+        y = np.eye(len(ROUTES))[[ROUTES.index(label) for label in labels]]
+        weights = np.zeros((x.shape[1], len(ROUTES)), dtype=np.float32)
+        bias = np.zeros(len(ROUTES), dtype=np.float32)
+        for _ in range(epochs):
+            logits = x @ weights + bias
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+            grad = (probs - y) / len(x)
+            weights -= lr * (x.T @ grad + l2 * weights)
+            bias -= lr * grad.sum(axis=0)
+        return cls(weights, bias, mean, scale)
+
+    def save(self, path: Path = ROUTER_HEAD_PATH) -> None:
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale)
+
+
+def _train(corpus_path: str) -> None:
+    import pandas as pd
+
+    from hybrid_parser import embed_segments
+
+    corpus = pd.read_csv(corpus_path)
+    corpus = corpus[corpus["label"].isin(ROUTES)]
+    embeddings = embed_segments(corpus["segment"].tolist())
+    head = RouterHead.fit(embeddings, corpus["label"].tolist())
+    head.save()
+    predictions = [head.predict(e, min_prob=0) for e in embeddings]
+    accuracy = np.mean([p == label for p, label in zip(predictions, corpus["label"])])
+    print(f"trained on {len(corpus)} segments, train accuracy {accuracy:.3f}, saved to {ROUTER_HEAD_PATH}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "train":
+        sys.exit("usage: python -m segmenter train <corpus.csv>")
+    _train(sys.argv[2])
@@ -0,0 +1,204 @@
+"""
+SQLite engines and per-user shard routing.
+
+With SHARD_COUNT=1 (the default) everything lives in one file, SQLITE_PATH.
+With SHARD_COUNT=N the `users` catalogue stays in SQLITE_PATH and every
+per-user table (logs, foods, activities, weight entries, totals, ...) lives
+in one of N shard files next to it (local.shard0.db ...), picked by a stable
+hash of the username. Each file has its own writer lock, so commits for
+users on different shards no longer queue behind each other.
+
+Sessions from SessionLocal route by table: `users` always goes to the
+catalogue, everything else to the shard chosen with use_shard(session,
+username) (auth.get_current_user does this for API requests) or
+shard_session(index) for per-shard jobs.
+
+Admin (from backend/):
+    SHARD_COUNT=8 python -m storage stats                   # rows per table per shard
+    SHARD_COUNT=8 python -m storage query "SELECT COUNT(*) FROM foods"
+    SHARD_COUNT=8 python -m storage split                   # copy a single-file DB's rows into the shards
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+
+load_dotenv(override=True)
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./local.db")
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+CATALOGUE_TABLES = frozenset({"users"})
+
+
+class ShardNotSelected(RuntimeError):
+    """A per-user table was queried on a session with no shard chosen."""
+
+
+def _sqlite_engine(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+catalogue_engine = _sqlite_engine(SQLITE_PATH)
+
+
+def shard_path(index: int) -> str:
+    path = Path(SQLITE_PATH)
+    return str(path.with_name(f"{path.stem}.shard{index}{path.suffix}"))
+
+
+@lru_cache(maxsize=None)
+def shard_engine(index: int):
+    """Engine (and connection pool) for one shard file, created once per process."""
+    if SHARD_COUNT == 1:
+        return catalogue_engine
+    return _sqlite_engine(shard_path(index))
+
+
+def shard_for(user_id: str) -> int:
+    """Stable shard index for a username (the same in every process and release)."""
+    digest = hashlib.blake2b(user_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % SHARD_COUNT
+
+
+def shard_indexes() -> range:
+    return range(SHARD_COUNT)
+
+
+def engines_for_table(name: str) -> list:
+    if name in CATALOGUE_TABLES or SHARD_COUNT == 1:
+        return [catalogue_engine]
+    return [shard_engine(i) for i in shard_indexes()]
+
+
+def tables_by_engine(tables) -> list[tuple]:
+    """(engine, [tables]) for every database file and the tables it holds, for schema setup and migrations."""
+    grouped: dict = {}
+    for table in tables:
+        for engine in engines_for_table(table.name):
+            grouped.setdefault(engine, []).append(table)
+    return list(grouped.items())
+
+
+class ShardedSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if SHARD_COUNT == 1:
+            return catalogue_engine
+        table = getattr(getattr(mapper, "local_table", None), "name", None)
+        if table in CATALOGUE_TABLES:
+            return catalogue_engine
+        index = self.info.get("shard")
+        if index is None:
+            if table is None:
+                return catalogue_engine
+            raise ShardNotSelected(f"No shard selected for table {table!r}; call use_shard() first")
+        return shard_engine(index)
+
+
+SessionLocal = sessionmaker(class_=ShardedSession, autocommit=False, autoflush=False)
+
+
+def use_shard(session: Session, user_id: str) -> Session:
+    """Route the session's per-user tables to user_id's shard."""
+    session.info["shard"] = shard_for(user_id)
+    return session
+
+
+def shard_session(index: int) -> Session:
+    """Session on one shard, for jobs that sweep every shard (enrichment, backfills, admin)."""
+    session = SessionLocal()
+    session.info["shard"] = index
+    return session
+
+
+def query_all_shards(sql: str, **params) -> list[tuple[int, tuple]]:
+    """Run one read-only SQL statement on every shard: [(shard index, row), ...]."""
+    rows = []
+    for index in shard_indexes():
+        with shard_engine(index).connect() as conn:
+            rows.extend((index, tuple(row)) for row in conn.execute(text(sql), params))
+    return rows
+
+
+def _stats():
+    from crud import Base
+
+    for index in shard_indexes():
+        engine = shard_engine(index)
+        counts = {}
+        with engine.connect() as conn:
+            for table in Base.metadata.sorted_tables:
+                if engine not in engines_for_table(table.name):
+                    continue
+                counts[table.name] = conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+        path = engine.url.database
+        size_mb = round(os.path.getsize(path) / 1024**2, 2) if os.path.exists(path) else 0
+        print(f"shard {index} {path} {size_mb} MB {counts}")
+
+
+def _split():
+    """Copy per-user rows from the single-file database into the shard files."""
+    from crud import Base  # creates and migrates the shard schemas
+
+    if SHARD_COUNT == 1:
+        raise SystemExit("Set SHARD_COUNT > 1 to split")
+    conn = sqlite3.connect(SQLITE_PATH)
+    conn.create_function("shard_of", 1, shard_for, deterministic=True)
+    tables = [t for t in Base.metadata.sorted_tables if t.name not in CATALOGUE_TABLES]
+    for index in shard_indexes():
+        conn.execute("ATTACH DATABASE ? AS shard", (shard_path(index),))
+        for table in tables:
+            source = {row[1] for row in conn.execute(f"PRAGMA main.table_info({table.name})")}
+            if not source:
+                continue
+            columns = ", ".join(c.name for c in table.columns if c.name in source)
+            copied = conn.execute(
+                f"INSERT OR IGNORE INTO shard.{table.name} ({columns}) "
+                f"SELECT {columns} FROM main.{table.name} WHERE shard_of(user_id) = ?",
+                (index,),
+            ).rowcount
+            print(f"shard {index}: {table.name} +{copied}")
+        conn.commit()
+        conn.execute("DETACH DATABASE shard")
+    conn.close()
+    print(f"Done. Per-user rows are still in {SQLITE_PATH}; delete them once the shards are verified.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="row counts and size per shard")
+    query = sub.add_parser("query", help="run a read-only SQL statement on every shard")
+    query.add_argument("sql")
+    sub.add_parser("split", help="copy a single-file database's per-user rows into the shards")
+    args = parser.parse_args()
+    if args.command == "stats":
+        _stats()
+    elif args.command == "query":
+        for index, row in query_all_shards(args.sql):
+            print(index, *row, sep="\t")
+    else:
+        _split()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Request tracing and hot-path instrumentation.
+
+- request_id: context variable set per HTTP request (X-Request-ID in/out;
+  clean_request_id() rejects client values that are not [A-Za-z0-9-]{1,64}).
+- span(stage): times a block and records it in a per-stage histogram and a
+  DEBUG log line tagged with the request id.
+- render_prometheus(): histograms in Prometheus text exposition format,
+  served by /metrics.
+- profile_if_slow(): optional cProfile of a handler, kept only when the
+  request was sampled and turned out slow.
+- setup_logging(): queue-backed logging so hot-path log calls never block on
+  file I/O.
+"""
+import atexit
+import cProfile
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+logger = logging.getLogger("nutrilog.trace")
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+
+REQUEST_ID_RE = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+# Seconds. Covers sub-ms regex work up to multi-second LLM calls.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def clean_request_id(value: str | None) -> str | None:
+    """value if it is safe to echo, log and use in file names, else None."""
+    return value if value is not None and REQUEST_ID_RE.fullmatch(value) else None
+
+
+def _escape(label_value: str) -> str:
+    """Label value escaped for the Prometheus text format (backslash, double quote, newline)."""
+    return str(label_value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label_value, series in sorted(snapshot.items()):
+            tag = f'{self.label}="{_escape(label_value)}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{tag},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{tag},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{tag}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{tag}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_value, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+
+class Gauge:
+    """Point-in-time value, one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, label_value: str, value: float) -> None:
+        with self._lock:
+            self._values[label_value] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_value, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+
+STAGE_SECONDS = Histogram("nutrilog_stage_seconds", "Time spent per pipeline stage.", "stage")
+REQUEST_SECONDS = Histogram("nutrilog_request_seconds", "HTTP request latency by path.", "path")
+
+METRICS = [STAGE_SECONDS, REQUEST_SECONDS]
+
+
+def register(metric):
+    """Add a metric to the /metrics output. Returns it so modules can define and register in one line."""
+    METRICS.append(metric)
+    return metric
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(stage, duration)
+        if logger.isEnabledFor(logging.DEBUG):
+            extra = " ".join(f"{k}={v!r}" for k, v in fields.items())
+            logger.debug("request_id=%s stage=%s duration_ms=%.3f %s", request_id.get(), stage, duration * 1000, extra)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profile_if_slow(name: str):
+    """
+    cProfile the block for a PROFILE_SAMPLE_RATE fraction of calls and keep the
+    dump (PROFILE_DIR/<name>-<request id>.prof) only if it took longer than
+    PROFILE_SLOW_MS. cProfile only sees the calling thread, so use this inside
+    the handler rather than in middleware.
+    """
+    if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+        yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= PROFILE_SLOW_MS:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            rid = clean_request_id(request_id.get()) or uuid.uuid4().hex
+            path = PROFILE_DIR / f"{name}-{rid}.prof"
+            profiler.dump_stats(path)
+            logger.warning("request_id=%s slow %s (%.0f ms), profile at %s", request_id.get(), name, elapsed_ms, path)
+
+
+def setup_logging(filename: str, level: int = logging.INFO) -> None:
+    """
+    Route all logging through a queue; a background listener does the file
+    writes. Safe to call more than once.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+    log_queue: queue.Queue = queue.Queue(-1)
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
@@ -0,0 +1,46 @@
+"""
+Tests run against throwaway SQLite files: crud creates its schema at import,
+so the database location is set before any backend module is imported.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = tempfile.mkdtemp(prefix="nutrilog-tests-")
+
+os.environ["SQLITE_PATH"] = os.path.join(DATA_DIR, "local.db")
+os.environ["ARCHIVE_DIR"] = os.path.join(DATA_DIR, "archive")
+os.environ["SHARD_COUNT"] = "1"
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.environ["SQLITE_PATH"])
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-at-least-32-bytes-long")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient on the app. Importing main loads the ONNX encoder, so this skips where the model is not installed."""
+    try:
+        import main
+    except FileNotFoundError as e:
+        pytest.skip(f"encoder model not installed: {e}")
+    from fastapi.testclient import TestClient
+
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def sign_in(client):
+    """sign_in(username) -> Authorization headers for a new account."""
+    def sign_in(username: str) -> dict:
+        profile = dict(username=username, password="pw123456", weight_kg=70, target_weight_kg=65, height_cm=170,
+                       gender="female", activity_level="low", goal="pcos")
+        assert client.post("/signup", json=profile).status_code == 200
+        token = client.post("/signin", json={"username": username, "password": "pw123456"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return sign_in
@@ -0,0 +1,106 @@
+"""Archived months stay visible: day and history reads fall back to segments, full syncs include them."""
+from datetime import date, datetime
+
+import archive
+import crud
+from models import Activity, Food
+
+FOOD = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+WALK = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+MARCH = [datetime(2024, 3, day, 9) for day in (3, 10, 17)]
+CUTOFF = datetime(2024, 4, 1)
+
+
+def _log_march(session, user_id):
+    logs = crud.create_health_logs(session, user_id, [
+        {"raw_text": f"had poha on {ts:%d}", "activities": [WALK], "foods": [FOOD], "timestamp": ts} for ts in MARCH
+    ])
+    return [log.id for log in logs]
+
+
+def _session(user_id):
+    session = crud.SessionLocal()
+    crud.use_shard(session, user_id)
+    return session
+
+
+def _archive(user_id):
+    with _session(user_id) as session:
+        return crud.archive_logs_before(session, CUTOFF)
+
+
+def test_write_segment_rerun_merges_by_id():
+    user = "archived-rerun"
+    log = {"id": "log-1", "user_id": user, "timestamp": "2024-03-03T09:00:00", "raw_text": "had poha", "version": 1}
+    food = {"id": "food-1", "log_id": "log-1", "user_id": user, "name": "poha", "calories": 250}
+    assert archive.write_segment(user, "2024-03", [log], [food], []) == 1
+    # a crash between the segment write and the hot delete re-archives the same rows next run
+    later = {**log, "id": "log-2", "timestamp": "2024-03-10T09:00:00"}
+    assert archive.write_segment(user, "2024-03", [log, later], [food], []) == 2
+    segment = archive.read_segment(user, "2024-03", cache=False)
+    assert sorted(row["id"] for row in segment["logs"]) == ["log-1", "log-2"]
+    assert [row["id"] for row in segment["foods"]] == ["food-1"]
+
+
+def test_pending_logs_stay_hot():
+    user = "archived-pending"
+    with _session(user) as session:
+        ids = _log_march(session, user)
+        waiting = crud.create_health_logs(session, user, [{
+            "raw_text": "had something", "activities": [], "foods": [],
+            "pending_llm": [("system", "had something")], "timestamp": MARCH[1],
+        }])[0].id
+    _archive(user)
+    with _session(user) as session:
+        hot = [log.id for log in session.query(crud.HealthLogDB).filter(crud.HealthLogDB.user_id == user)]
+        assert hot == [waiting]
+        assert session.get(crud.ArchivedMonthDB, (user, "2024-03")).logs == 3
+    assert sorted(row["id"] for row in archive.read_segment(user, "2024-03", cache=False)["logs"]) == sorted(ids)
+
+
+def test_day_and_page_reads_fall_back_to_the_archive():
+    user = "archived-reads"
+    with _session(user) as session:
+        archived = _log_march(session, user)
+        today = crud.create_health_log(session, user, "had poha today", [], [FOOD]).id
+    _archive(user)
+    with _session(user) as session:
+        [day] = crud.get_daily_logs(session, user, date(2024, 3, 10))
+        assert day.id == archived[1] and [f.name for f in day.foods] == ["poha"]
+        assert [a.type for a in day.activities] == ["walking"]
+        assert crud.get_daily_logs(session, user, date(2024, 3, 11)) == []
+
+        # two-log pages walk from the hot log into the archive without gaps or repeats
+        seen, before = [], None
+        while page := crud.get_logs_page(session, user, before, limit=2):
+            seen += [log.id for log in page]
+            before = (page[-1].timestamp, page[-1].id)
+        assert seen == [today] + archived[::-1]
+
+
+def test_full_sync_includes_archived_months():
+    user = "archived-sync"
+    with _session(user) as session:
+        ids = _log_march(session, user)
+        crud.create_health_log(session, user, "had poha today", [], [FOOD])
+        version = crud.get_change_version(session, user)
+    _archive(user)
+    with _session(user) as session:
+        full = crud.get_changes_since(session, user, 0)
+        assert [log.id for log in full["logs"][-3:]] == ids
+        assert len(full["logs"]) == 4 and len(full["foods"]) == 4 and len(full["activities"]) == 3
+        # archiving is not a change: a client already at `version` keeps its archived rows
+        assert crud.get_change_version(session, user) == version
+        assert crud.get_changes_since(session, user, version)["logs"] == []
+
+
+def test_sync_endpoint_returns_archived_logs(client, sign_in):
+    headers = sign_in("archived-api")
+    with _session("archived-api") as session:
+        _log_march(session, "archived-api")
+    _archive("archived-api")
+    assert len(client.get("/logs", headers=headers).json()["logs"]) == 3
+    body = client.get("/sync", params={"since": 0}, headers=headers).json()
+    assert body["full"] is True
+    assert len(body["logs"]) == 3 and len(body["foods"]) == 3 and len(body["activities"]) == 3
@@ -0,0 +1,46 @@
+from calibration import ActivityThresholds, _folds, cross_validate, fit, tradeoff
+
+
+def _example(text, activity, score, correct, margin=0.1):
+    return {"text": text, "activity": activity, "score": score, "margin": margin, "correct": correct}
+
+
+def _examples():
+    # running is right above 0.6 and wrong below; one rare activity is always wrong
+    examples = [_example(f"ran {i}", "running", 0.4 + i / 100, i > 20) for i in range(40)]
+    examples += [_example(f"swam {i}", "swimming", 0.9, False) for i in range(3)]
+    return examples
+
+
+def test_cutoffs_fall_between_observed_scores():
+    thresholds = fit(_examples(), target=1.0)
+    assert 0.60 < thresholds.activities["running"]["score"] < 0.61
+
+
+def test_rare_activities_keep_the_default():
+    thresholds = fit(_examples(), target=1.0, min_samples=10)
+    assert "swimming" not in thresholds.activities
+    assert thresholds.for_activity("swimming") == thresholds.default
+
+
+def test_held_out_estimate_never_sees_its_own_fold():
+    examples = _examples()
+    held_out = cross_validate(examples, target=1.0, k=5)
+    in_sample = tradeoff(examples, fit(examples, target=1.0))["in_sample"]
+    assert held_out["folds"] == 5
+    assert in_sample["accuracy"] == 1.0
+    assert held_out["resolution_rate"] <= in_sample["resolution_rate"] + 0.1
+
+
+def test_clauses_of_one_text_share_a_fold():
+    examples = [_example("ran and swam", "running", 0.9, True), _example("ran and swam", "swimming", 0.9, False)]
+    examples += [_example(f"walked {i}", "walking", 0.9, True) for i in range(9)]
+    folds = _folds(examples, 5)
+    assert sorted(n for fold in folds for n in fold) == list(range(len(examples)))
+    assert any({0, 1} <= set(fold) for fold in folds)
+
+
+def test_fixed_cutoff_point():
+    report = tradeoff(_examples(), ActivityThresholds({"score": 0.5, "margin": 0.0}))
+    assert report["texts"] == 43
+    assert report["in_sample"]["resolution_rate"] == round(32 / 43, 4)
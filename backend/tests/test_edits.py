@@ -0,0 +1,109 @@
+"""Edits and deletes keep daily_totals equal to a from-scratch sum of the user's foods and activities."""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+from models import Activity, Food
+
+POHA = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+CHAI = Food(name="chai", quantity=2, unit="cup", calories=180, protein=6, carbs=24,
+            fat=6, fibre=0, sugar=16, saturated_fat=4, sodium=80)
+WALK = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+
+
+@pytest.fixture
+def session(request):
+    user = f"editor-{request.node.name}"
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, user)
+        session.info["user"] = user
+        for _ in range(2):
+            crud.create_health_log(session, user, "had poha, chai and walked", [WALK], [POHA, CHAI])
+        yield session
+
+
+def _recomputed(session, user: str) -> dict:
+    totals = defaultdict(lambda: dict.fromkeys(crud.TOTAL_FIELDS, 0))
+    for log in session.query(crud.HealthLogDB).filter(crud.HealthLogDB.user_id == user):
+        delta = crud.totals_delta(log.activities, log.foods)
+        for k, v in delta.items():
+            totals[log.timestamp.date()][k] += v
+    return dict(totals)
+
+
+def _stored(session, user: str) -> dict:
+    rows = session.query(crud.DailyTotalsDB).filter(crud.DailyTotalsDB.user_id == user)
+    return {row.day: {k: getattr(row, k) for k in crud.TOTAL_FIELDS} for row in rows}
+
+
+def assert_consistent(session):
+    user = session.info["user"]
+    session.expire_all()
+    expected = _recomputed(session, user)
+    stored = _stored(session, user)
+    zero = dict.fromkeys(crud.TOTAL_FIELDS, 0)
+    for day in expected.keys() | stored.keys():
+        assert stored.get(day, zero) == expected.get(day, zero), day
+
+
+def _first(session, model):
+    return session.query(model).filter(model.user_id == session.info["user"]).first()
+
+
+def test_created_logs(session):
+    assert_consistent(session)
+
+
+def test_food_quantity_rescales(session):
+    food = _first(session, crud.FoodDB)
+    calories = food.calories
+    crud.update_food(session, food, {"quantity": food.quantity * 3})
+    assert food.calories == 3 * calories
+    assert_consistent(session)
+
+
+def test_food_explicit_values(session):
+    crud.update_food(session, _first(session, crud.FoodDB), {"quantity": 0.5, "calories": 400, "name": "upma"})
+    assert_consistent(session)
+
+
+def test_activity_quantity_rescales(session):
+    activity = _first(session, crud.ActivityDB)
+    crud.update_activity(session, activity, {"quantity": 45})
+    assert activity.calories_burned == 180
+    assert_consistent(session)
+
+
+def test_log_moves_to_another_day(session):
+    log = _first(session, crud.HealthLogDB)
+    old_day = log.timestamp.date()
+    change = crud.update_health_log(session, log, {"timestamp": log.timestamp - timedelta(days=2)})
+    assert set(change.days) == {old_day, old_day - timedelta(days=2)}
+    assert_consistent(session)
+    crud.update_health_log(session, log, {"raw_text": "edited text only"})
+    assert_consistent(session)
+
+
+def test_deletes_subtract(session):
+    crud.delete_food(session, _first(session, crud.FoodDB))
+    assert_consistent(session)
+    crud.delete_activity(session, _first(session, crud.ActivityDB))
+    assert_consistent(session)
+    crud.delete_health_log(session, _first(session, crud.HealthLogDB))
+    assert_consistent(session)
+    crud.delete_health_log(session, _first(session, crud.HealthLogDB))
+    assert_consistent(session)
+    assert all(not any(day.values()) for day in _stored(session, session.info["user"]).values())
+
+
+def test_edit_then_move_then_delete(session):
+    log = _first(session, crud.HealthLogDB)
+    crud.update_food(session, log.foods[0], {"quantity": 4})
+    crud.update_health_log(session, log, {"timestamp": datetime(2024, 1, 15, 8)})
+    crud.update_activity(session, log.activities[0], {"quantity": 10})
+    assert_consistent(session)
+    crud.delete_health_log(session, log)
+    assert_consistent(session)
@@ -0,0 +1,59 @@
+"""Queued enrichments are leased to one worker at a time."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+from storage import shard_for
+from models import Food
+
+USER = "enricher"
+FOOD = Food(name="chai", quantity=1, unit="cup", calories=90, protein=3, carbs=12,
+            fat=3, fibre=0, sugar=8, saturated_fat=2, sodium=40)
+
+
+@pytest.fixture
+def queued():
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, USER)
+        session.query(crud.PendingEnrichmentDB).delete()
+        session.commit()
+        for _ in range(3):
+            crud.create_health_log(session, USER, "had chai", [], [], pending_llm=[("system", "had chai")])
+    return shard_for(USER)
+
+
+def _claim(index, owner, **kwargs):
+    with crud.shard_session(index) as session:
+        return [p.id for p in crud.claim_pending_enrichments(session, owner, **kwargs)]
+
+
+def test_each_row_goes_to_one_worker(queued):
+    first = _claim(queued, "a", limit=2)
+    second = _claim(queued, "b", limit=5)
+    assert len(first) == 2 and len(second) == 1
+    assert not set(first) & set(second)
+    assert _claim(queued, "c") == []
+
+
+def test_expired_lease_is_taken_over(queued):
+    taken = _claim(queued, "a", lease_s=-1)
+    assert sorted(_claim(queued, "b")) == sorted(taken)
+    with crud.shard_session(queued) as session:
+        assert crud.complete_enrichment(session, taken[0], "a", [], [FOOD]) is None
+        assert crud.complete_enrichment(session, taken[0], "b", [], [FOOD]) == datetime.utcnow().date()
+        assert session.query(crud.PendingEnrichmentDB).count() == 2
+
+
+def test_release_counts_failed_attempts(queued):
+    taken = _claim(queued, "a")
+    with crud.shard_session(queued) as session:
+        crud.release_enrichments(session, taken[:1], "a", failed=True)
+        crud.release_enrichments(session, taken[1:], "a")
+    assert sorted(_claim(queued, "b", max_attempts=1)) == sorted(taken[1:])
+
+
+def test_lease_expiry_is_in_the_future(queued):
+    with crud.shard_session(queued) as session:
+        claimed = crud.claim_pending_enrichments(session, "a", lease_s=60)
+        assert all(p.claimed_until > datetime.utcnow() + timedelta(seconds=50) for p in claimed)
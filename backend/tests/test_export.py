@@ -0,0 +1,105 @@
+"""Exports merge hot and archived rows in time order and decode back to the same rows in every format."""
+import csv
+import io
+from datetime import datetime
+
+import orjson
+import pytest
+
+import crud
+import export
+from models import Activity, Food
+
+FOOD = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+WALK = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+ARCHIVED = [datetime(2024, 3, day, 9) for day in (2, 9, 16, 23)]
+# Logged after the archive run, so they sit between archived rows in time.
+HOT = [datetime(2024, 3, day, 9) for day in (5, 16, 30)] + [datetime(2024, 5, 1, 9)]
+
+
+def _session(user_id):
+    session = crud.SessionLocal()
+    crud.use_shard(session, user_id)
+    return session
+
+
+def _entries(times):
+    return [{"raw_text": f"had poha on {ts:%m-%d}", "activities": [WALK], "foods": [FOOD], "timestamp": ts} for ts in times]
+
+
+@pytest.fixture(scope="module")
+def user():
+    user = "exporter"
+    with _session(user) as session:
+        crud.create_health_logs(session, user, _entries(ARCHIVED))
+        crud.archive_logs_before(session, datetime(2024, 4, 1))
+        crud.create_health_logs(session, user, _entries(HOT))
+        crud.create_weight_entry(session, user, 70.0)
+    return user
+
+
+def _rows(user, table):
+    with _session(user) as session:
+        return list(export.table_rows(session, user, table))
+
+
+def _text(row):
+    return [v.isoformat() if isinstance(v, datetime) else str(v) for v in row]
+
+
+@pytest.mark.parametrize("table", ["logs", "foods", "activities"])
+def test_hot_and_archived_rows_merge_in_time_order(user, table, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+    rows = _rows(user, table)
+    id_index = export.TABLES[table].index("id")
+    assert [row[0] for row in rows] == sorted(ARCHIVED + HOT)
+    assert rows == sorted(rows, key=lambda row: (row[0], row[id_index]))
+    with _session(user) as session:
+        hot = {row.id for row in session.query(export.MODELS[table]).filter_by(user_id=user)}
+    assert len(hot) == len(HOT) and hot < {row[id_index] for row in rows}
+
+
+def test_parse_tables():
+    assert export.parse_tables("logs, foods", "ndjson") == ["logs", "foods"]
+    assert export.parse_tables("foods", "csv") == ["foods"]
+    with pytest.raises(ValueError, match="one table"):
+        export.parse_tables("logs,foods", "csv")
+    with pytest.raises(ValueError, match="subset"):
+        export.parse_tables("logs,meals", "ndjson")
+    with pytest.raises(ValueError, match="subset"):
+        export.parse_tables(" , ", "columnar")
+    with pytest.raises(ValueError, match="format"):
+        export.parse_tables("logs", "xml")
+
+
+def _export(user, tables, format) -> bytes:
+    return b"".join(export.stream_export(user, tables, format))
+
+
+def test_csv_round_trip(user):
+    header, *rows = csv.reader(io.StringIO(_export(user, ["foods"], "csv").decode()))
+    assert tuple(header) == export.TABLES["foods"]
+    assert rows == [_text(row) for row in _rows(user, "foods")]
+
+
+def test_ndjson_round_trip(user, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 3)
+    decoded = {table: [] for table in export.TABLES}
+    for line in _export(user, list(export.TABLES), "ndjson").splitlines():
+        record = orjson.loads(line)
+        table = record.pop("table")
+        assert tuple(record) == export.TABLES[table]
+        decoded[table].append(_text(record.values()))
+    assert decoded == {table: [_text(row) for row in _rows(user, table)] for table in export.TABLES}
+
+
+def test_columnar_round_trip(user, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 3)
+    decoded = {table: [] for table in export.TABLES}
+    for line in _export(user, list(export.TABLES), "columnar").splitlines():
+        chunk = orjson.loads(line)
+        assert tuple(chunk["columns"]) == export.TABLES[chunk["table"]]
+        assert len(next(iter(chunk["columns"].values()))) <= 3
+        decoded[chunk["table"]] += [_text(row) for row in zip(*chunk["columns"].values())]
+    assert decoded == {table: [_text(row) for row in _rows(user, table)] for table in export.TABLES}
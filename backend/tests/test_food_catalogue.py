@@ -0,0 +1,26 @@
+import crud
+import food_catalogue
+from food_catalogue import FoodQuery, parse_food_segment
+from storage import shard_for
+
+USER = "miner"
+
+
+def test_parse_food_segment():
+    assert parse_food_segment("had 2 chapatis") == FoodQuery("chapati", 2.0, None)
+    assert parse_food_segment("a bowl of poha") == FoodQuery("poha", 1, "bowl")
+    assert parse_food_segment("had 1/2 cup rice") == FoodQuery("rice", 0.5, "cup")
+    assert parse_food_segment("had 1.5 rotis") == FoodQuery("roti", 1.5, None)
+    assert parse_food_segment("had 1/0 cup rice") is None
+    assert parse_food_segment("rice and dal") is None
+
+
+def test_projection_skips_mined_logs():
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, USER)
+        logs = [crud.create_health_log(session, USER, f"had {n} idli", [], []) for n in range(1, 5)]
+        ids = [log.id for log in logs]
+    shard = str(shard_for(USER))
+    assert food_catalogue._held_out_texts({shard: ids[1]}, sample=10) == ["had 4 idli", "had 3 idli"]
+    assert food_catalogue._held_out_texts({shard: ids[1]}, sample=1) == ["had 4 idli"]
+    assert food_catalogue._held_out_texts(None, sample=2) == ["had 4 idli", "had 3 idli"]
@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore
+
+
+def _gated(result="saved"):
+    """fn that blocks until release is set, counting its calls."""
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        assert release.wait(5)
+        return result
+
+    return fn, started, release, calls
+
+
+def test_completed_key_replays():
+    store = IdempotencyStore()
+    calls = []
+    fn = lambda: calls.append(1) or len(calls)
+    assert store.run("k", "body", fn) == (1, False)
+    assert store.run("k", "body", fn) == (1, True)
+    assert calls == [1]
+
+
+def test_concurrent_duplicates_share_one_run():
+    store = IdempotencyStore()
+    fn, started, release, calls = _gated()
+    with ThreadPoolExecutor(4) as pool:
+        first = pool.submit(store.run, "k", "body", fn)
+        assert started.wait(5)
+        duplicates = [pool.submit(store.run, "k", "body", fn) for _ in range(3)]
+        time.sleep(0.05)
+        assert not any(d.done() for d in duplicates)  # waiting on the original, not running fn
+        release.set()
+        assert first.result() == ("saved", False)
+        assert [d.result() for d in duplicates] == [("saved", True)] * 3
+    assert calls == [1]
+
+
+def test_duplicate_gives_up_after_wait():
+    store = IdempotencyStore()
+    fn, started, release, _ = _gated()
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(store.run, "k", "body", fn)
+        assert started.wait(5)
+        with pytest.raises(TimeoutError):
+            store.run("k", "body", fn, wait_s=0.05)
+        release.set()
+        first.result()
+
+
+def test_different_body_conflicts():
+    store = IdempotencyStore()
+    store.run("k", "body", lambda: "saved")
+    with pytest.raises(IdempotencyConflict):
+        store.run("k", "other body", lambda: "saved")
+    assert store.run("other key", "other body", lambda: "new") == ("new", False)
+
+
+def test_conflict_while_in_flight():
+    store = IdempotencyStore()
+    fn, started, release, _ = _gated()
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(store.run, "k", "body", fn)
+        assert started.wait(5)
+        with pytest.raises(IdempotencyConflict):
+            store.run("k", "other body", fn)
+        release.set()
+        first.result()
+
+
+def test_failed_request_is_forgotten():
+    store = IdempotencyStore()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        assert release.wait(5)
+        raise RuntimeError("LLM down")
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(store.run, "k", "body", failing)
+        assert started.wait(5)
+        waiting = pool.submit(store.run, "k", "body", lambda: "unused")
+        time.sleep(0.05)
+        release.set()
+        # the original and the duplicate waiting on it both see the failure
+        for future in (first, waiting):
+            with pytest.raises(RuntimeError, match="LLM down"):
+                future.result()
+    # the client's retry runs again
+    assert store.run("k", "body", lambda: "saved") == ("saved", False)
+
+
+def test_expired_and_excess_keys_are_evicted():
+    store = IdempotencyStore(ttl_s=0.01, max_keys=2)
+    store.run("old", "body", lambda: 1)
+    time.sleep(0.02)
+    assert store.run("old", "body", lambda: 2) == (2, False)
+    for key in ("a", "b", "c"):
+        store.run(key, "body", lambda: key)
+    assert store.run("a", "body", lambda: "again") == ("again", False)
@@ -0,0 +1,81 @@
+"""The planner serves the log reads from the composite / log_id indexes (EXPLAIN QUERY PLAN)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import crud
+from models import Activity, Food
+from storage import catalogue_engine
+
+USER = "planner"
+
+
+@pytest.fixture(scope="module")
+def session():
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, USER)
+        food = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+                    fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+        activity = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+        for _ in range(3):
+            crud.create_health_log(session, USER, "had poha and walked 30 min", [activity], [food])
+        yield session
+
+
+def _plans(fn) -> dict[str, str]:
+    """Run fn and return {statement: EXPLAIN QUERY PLAN details} for every SELECT it issued."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(catalogue_engine, "before_cursor_execute", record)
+    try:
+        fn()
+    finally:
+        event.remove(catalogue_engine, "before_cursor_execute", record)
+    raw = catalogue_engine.raw_connection()
+    try:
+        return {
+            statement: " | ".join(row[-1] for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters))
+            for statement, parameters in statements
+        }
+    finally:
+        raw.close()
+
+
+def _plan_for(plans: dict[str, str], fragment: str) -> str:
+    matching = [plan for statement, plan in plans.items() if fragment in statement]
+    assert matching, f"no SELECT containing {fragment!r} in {list(plans)}"
+    return matching[0]
+
+
+def test_day_range_uses_composite_index(session):
+    plans = _plans(lambda: crud.get_daily_logs(session, USER, datetime.now().date()))
+    plan = _plan_for(plans, "FROM health_logs")
+    assert "ix_health_logs_user_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.parametrize("before", [None, (datetime.now() + timedelta(days=1), "ffffffff-ffff-ffff-ffff-ffffffffffff")])
+def test_logs_page_keyset_uses_composite_index(session, before):
+    plans = _plans(lambda: crud.get_logs_page(session, USER, before=before, limit=2))
+    plan = _plan_for(plans, "FROM health_logs")
+    assert "ix_health_logs_user_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.parametrize("table", ["foods", "activities"])
+def test_child_lookup_uses_log_id_index(session, table):
+    plans = _plans(lambda: crud.get_logs_page(session, USER, limit=2))
+    plan = _plan_for(plans, f"FROM {table}")
+    assert f"ix_{table}_log_id" in plan
+
+
+def test_redundant_single_column_indexes_are_gone():
+    with catalogue_engine.connect() as conn:
+        names = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "ix_health_logs_user_id_timestamp" in names
+    assert not names & set(crud.REDUNDANT_INDEXES)
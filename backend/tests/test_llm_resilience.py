@@ -0,0 +1,33 @@
+import json
+
+from llm_resilience import parse_batch_extraction
+
+
+def _food(segment, name):
+    return {"segment": segment, "name": name, "quantity": 1, "unit": "serving", "calories": 100, "protein": 3,
+            "carbs": 15, "fat": 3, "fibre": 1, "sugar": 2, "saturated_fat": 1, "sodium": 50}
+
+
+def _reply(foods):
+    return json.dumps({"activities": [], "foods": foods})
+
+
+def test_batch_items_grouped_by_segment_number():
+    reply = _reply([
+        _food(1, "poha"),
+        _food(2, "chai"),
+    ])
+    first, second = parse_batch_extraction(reply, 2)
+    assert [f.name for f in first.foods] == ["poha"]
+    assert [f.name for f in second.foods] == ["chai"]
+
+
+def test_segment_without_items_is_unresolved():
+    reply = _reply([
+        _food(1, "poha"),
+        _food("two", "chai"),
+    ])
+    first, second, third = parse_batch_extraction(reply, 3)
+    assert first is not None
+    assert second is None  # garbled number
+    assert third is None  # left out
@@ -0,0 +1,114 @@
+"""
+crud's import-time migrations upgrade a database from before BinaryUUID:
+text uuid4 ids become 16-byte blobs, foreign keys still join, totals are backfilled.
+
+The fixture database has the original schema (the one the repo's local.db
+was created with). The migrations run in a fresh interpreter pointed at it,
+as they would when an old install upgrades.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import uuid
+from contextlib import closing
+from datetime import datetime
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+SCHEMA = """
+CREATE TABLE users (
+    id VARCHAR NOT NULL, username VARCHAR NOT NULL, password_hash VARCHAR NOT NULL,
+    weight_kg FLOAT NOT NULL, target_weight_kg FLOAT, height_cm FLOAT NOT NULL, gender VARCHAR NOT NULL,
+    activity_level VARCHAR NOT NULL, created_at DATETIME, goal VARCHAR, PRIMARY KEY (id)
+);
+CREATE TABLE weight_entries (
+    id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, value_kg FLOAT NOT NULL, recorded_at DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE health_logs (
+    id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, timestamp DATETIME, raw_text VARCHAR NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE activities (
+    id VARCHAR NOT NULL, log_id VARCHAR, user_id VARCHAR NOT NULL, type VARCHAR NOT NULL, quantity FLOAT NOT NULL,
+    unit VARCHAR NOT NULL, calories_burned INTEGER NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(log_id) REFERENCES health_logs (id) ON DELETE CASCADE
+);
+CREATE TABLE foods (
+    id VARCHAR NOT NULL, log_id VARCHAR, user_id VARCHAR NOT NULL, name VARCHAR NOT NULL, quantity FLOAT NOT NULL,
+    unit VARCHAR NOT NULL, calories INTEGER NOT NULL, protein INTEGER NOT NULL, carbs INTEGER NOT NULL,
+    fat INTEGER NOT NULL, fibre INTEGER NOT NULL, sugar INTEGER NOT NULL, saturated_fat INTEGER NOT NULL,
+    sodium INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(log_id) REFERENCES health_logs (id) ON DELETE CASCADE
+);
+"""
+ID_COLUMNS = {
+    "users": ("id",), "weight_entries": ("id",), "health_logs": ("id",),
+    "activities": ("id", "log_id"), "foods": ("id", "log_id"),
+}
+DAYS = [datetime(2025, 1, 6, 8), datetime(2025, 1, 6, 20), datetime(2025, 1, 7, 9)]
+
+
+def _uuid4() -> str:
+    return str(uuid.uuid4())
+
+
+@pytest.fixture(scope="module")
+def old_db(tmp_path_factory):
+    """A pre-BinaryUUID database, and the text ids it was created with."""
+    path = tmp_path_factory.mktemp("legacy") / "local.db"
+    logs = []
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO users VALUES (?, 'old', 'x', 70, 65, 170, 'female', 'low', ?, 'pcos')",
+                     (_uuid4(), DAYS[0]))
+        conn.execute("INSERT INTO weight_entries VALUES (?, 'old', 70, ?)", (_uuid4(), DAYS[0]))
+        for ts in DAYS:
+            log_id = _uuid4()
+            logs.append(log_id)
+            conn.execute("INSERT INTO health_logs VALUES (?, 'old', ?, 'had poha and walked')", (log_id, ts))
+            conn.execute("INSERT INTO foods VALUES (?, ?, 'old', 'poha', 1, 'plate', 250, 5, 40, 8, 2, 2, 1, 300)",
+                         (_uuid4(), log_id))
+            conn.execute("INSERT INTO activities VALUES (?, ?, 'old', 'walking', 30, 'minutes', 120)",
+                         (_uuid4(), log_id))
+    return path, logs
+
+
+def _upgrade(path, code: str = "import crud") -> str:
+    env = {
+        **os.environ, "SQLITE_PATH": str(path), "DATABASE_URL": f"sqlite:///{path}",
+        "SHARD_COUNT": "1", "ARCHIVE_DIR": str(path.parent / "archive"),
+    }
+    done = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True)
+    return done.stdout
+
+
+def test_binary_ids_migration(old_db):
+    path, log_ids = old_db
+    _upgrade(path)
+    # A second start finds nothing left to rewrite; the ORM reads the blobs back as the old text ids.
+    read_back = _upgrade(path, (
+        "import crud\n"
+        "with crud.SessionLocal() as s:\n"
+        "    crud.use_shard(s, 'old')\n"
+        "    for log in crud.get_logs_page(s, 'old', limit=10):\n"
+        "        print(log.id, log.foods[0].log_id, log.activities[0].log_id)\n"
+    ))
+    assert sorted(line.split() for line in read_back.splitlines()) == sorted([i, i, i] for i in log_ids)
+    with closing(sqlite3.connect(path)) as conn:
+        for table, columns in ID_COLUMNS.items():
+            for column in columns:
+                kinds = conn.execute(f"SELECT DISTINCT typeof({column}), length({column}) FROM {table}").fetchall()
+                assert kinds == [("blob", 16)], (table, column, kinds)
+        migrated = {str(uuid.UUID(bytes=b)) for (b,) in conn.execute("SELECT id FROM health_logs")}
+        assert migrated == set(log_ids)
+        for child in ("foods", "activities"):
+            orphans = conn.execute(
+                f"SELECT COUNT(*) FROM {child} c LEFT JOIN health_logs l ON l.id = c.log_id WHERE l.id IS NULL"
+            ).fetchone()[0]
+            assert orphans == 0
+            assert conn.execute(f"SELECT COUNT(*) FROM {child}").fetchone()[0] == len(log_ids)
+        totals = dict(conn.execute("SELECT day, calories_intake FROM daily_totals WHERE user_id = 'old'"))
+        burned = dict(conn.execute("SELECT day, calories_burned FROM daily_totals WHERE user_id = 'old'"))
+    assert totals == {"2025-01-06": 500, "2025-01-07": 250}
+    assert burned == {"2025-01-06": 240, "2025-01-07": 120}
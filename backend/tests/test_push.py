@@ -0,0 +1,76 @@
+"""Edits and deletes push the new day totals, like creates do."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+import push
+from models import Activity, Food
+
+USER = "pusher"
+FOOD = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+WALK = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+
+
+@pytest.fixture(scope="module")
+def headers(sign_in):
+    return sign_in(USER)
+
+
+@pytest.fixture
+def events(monkeypatch):
+    sent = []
+    monkeypatch.setattr(push.hub, "publish", lambda channel, event: sent.append((channel, event)))
+    return sent
+
+
+def _log():
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, USER)
+        log = crud.create_health_log(session, USER, "had poha and walked", [WALK], [FOOD])
+        return log.id, log.foods[0].id, log.activities[0].id, log.timestamp.date()
+
+
+def _version():
+    with crud.SessionLocal() as session:
+        return crud.get_change_version(session, USER)
+
+
+def _summaries(events):
+    return [(e["day"], e["delta"], e["totals"], e["version"]) for channel, e in events
+            if channel == USER and e["type"] == "summary"]
+
+
+def test_food_edit_and_delete_publish_totals(client, headers, events):
+    _, food_id, _, day = _log()
+    client.patch(f"/foods/{food_id}", json={"quantity": 2}, headers=headers)
+    client.delete(f"/foods/{food_id}", headers=headers)
+    (_, edited, _, v1), (_, deleted, totals, v2) = _summaries(events)
+    assert edited["calories_intake"] == 250 and deleted["calories_intake"] == -500
+    assert v1 < v2 == _version()
+    with crud.SessionLocal() as session:
+        assert totals == crud.get_daily_totals(session, USER, day)
+
+
+def test_activity_edit_and_delete_publish_totals(client, headers, events):
+    _, _, activity_id, day = _log()
+    client.patch(f"/activities/{activity_id}", json={"quantity": 60}, headers=headers)
+    client.delete(f"/activities/{activity_id}", headers=headers)
+    assert [(d, delta["calories_burned"]) for d, delta, _, _ in _summaries(events)] == [
+        (day.isoformat(), 120), (day.isoformat(), -240)
+    ]
+
+
+def test_moving_a_log_publishes_both_days(client, headers, events):
+    log_id, _, _, day = _log()
+    moved = datetime.combine(day - timedelta(days=3), datetime.min.time()) + timedelta(hours=9)
+    client.patch(f"/logs/{log_id}", json={"timestamp": moved.isoformat()}, headers=headers)
+    (old_day, old_delta, _, v), (new_day, new_delta, _, v2) = _summaries(events)
+    assert (old_day, new_day) == (day.isoformat(), moved.date().isoformat())
+    assert old_delta["calories_intake"] == -250 and new_delta["calories_intake"] == 250
+    assert v == v2 == _version()
+    events.clear()
+    client.delete(f"/logs/{log_id}", headers=headers)
+    [(deleted_day, delta, _, _)] = _summaries(events)
+    assert deleted_day == moved.date().isoformat() and delta["calories_burned"] == -120
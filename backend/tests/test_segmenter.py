@@ -0,0 +1,30 @@
+import pytest
+
+from segmenter import route_segment, split_clauses, tokenize
+
+
+@pytest.mark.parametrize("text, segments", [
+    ("rice and dal", ["rice and dal"]),
+    ("ran 5 km and ate poha", ["ran 5 km", "ate poha"]),
+    ("walked 3km then had 2 rotis", ["walked 3km", "had 2 rotis"]),
+    ("ran 10km and also had 2 eggs.", ["ran 10km", "had 2 eggs"]),
+    # fractions, ranges and decimals stay whole
+    ("had 1/2 cup rice and dal", ["had 1/2 cup rice and dal"]),
+    ("walked 2-3 km, then ate 1.5 rotis", ["walked 2-3 km", "ate 1.5 rotis"]),
+    # segments are slices of the original text: case and non-ASCII survive
+    ("I Walked 3 KM and Had Poha", ["I Walked 3 KM", "Had Poha"]),
+    ("Had चाय and 2 biscuits", ["Had चाय", "2 biscuits"]),
+    ("दौड़ा 5 km। फिर चाय पी", ["दौड़ा 5 km", "फिर चाय पी"]),
+    ("Café au lait and 1 croissant", ["Café au lait", "1 croissant"]),
+])
+def test_split_clauses(text, segments):
+    assert split_clauses(text) == segments
+
+
+def test_tokenize_keeps_numbers_and_marks_whole():
+    assert tokenize("1/2 Cup चाय, 2-3 rotis") == ["1/2", "cup", "चाय", ",", "2-3", "rotis"]
+
+
+def test_route_segment_is_case_insensitive():
+    assert route_segment("Walked 3 KM") == "activity"
+    assert route_segment("Had 2 Rotis") == "food"
@@ -0,0 +1,114 @@
+"""
+Routing with SHARD_COUNT > 1. SHARD_COUNT is read at import and the rest of
+the suite runs unsharded, so each check runs in a fresh interpreter with its
+own database files and prints JSON back.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import BACKEND_DIR
+
+SHARDS = 4
+USERS = [f"user{i}" for i in range(12)]
+
+WRITE = """
+import crud
+from models import Activity, Food
+food = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+walk = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+for n, user in enumerate(USERS):
+    with crud.SessionLocal() as session:
+        crud.use_shard(session, user)
+        for _ in range(n % 3 + 1):
+            crud.create_health_log(session, user, "had poha and walked", [walk], [food])
+        crud.create_weight_entry(session, user, 70.0)
+"""
+
+
+def _env(tmp_path, shards: int) -> dict:
+    return {
+        **os.environ, "SQLITE_PATH": str(tmp_path / "local.db"), "SHARD_COUNT": str(shards),
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'local.db'}", "ARCHIVE_DIR": str(tmp_path / "archive"),
+    }
+
+
+def _run(tmp_path, shards: int, code: str) -> str:
+    script = f"USERS = {USERS!r}\n" + textwrap.dedent(code)
+    done = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=_env(tmp_path, shards),
+                          check=True, capture_output=True, text=True)
+    return done.stdout
+
+
+def test_rows_land_on_their_users_shard(tmp_path):
+    out = _run(tmp_path, SHARDS, WRITE + """
+        import json, sqlite3
+        from storage import SHARD_COUNT, SQLITE_PATH, ShardNotSelected, shard_for, shard_path
+        per_shard, expected = {}, {}
+        for index in range(SHARD_COUNT):
+            conn = sqlite3.connect(shard_path(index))
+            per_shard[index] = sorted({u for (u,) in conn.execute("SELECT user_id FROM health_logs")})
+            expected[index] = sorted(u for u in USERS if shard_for(u) == index)
+        catalogue_logs = sqlite3.connect(SQLITE_PATH).execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'health_logs'").fetchone()[0]
+        user = USERS[4]
+        with crud.SessionLocal() as session:
+            crud.use_shard(session, user)
+            reads = session.query(crud.HealthLogDB).filter(crud.HealthLogDB.user_id == user).count()
+            neighbours = {l.user_id for l in session.query(crud.HealthLogDB)}
+        try:
+            with crud.SessionLocal() as session:
+                session.query(crud.HealthLogDB).count()
+            unrouted = "no error"
+        except ShardNotSelected as e:
+            unrouted = type(e).__name__
+        with crud.SessionLocal() as session:
+            users_query = session.query(crud.UserDB).count()  # catalogue table: no shard needed
+        print(json.dumps({
+            "per_shard": per_shard, "expected": expected, "catalogue_logs": catalogue_logs, "reads": reads,
+            "foreign": sorted(neighbours - set(expected[shard_for(user)])),
+            "unrouted": unrouted, "users_query": users_query,
+        }))
+    """)
+    result = json.loads(out.splitlines()[-1])
+    assert result["per_shard"] == result["expected"]
+    assert sum(1 for users in result["expected"].values() if users) > 1
+    assert result["catalogue_logs"] == 0  # per-user tables live only in the shard files
+    assert result["reads"] == 4 % 3 + 1
+    assert result["foreign"] == []  # a shard session only sees that shard's users
+    assert result["unrouted"] == "ShardNotSelected"
+    assert result["users_query"] == 0
+
+
+COUNT = """
+import json
+from crud import Base
+from storage import CATALOGUE_TABLES, query_all_shards
+counts = {}
+for table in Base.metadata.sorted_tables:
+    if table.name not in CATALOGUE_TABLES:
+        counts[table.name] = sum(n for _, (n,) in query_all_shards(f"SELECT COUNT(*) FROM {table.name}"))
+print(json.dumps(counts))
+"""
+
+
+def test_split_preserves_row_counts(tmp_path):
+    before = json.loads(_run(tmp_path, 1, WRITE + COUNT).splitlines()[-1])
+    assert before["health_logs"] == sum(n % 3 + 1 for n in range(len(USERS)))
+    subprocess.run([sys.executable, "-m", "storage", "split"], cwd=BACKEND_DIR, env=_env(tmp_path, SHARDS),
+                   check=True, capture_output=True)
+    after = json.loads(_run(tmp_path, SHARDS, COUNT).splitlines()[-1])
+    assert after == before
+    placed = _run(tmp_path, SHARDS, """
+        import sqlite3
+        from storage import SHARD_COUNT, shard_for, shard_path
+        for index in range(SHARD_COUNT):
+            conn = sqlite3.connect(shard_path(index))
+            for table in ("health_logs", "foods", "activities", "weight_entries", "daily_totals"):
+                for (user,) in conn.execute(f"SELECT DISTINCT user_id FROM {table}"):
+                    print(table, user, shard_for(user) == index)
+    """)
+    assert placed and all(line.endswith("True") for line in placed.splitlines())
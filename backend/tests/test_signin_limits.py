@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+import passwords
+import rate_limit
+from rate_limit import SlidingWindowLimiter
+
+
+def test_hash_timeout_is_busy_and_keeps_its_slot(monkeypatch):
+    monkeypatch.setattr(passwords, "HASH_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(passwords, "_pending", threading.BoundedSemaphore(1))
+    release = threading.Event()
+    with pytest.raises(passwords.HasherBusy):
+        passwords._run_in_pool(release.wait, 5)
+    # The timed-out hash is still running: its pending slot must still be taken.
+    with pytest.raises(passwords.HasherBusy, match="concurrent"):
+        passwords._run_in_pool(lambda: True)
+    release.set()
+    for _ in range(100):
+        if passwords._pending.acquire(timeout=0.05):
+            passwords._pending.release()
+            break
+    else:
+        pytest.fail("pending slot was never released")
+    assert passwords._run_in_pool(lambda: 42) == 42
+
+
+def test_limiter_sweeps_expired_keys(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    limiter = SlidingWindowLimiter(limit=2, window_s=10)
+    for i in range(1000):
+        limiter.hit(f"user{i}")
+    assert len(limiter) == 1000
+    now[0] += 11
+    limiter.hit("fresh")
+    assert len(limiter) == 1
+
+
+def test_limiter_caps_keys_and_still_limits(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    limiter = SlidingWindowLimiter(limit=2, window_s=10, max_keys=100)
+    limiter.hit("victim")
+    limiter.hit("victim")
+    assert limiter.retry_after("victim") > 0
+    for i in range(500):
+        limiter.hit(f"stuffing{i}")
+    assert len(limiter) == 100
+    limiter.hit("victim")
+    assert limiter.retry_after("victim") == 0  # evicted under the cap, counting restarts
+    limiter.hit("victim")
+    assert limiter.retry_after("victim") > 0
@@ -0,0 +1,96 @@
+"""Change versions, /sync deltas with tombstones, and ETag revalidation."""
+import crud
+from models import Activity, Food
+from storage import shard_for
+
+FOOD = Food(name="poha", quantity=1, unit="plate", calories=250, protein=5, carbs=40,
+            fat=8, fibre=2, sugar=2, saturated_fat=1, sodium=300)
+WALK = Activity(type="walking", quantity=30, unit="minutes", calories_burned=120)
+
+
+def _session(user):
+    session = crud.SessionLocal()
+    crud.use_shard(session, user)
+    return session
+
+
+def test_every_write_bumps_the_version():
+    user = "versions"
+    with _session(user) as session:
+        seen = [crud.get_change_version(session, user)]
+        log = crud.create_health_log(session, user, "had poha and walked", [WALK], [FOOD])
+        seen.append(crud.get_change_version(session, user))
+        assert log.version == log.foods[0].version == log.activities[0].version == seen[-1]
+        crud.update_food(session, log.foods[0], {"quantity": 2})
+        seen.append(crud.get_change_version(session, user))
+        crud.delete_activity(session, log.activities[0])
+        seen.append(crud.get_change_version(session, user))
+        crud.create_weight_entry(session, user, 70.5)
+        seen.append(crud.get_change_version(session, user))
+        crud.delete_health_log(session, log)
+        seen.append(crud.get_change_version(session, user))
+    assert seen == list(range(6))
+
+
+def test_changes_since_returns_later_rows_and_tombstones():
+    user = "delta-sync"
+    with _session(user) as session:
+        kept = crud.create_health_log(session, user, "had poha", [], [FOOD])
+        dropped = crud.create_health_log(session, user, "walked", [WALK], [])
+        dropped_activity = dropped.activities[0].id
+        since = crud.get_change_version(session, user)
+        crud.update_food(session, kept.foods[0], {"quantity": 2})
+        crud.delete_health_log(session, dropped)
+        added = crud.create_health_log(session, user, "walked again", [WALK], [])
+
+        changes = crud.get_changes_since(session, user, since)
+        assert [log.id for log in changes["logs"]] == [added.id]
+        assert [f.id for f in changes["foods"]] == [kept.foods[0].id]
+        assert [a.log_id for a in changes["activities"]] == [added.id]
+        assert {(d.kind, d.row_id) for d in changes["deleted"]} == {("log", dropped.id), ("activity", dropped_activity)}
+        assert all(row.version > since for name in ("logs", "foods", "activities") for row in changes[name])
+
+        full = crud.get_changes_since(session, user, 0)
+        assert len(full["logs"]) == 2 and full["deleted"] == []
+
+
+def test_sync_endpoint(client, sign_in):
+    headers = sign_in("sync-api")
+    with _session("sync-api") as session:
+        log = crud.create_health_log(session, "sync-api", "had poha", [], [FOOD])
+        food_id = log.foods[0].id
+        version = crud.get_change_version(session, "sync-api")
+
+    up_to_date = client.get("/sync", params={"since": version}, headers=headers).json()
+    assert up_to_date["full"] is False and up_to_date["logs"] == [] and up_to_date["version"] == version
+    ahead = client.get("/sync", params={"since": version + 10}, headers=headers).json()
+    assert ahead["full"] is True and [l["id"] for l in ahead["logs"]] == [log.id]
+    assert client.get("/sync", params={"since": -1}, headers=headers).status_code == 400
+
+    first = client.get("/sync", params={"since": 0}, headers=headers)
+    etag = first.headers["ETag"]
+    cached = client.get("/sync", params={"since": 0}, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == etag
+
+    client.patch(f"/foods/{food_id}", json={"quantity": 3}, headers=headers)
+    edited = client.get("/sync", params={"since": 0}, headers={**headers, "If-None-Match": etag})
+    assert edited.status_code == 200 and edited.headers["ETag"] != etag
+    assert edited.json()["foods"][0]["calories"] == 750
+
+
+def test_etag_changes_after_enrichment(client, sign_in):
+    user = "sync-enriched"
+    headers = sign_in(user)
+    with _session(user) as session:
+        crud.create_health_log(session, user, "had poha", [], [], pending_llm=[("system", "had poha")])
+    etag = client.get("/logs", headers=headers).headers["ETag"]
+    assert client.get("/logs", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    with crud.shard_session(shard_for(user)) as session:
+        claimed = crud.claim_pending_enrichments(session, "test", limit=1000)
+        [pending] = [p.id for p in claimed if p.user_id == user]
+        crud.complete_enrichment(session, pending, "test", [], [FOOD])
+
+    refreshed = client.get("/logs", headers={**headers, "If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.headers["ETag"] != etag
+    assert [f["name"] for f in refreshed.json()["logs"][0]["foods"]] == ["poha"]
@@ -0,0 +1,25 @@
+import pytest
+
+from telemetry import Counter, Histogram, clean_request_id
+
+
+def test_label_values_are_escaped():
+    counter = Counter("nutrilog_test_total", "Test counter.", "path")
+    counter.inc('a"b\\c\nd')
+    assert counter.render()[-1] == 'nutrilog_test_total{path="a\\"b\\\\c\\nd"} 1'
+    histogram = Histogram("nutrilog_test_seconds", "Test histogram.", "path", buckets=(1.0,))
+    histogram.observe('x"\n', 0.5)
+    assert all("\n" not in line for line in histogram.render())
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("abc-123", "abc-123"),
+    ("0" * 64, "0" * 64),
+    ("0" * 65, None),
+    ("../../x", None),
+    ("a b", None),
+    ("", None),
+    (None, None),
+])
+def test_clean_request_id(value, expected):
+    assert clean_request_id(value) == expected
@@ -1,3 +1,6 @@
+import base64
+import uuid
+from datetime import datetime
 from typing import List
 
 from models import Activity, Food
@@ -18,4 +21,20 @@ def merge_dict(result,dict1,dict2):
             if key in result:
                 result[key].extend(value)
             else:
-                result[key] = value.copy()
\ No newline at end of file
+                result[key] = value.copy()
+
+def encode_log_cursor(timestamp: datetime, log_id: str) -> str:
+    """Opaque keyset cursor for the /logs endpoint: base64 of 'timestamp|id'."""
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_log_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of encode_log_cursor. Raises ValueError on malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        ts, log_id = raw.split("|", 1)
+        uuid.UUID(log_id)
+        return datetime.fromisoformat(ts), log_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e